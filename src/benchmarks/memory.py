@@ -0,0 +1,84 @@
+import gc
+import sys
+import tracemalloc
+from classes.blob import Blob, BlobTraits
+from classes.candy import Candy
+from classes.geometry import Vector2
+
+# Memory used per entity.
+#
+# Creates n blobs and n candies the way the simulation does and \
+# reports the bytes allocated per entity, including everything \
+# it owns (traits, vectors), as measured by tracemalloc.
+#
+# Every entity is measured twice: as it is now, with __slots__, and \
+# as a reference without them, built from copies of the same classes \
+# (see _unslotted) that keep their attributes in a __dict__, as they \
+# did before.
+#
+# Run from src/ with: python -m benchmarks.memory [n]
+
+N = 100000
+
+
+def _measure(create) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(entities)
+
+
+# Copy of cls with the same methods and class attributes, \
+# but no __slots__.
+def _unslotted(cls: type) -> type:
+    namespace = {name: value for name, value in vars(cls).items()
+                 if name not in cls.__slots__ and name != '__slots__'}
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+UnslottedBlob = _unslotted(Blob)
+UnslottedBlobTraits = _unslotted(BlobTraits)
+UnslottedCandy = _unslotted(Candy)
+UnslottedVector2 = _unslotted(Vector2)
+
+
+def blobs(n: int, slotted: bool = True) -> list[Blob]:
+    blob, traits, vector = ((Blob, BlobTraits, Vector2) if slotted else
+                            (UnslottedBlob, UnslottedBlobTraits, UnslottedVector2))
+    created = []
+    for i in range(n):
+        b = blob(traits=traits(size=20. + i % 7, speed=300.),
+                 position=vector(i % 1400, i % 1000),
+                 hue=float(i % 360),
+                 id=i)
+        if not slotted:
+            # Blob.__init__ makes these from the slotted Vector2.
+            b.acc = vector(0., 0.)
+            b.vel = vector(0., 0.)
+        created.append(b)
+    return created
+
+
+def candies(n: int, slotted: bool = True) -> list[Candy]:
+    candy, vector = (Candy, Vector2) if slotted else (UnslottedCandy, UnslottedVector2)
+    return [candy(size=5. + i % 7,
+                  position=vector(i % 1400, i % 1000),
+                  id=i)
+            for i in range(n)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    print(f'{n} entities, bytes per entity')
+    print(f'{"":6} {"__dict__":>10} {"__slots__":>10} {"saved":>7}')
+    for name, create in (('Blob', blobs), ('Candy', candies)):
+        before = _measure(lambda: create(n, slotted=False))
+        after = _measure(lambda: create(n))
+        print(f'{name:6} {before:10.1f} {after:10.1f} {1 - after / before:7.0%}')
+
+
+if __name__ == '__main__':
+    main()
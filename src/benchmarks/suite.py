@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+from classes import sweep
+from classes.world import World
+from classes.profiling import Profiler
+
+# Headless benchmark suite.
+#
+# Measures how the cost of the simulation scales with its parameters. \
+# A suite is described by a JSON file (see benchmarks.json):
+#
+# {
+#     "base": "./config.json",      base config, path or dict
+#     "dt": 0.02,                   step length, unless the config sets fixed_dt
+#     "engines": ["object", "array"],
+#     "warmup": 20,                 steps taken before measuring
+#     "steps": 100,                 steps measured per repeat
+#     "repeats": 3,                 the fastest repeat is reported
+#     "draw": true,                 also time Simulation.draw (needs pygame)
+#     "curves": {                   one scaling curve per entry
+#         "n_blobs": {"n_blobs": [50, 100, 200]},
+#         "workers": {"engines": ["parallel"],
+#                     "grid": {"workers": [1, 2, 4]}},
+#         ...
+#     }
+# }
+#
+# Every curve is a grid of overrides, as in a sweep (see classes.sweep), \
+# run once per engine, or once per engine of its own if it gives them \
+# along with its grid. Upper-case keys (e.g. "CANDY_LIMIT") set the \
+# class constant of that name on the world instead of a config value.
+#
+# Every point reports:
+# steps_per_second, step_ms: from timing the plain steps.
+# spawn_ms: candy spawning per step, from a profiled run.
+# mean_traits_us: one World.mean_traits call.
+# draw_ms: one Simulation.draw at window size, if enabled.
+# n_blobs, n_candies: the population at the end of the run.
+#
+# Run from src/ with:
+# python -m benchmarks.suite ../benchmarks.json --out results.json
+# python -m benchmarks.suite ../benchmarks.json --compare baseline.json
+#
+# With --compare, every metric is checked against the point with the \
+# same curve, engine and overrides in the baseline, and the exit code \
+# is 1 if any got worse by more than the tolerance.
+
+# Metrics where a smaller value is better; for the others larger is better.
+COSTS = ('step_ms', 'spawn_ms', 'mean_traits_us', 'draw_ms')
+RATES = ('steps_per_second',)
+
+# Size of the surface draw is timed on.
+DRAW_SIZE = (1320, 1080)
+
+MEAN_TRAITS_CALLS = 1000
+DRAW_CALLS = 10
+
+
+def _create(config: dict, draw: bool) -> World:
+    if draw:
+        from components.simulation import Simulation
+        world = Simulation.from_dict(config)
+    else:
+        world = World.from_dict(config)
+
+    for key, value in config.items():
+        if key.isupper():
+            setattr(world, key, value)
+    return world
+
+
+def _steps(world: World, n: int, dt: float) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        world.step(dt)
+    return time.perf_counter() - start
+
+
+def _median_ms(profiler: Profiler, phase: str) -> float:
+    values = profiler.series(phase)
+    return float(np.median(values)) / 1e6 if len(values) else None
+
+
+# Measures a single config.
+def run_point(config: dict, *,
+              dt: float,
+              warmup: int,
+              steps: int,
+              repeats: int,
+              draw: bool) -> dict:
+    if config.get('fixed_dt') == None:
+        config = {**config, 'fixed_dt': dt}
+    dt = config['fixed_dt']
+
+    # Every repeat starts from the same seed, so all of them \
+    # step through the same states.
+    best = np.inf
+    for _ in range(repeats):
+        world = _create(config, draw=False)
+        _steps(world, warmup, dt)
+        best = min(best, _steps(world, steps, dt))
+
+    world = _create(config, draw)
+    world.profiler = Profiler(window=warmup + steps)
+    _steps(world, warmup + steps, dt)
+
+    start = time.perf_counter()
+    for _ in range(MEAN_TRAITS_CALLS):
+        world.mean_traits()
+    mean_traits = (time.perf_counter() - start) / MEAN_TRAITS_CALLS
+
+    result = {
+        'steps_per_second': steps / best,
+        'step_ms': best / steps * 1e3,
+        'spawn_ms': _median_ms(world.profiler, 'spawn'),
+        'mean_traits_us': mean_traits * 1e6,
+        'draw_ms': None,
+        'n_blobs': world.n_blobs(),
+        'n_candies': world.n_candies(),
+    }
+
+    if draw:
+        from pygame import Surface, Vector2
+        screen = Surface(DRAW_SIZE)
+        for _ in range(DRAW_CALLS):
+            world.draw(screen, Vector2(0, 0), DRAW_SIZE)
+        result['draw_ms'] = _median_ms(world.profiler, 'draw')
+
+    return result
+
+
+# Runs every curve of the suite, yielding each point as it finishes.
+def run(suite: dict):
+    base = suite.get('base', './config.json')
+    if isinstance(base, str):
+        with open(base) as file:
+            base = json.load(file)
+
+    options = {
+        'dt': suite.get('dt', 0.02),
+        'warmup': suite.get('warmup', 20),
+        'steps': suite.get('steps', 100),
+        'repeats': suite.get('repeats', 3),
+        'draw': suite.get('draw', False),
+    }
+
+    engines = suite.get('engines', [base.get('engine', 'object')])
+    for curve, grid in suite['curves'].items():
+        curve_engines = engines
+        if 'grid' in grid:
+            curve_engines, grid = grid.get('engines', engines), grid['grid']
+        for engine in curve_engines:
+            for overrides in sweep.expand({'grid': grid}):
+                config = sweep.apply(base, {'engine': engine, **overrides})
+                yield {'curve': curve,
+                       'engine': engine,
+                       'overrides': overrides,
+                       **run_point(config, **options)}
+
+
+def _key(point: dict) -> tuple:
+    return (point['curve'], point['engine'], json.dumps(point['overrides'], sort_keys=True))
+
+
+# Metrics of points that got worse than in baseline by more \
+# than tolerance (a fraction), as (point, metric, baseline value, value).
+def regressions(points: list[dict], baseline: list[dict],
+                tolerance: float) -> list[tuple[dict, str, float, float]]:
+    previous = {_key(point): point for point in baseline}
+    found = []
+    for point in points:
+        old = previous.get(_key(point))
+        if old == None:
+            continue
+        for metric in COSTS + RATES:
+            if point.get(metric) == None or old.get(metric) == None:
+                continue
+            if metric in COSTS:
+                worse = point[metric] > old[metric] * (1 + tolerance)
+            else:
+                worse = point[metric] < old[metric] / (1 + tolerance)
+            if worse:
+                found.append((point, metric, old[metric], point[metric]))
+    return found
+
+
+def _environment() -> dict:
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'system': platform.system()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how the simulation scales, headless.')
+    parser.add_argument('spec', help='JSON file describing the suite')
+    parser.add_argument('--out', default=None,
+                        help='file the results are written to as JSON')
+    parser.add_argument('--compare', default=None,
+                        help='results file of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='fraction a metric may get worse before it counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.spec) as file:
+        suite = json.load(file)
+
+    # The base config is looked up relative to the suite file.
+    if isinstance(suite.get('base', './config.json'), str):
+        suite['base'] = os.path.join(os.path.dirname(args.spec),
+                                     suite.get('base', './config.json'))
+
+    if suite.get('draw', False):
+        # Draw is timed on an offscreen surface.
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    points = []
+    for point in run(suite):
+        points.append(point)
+        draw = f', draw {point["draw_ms"]:.2f}ms' if point['draw_ms'] != None else ''
+        print(f'{point["curve"]:>16} {point["engine"]:>6} {json.dumps(point["overrides"])}: '
+              f'{point["steps_per_second"]:8.1f} steps/s, step {point["step_ms"]:.2f}ms, '
+              f'spawn {point["spawn_ms"]:.3f}ms, mean_traits {point["mean_traits_us"]:.1f}us'
+              f'{draw} ({point["n_blobs"]} blobs, {point["n_candies"]} candies)')
+
+    results = {'environment': _environment(), 'suite': suite, 'points': points}
+    if args.out != None:
+        with open(args.out, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare != None:
+        with open(args.compare) as file:
+            baseline = json.load(file)['points']
+
+        found = regressions(points, baseline, args.tolerance)
+        for point, metric, old, new in found:
+            print(f'REGRESSION {point["curve"]} {point["engine"]} '
+                  f'{json.dumps(point["overrides"])} {metric}: {old:.3f} -> {new:.3f}')
+        print(f'{len(found)} regressions against {args.compare}')
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,21 @@
-from collections.abc import Sequence, Callable
-from uuid import uuid4
-from pygame import time, Vector2, Color, Rect
+from collections.abc import Sequence, Callable, Iterator, Iterable
+from classes.geometry import Vector2, Rect
 from classes.candy import Candy
+from classes.grid import CandyGrid, CELL_SIZE
+from classes import occlusion
 from classes.constants import *
 from classes.utils import *
+from classes.obstacles import Obstacles
 from numpy.random import Generator
+import numpy as np
 from typing import Self
 import math
 
 
 
 class MutationSdvs():
+    __slots__ = ('size', 'speed')
+    
     def __init__(self,*,
                  size_sdv: float = 5.0,
                  speed_sdv: float = 2.0):
@@ -22,6 +27,8 @@ class MutationSdvs():
                         speed_sdv=obj.get('speed_sdv'))
 
 class BlobTraits():
+    __slots__ = ('size', 'speed')
+    
     def __init__(self, *, 
                  size: float,
                  speed: float):
@@ -34,7 +41,13 @@ class BlobTraits():
 
 # Represents a single individual
 # Will be rendered as a moving circle
+#
+# Slotted, since there can be a great many of them; the color it is \
+# drawn with is only derived from hue when drawing.
 class Blob():
+    __slots__ = ('traits', 'position', 'id', 'age', 'expires',
+                 'acc', 'vel', 'energy', 'hue', '_radius',
+                 '_target', '_clearance')
     
     # The lifespan of a single blob.
     # If a blob manages to survive this long, \
@@ -59,11 +72,28 @@ class Blob():
     
     MIN_SIZE = 2.
     
+    MIN_SPEED = 20.
+    
+    # Number of offspring a blob splits into at the end of its lifespan.
+    N_OFFSPRING = 3
+    
+    # Area around the parent in which offspring are placed.
+    OFFSPRING_AREA = 60
+    
     
     # Determines how much energy per unit size a blob \
     # loses per second, independent of movement.
     PASSIVE_ENERGY_LOSS = 10.
     
+    # Taken off the clearance (see _track) on top of the distance moved, \
+    # far more than the rounding error of any distance on the board.
+    CLEARANCE_SLACK = 1e-6
+    
+    # New candies are only looked up in the cells this far around \
+    # blobs whose clearance is at most this (see notice); blobs with \
+    # a larger clearance are few, and are checked against all of them.
+    NOTICE_REACH = 2 * CELL_SIZE
+    
     # Traits:
     #
     # size:
@@ -89,29 +119,37 @@ class Blob():
                  traits = BlobTraits(size = 20.0,
                                     speed = 5.0),
                  position=Vector2(0, 0),
-                 rng: Generator,
-                 hue: float):
+                 hue: float,
+                 id: int = None):
         
-        self._rng: Generator = rng
         # phenotypic traits:
+        # not expected to change once the blob exists
         self.traits = traits
         # internal variables:
         self.position: Vector2 = position
         
         # unique identifier
-        self.id = uuid4().int
+        self.id = id if id != None else utils.next_id()
         # internal
         self.age = 0.
+        # Simulated time at which the blob reaches its lifespan, \
+        # set when it is added to a world.
+        self.expires: float = math.inf
         # self._candies: set[Candy] = gamestate[1]
         # self._blobs: set[Blob] = gamestate[0]
-        self.acc = Vector2(0, 0)
-        self.vel = Vector2(0, 0)
+        # float literals, so that the components share one zero object
+        self.acc = Vector2(0., 0.)
+        self.vel = Vector2(0., 0.)
         # calculated values
-        self.max_energy = self.ENERGY_SIZE_R * self.traits.size
         self.energy = self.max_energy / 2
-        # color
-        self.color = Color(0, 0, 0)
-        self.color.hsla = (hue, 85, 45, 1)
+        # hue of the color the blob is drawn with
+        self.hue = hue
+        # cached, since it is needed for every collision test
+        self._radius = utils.radius(self.traits.size)
+        # The candy the blob last moved towards, and a lower bound \
+        # on its distance to every other candy (see _track).
+        self._target: Candy = None
+        self._clearance = -math.inf
         
     def distance_to(self, other):
         return math.sqrt((self.position.x - other.position.x)**2 +
@@ -121,18 +159,69 @@ class Blob():
     def time_born(self, paused_time: float, speed: float = 1.):
         return (self._time_born - paused_time) * speed
         
-    def closest_candy(self, candies, visible: Callable[[Candy], bool]) -> Candy:
-        min_pair = (None, 0)
+    # visible takes an (n, 2) array of candy positions \
+    # and returns a mask of the ones the blob can see.
+    def closest_candy(self, candies, visible: Callable[[np.ndarray], np.ndarray]) -> Candy:
+        if isinstance(candies, CandyGrid):
+            return candies.closest(self.position, visible)
+        
+        candies = list(candies)
+        if len(candies) == 0:
+            return None
+        
+        positions = np.array([(candy.position.x, candy.position.y) for candy in candies])
+        dists = np.sqrt((positions[:, 0] - self.position.x)**2 +
+                        (positions[:, 1] - self.position.y)**2)
+        dists[~visible(positions)] = np.inf
+        
+        nearest = int(np.argmin(dists))
+        if dists[nearest] == np.inf:
+            return None
+        return candies[nearest]
+    
+    # The candy to move towards: the closest visible one, as closest_candy \
+    # finds it, but only searched for again when the previous target may \
+    # no longer be it.
+    #
+    # The target is kept while it is still there, still visible and \
+    # closer than the clearance, the bound on the distance to every other \
+    # candy the search worked out (see CandyGrid.closest_clear). Moving \
+    # takes the distance moved off the clearance, and new candies lower \
+    # it through notice.
+    def _track(self, candies, separators: tuple[Rect, ...],
+               visible: Callable[[np.ndarray], np.ndarray]) -> Candy:
+        target = self._target
+        if target != None and target in candies:
+            dist = self.distance_to(target)
+            # Targets well within the blob's distance from the obstacles \
+            # cannot be hidden by them, whatever rounding clipping does.
+            if dist < self._clearance and \
+               ((isinstance(separators, Obstacles) and
+                 dist + 2 < separators.clearance_at(self.position.x, self.position.y)) or
+                visible(np.array([(target.position.x, target.position.y)]))[0]):
+                return target
+        
+        if isinstance(candies, CandyGrid):
+            self._target, self._clearance = candies.closest_clear(self.position, visible)
+        else:
+            self._target, self._clearance = self.closest_candy(candies, visible), -math.inf
+        return self._target
+    
+    # Bound on the distance to every candy other than the target (see _track).
+    def clearance(self) -> float:
+        return self._clearance
+    
+    # Lowers the clearance by the new candies closer than it.
+    def notice(self, candies: Iterable[Candy]):
         for candy in candies:
-            dist = self.distance_to(candy)
-            if (min_pair[0] == None or \
-               dist < min_pair[1]) and \
-               visible(candy):
-                min_pair = (candy, dist)
-        return min_pair[0]
+            self._clearance = min(self._clearance, self.distance_to(candy))
+    
+    @property
+    def max_energy(self) -> float:
+        return self.ENERGY_SIZE_R * self.traits.size
     
     def radius(self) -> float:
-        return utils.radius(self.traits.size)
+        return self._radius
     
     def age_by(self, time: float):
         self.age += time
@@ -141,34 +230,46 @@ class Blob():
               candies: list[Candy],
               blobs: list[Self],
               separators: tuple[Rect, Rect],
-              timediff: float):
-        def visible(candy: Candy) -> bool:
-            for sep in separators:
-                if sep.clipline((self.position.x, self.position.y),
-                                (candy.position.x, candy.position.y)) != ():
-                    return False
-            return True
-        
-        candy = self.closest_candy(candies, visible)
-        
-        if candy == None:
-            return
+              timediff: float,
+              push: Vector2 = None):
+        def visible(positions: np.ndarray) -> np.ndarray:
+            return occlusion.visible((self.position.x, self.position.y),
+                                     positions,
+                                     separators)
         
-        dist = self.distance_to(candy)
-        displacement = Vector2(candy.position.x - self.position.x,
-                            candy.position.y - self.position.y)
+        candy = self._track(candies, separators, visible)
         
+        # Acceleration from the blobs around this one (see classes.neighbours), \
+        # which moves blobs with nothing to go after as well.
+        pushed = push != None and (push.x != 0 or push.y != 0)
         
-        # New (basic) movement logic
-        # d_norm = displacement / displacement.magnitude()
-        
-        # blob.vel = d_norm * blob.traits.speed
-        
-        # movement = blob.vel * timediff
-        
-        # Old movement logic
-        
-        self.acc = Blob.ACC_MULTIPLIER * displacement / dist
+        if candy == None:
+            if not pushed:
+                return
+            self.acc = push
+        else:
+            dist = self.distance_to(candy)
+            displacement = Vector2(candy.position.x - self.position.x,
+                                candy.position.y - self.position.y)
+            
+            
+            # New (basic) movement logic
+            # d_norm = displacement / displacement.magnitude()
+            
+            # blob.vel = d_norm * blob.traits.speed
+            
+            # movement = blob.vel * timediff
+            
+            # Old movement logic
+            
+            # A blob sitting exactly on a candy has no direction to move in, \
+            # as in move_blobs.
+            if dist == 0:
+                self.acc = Vector2(0, 0)
+            else:
+                self.acc = Blob.ACC_MULTIPLIER * displacement / dist
+            if push != None:
+                self.acc = self.acc + push
         # self._acc -= self._vel * self.FRICTION 
         self.vel += self.acc * timediff
         
@@ -192,6 +293,7 @@ class Blob():
         self.position = utils.bound_position(self.position + movement, self.radius(), separators)
 
         movement = self.position - oldpos
+        self._clearance -= movement.magnitude() + Blob.CLEARANCE_SLACK
         
         # slope = movement.y / movement.x
         
@@ -232,14 +334,15 @@ class Blob():
                   mean_traits: BlobTraits,
                   sdvs: MutationSdvs,
                   separators: tuple[Rect, Rect],
-                  gen_position: Callable[[], Vector2] = None) -> Self:
+                  gen_position: Callable[[], Vector2] = None,
+                  id: int = None) -> Self:
             size = max(utils.sample_normal(rng=rng,
                                      mean=mean_traits.size,
                                      std_dev=sdvs.size), Blob.MIN_SIZE)
             
             speed = max(utils.sample_normal(rng=rng,
                                       mean=mean_traits.speed,
-                                      std_dev=sdvs.speed), 20)
+                                      std_dev=sdvs.speed), Blob.MIN_SPEED)
             radius = utils.radius(size) 
             
             if gen_position == None:
@@ -255,7 +358,58 @@ class Blob():
             return Blob(traits=BlobTraits(size=size, speed=speed),
                         position=position,
                         hue=hue,
-                        rng=rng)
+                        id=id)
+        
+    # Vectorized version of random, drawing each trait of n blobs at once.
+    # The fields of mean_traits may be arrays with one mean per blob, and \
+    # positions an (n, 2) array of positions to use instead of random ones.
+    # Returns the columns position, size, speed, hue and radius.
+    def random_columns(*, rng: Generator,
+                          n: int,
+                          mean_traits: BlobTraits,
+                          sdvs: MutationSdvs,
+                          separators: tuple[Rect, Rect],
+                          positions: np.ndarray = None) -> dict[str, np.ndarray]:
+        size = np.maximum(rng.normal(size=n) * sdvs.size + mean_traits.size, Blob.MIN_SIZE)
+        speed = np.maximum(rng.normal(size=n) * sdvs.speed + mean_traits.speed, Blob.MIN_SPEED)
+        radius = utils.radii(size)
+        
+        if positions is None:
+            positions = np.stack((rng.uniform(radius, SIM_WIDTH - radius),
+                                  rng.uniform(radius, SIM_HEIGHT - radius)), axis=1)
+        
+        hue = rng.uniform(0., 360., n)
+        
+        return {'position': utils.bound_positions(positions, radius, separators),
+                'size': size,
+                'speed': speed,
+                'hue': hue,
+                'radius': radius}
+    
+    # Same as random, for n blobs at once (see random_columns).
+    # ids is an iterator the blob ids are taken from, in order.
+    def random_many(*, rng: Generator,
+                       n: int,
+                       mean_traits: BlobTraits,
+                       sdvs: MutationSdvs,
+                       separators: tuple[Rect, Rect],
+                       positions: np.ndarray = None,
+                       ids: Iterator[int] = None) -> list[Self]:
+        columns = Blob.random_columns(rng=rng,
+                                      n=n,
+                                      mean_traits=mean_traits,
+                                      sdvs=sdvs,
+                                      separators=separators,
+                                      positions=positions)
+        
+        return [Blob(traits=BlobTraits(size=size, speed=speed),
+                     position=Vector2(x, y),
+                     hue=hue,
+                     id=next(ids) if ids != None else None)
+                for (x, y), size, speed, hue in zip(columns['position'].tolist(),
+                                                    columns['size'].tolist(),
+                                                    columns['speed'].tolist(),
+                                                    columns['hue'].tolist())]
         
     def __hash__(self):
         return self.id
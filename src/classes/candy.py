@@ -1,6 +1,6 @@
-from collections.abc import Callable
-from uuid import uuid4
-from pygame import Vector2, Rect
+from collections.abc import Callable, Iterator
+import numpy as np
+from classes.geometry import Vector2, Rect
 import math
 from classes.constants import *
 from classes.utils import *
@@ -11,6 +11,8 @@ from typing import Self
 
 
 class Candy():
+    __slots__ = ('size', 'time_to_perish', 'expires', 'position', 'id', '_radius')
+    
     # Determines how much energy a piece \
     # of candy will provide per unit size.
     # ENERGY_SIZE_RATIO = 2000    
@@ -23,22 +25,26 @@ class Candy():
     def __init__(self, *,
                  size = 2.0,
                  position=Vector2(0.0, 0.0),
-                 rng: Generator):
+                 id: int = None):
         self.size = size
         self.time_to_perish: float = self.SHELF_LIFE
+        # Simulated time at which the candy perishes, \
+        # set when it is added to a world.
+        self.expires: float = math.inf
         self.position: Vector2 = position
         
-        self.id = uuid4().int
-        self._rng: Generator = rng
+        self.id = id if id != None else utils.next_id()
+        self._radius = utils.radius(size)
 
     def radius(self) -> float:
-        return utils.radius(self.size)
+        return self._radius
     
     def random(*, rng: Generator,
                   mean_size: float,
                   sdv: float,
                   bounds: Rect,
-                  gen_position: Callable[[], Vector2] = None) -> Self:
+                  gen_position: Callable[[], Vector2] = None,
+                  id: int = None) -> Self:
         size = max(utils.sample_normal(rng=rng,
                                  mean=mean_size,
                                  std_dev=sdv),
@@ -54,7 +60,61 @@ class Candy():
         
         return Candy(size=size,
                      position=position,
-                     rng=rng)
+                     id=id)
+    
+    # Vectorized version of random for n candies.
+    # mean_size, sdv and the bounds may be arrays with one value per candy.
+    # Candies too large for their bounds are dropped, so fewer than n may \
+    # be returned; kept holds the index of each returned candy within the n.
+    # Returns the columns position, size, radius and kept.
+    def random_columns(*, rng: Generator,
+                          n: int,
+                          mean_size,
+                          sdv,
+                          left,
+                          right,
+                          top,
+                          bottom) -> dict[str, np.ndarray]:
+        size = np.maximum(rng.normal(size=n) * sdv + mean_size, Candy.MIN_SIZE)
+        radius = utils.radii(size)
+        
+        kept = np.nonzero(np.broadcast_to(bottom - top, (n,)) >= radius * 2)[0]
+        size, radius = size[kept], radius[kept]
+        
+        def select(values):
+            values = np.broadcast_to(values, (n,))
+            return values[kept]
+        
+        position = np.stack((rng.uniform(select(left), select(right)),
+                             rng.uniform(select(top) + radius, select(bottom) - radius)), axis=1)
+        
+        return {'position': position,
+                'size': size,
+                'radius': radius,
+                'kept': kept}
+    
+    # Same as random, for n candies within bounds (see random_columns).
+    # ids is an iterator the candy ids are taken from, in order.
+    def random_many(*, rng: Generator,
+                       n: int,
+                       mean_size: float,
+                       sdv: float,
+                       bounds: Rect,
+                       ids: Iterator[int] = None) -> list[Self]:
+        columns = Candy.random_columns(rng=rng,
+                                       n=n,
+                                       mean_size=mean_size,
+                                       sdv=sdv,
+                                       left=bounds.left,
+                                       right=bounds.right,
+                                       top=bounds.top,
+                                       bottom=bounds.bottom)
+        
+        return [Candy(size=size,
+                      position=Vector2(x, y),
+                      id=next(ids) if ids != None else None)
+                for (x, y), size in zip(columns['position'].tolist(),
+                                        columns['size'].tolist())]
     
     def __hash__(self):
         return self.id
@@ -0,0 +1,46 @@
+import json
+import numpy as np
+from typing import IO
+
+# Checkpoint file format.
+#
+# A checkpoint is an uncompressed .npz archive with one array per \
+# entity field ('blob_position', 'candy_size', ...), so saving and \
+# loading are plain array copies however many entities there are. \
+# Everything else (parameters, simulated time, id counters, the rng \
+# state) is stored as a JSON document in the 'meta' entry. JSON \
+# keeps the 128-bit integers of the rng state exact.
+#
+# World.save and World.load build on these functions.
+
+VERSION = 2
+
+BLOB_PREFIX = 'blob_'
+CANDY_PREFIX = 'candy_'
+
+
+def write(file: str | IO, meta: dict,
+          blobs: dict[str, np.ndarray],
+          candies: dict[str, np.ndarray]):
+    arrays = {'meta': np.array(json.dumps({**meta, 'version': VERSION}))}
+    arrays.update({BLOB_PREFIX + field: column for field, column in blobs.items()})
+    arrays.update({CANDY_PREFIX + field: column for field, column in candies.items()})
+    np.savez(file, **arrays)
+
+
+# Returns the metadata along with the blob and candy columns.
+def read(file: str | IO) -> tuple[dict, dict[str, np.ndarray], dict[str, np.ndarray]]:
+    with np.load(file) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('version') != VERSION:
+            raise ValueError(f'Unsupported checkpoint version {meta.get("version")!r}, '
+                             f'expected {VERSION}')
+
+        blobs, candies = {}, {}
+        for name in data.files:
+            if name.startswith(BLOB_PREFIX):
+                blobs[name[len(BLOB_PREFIX):]] = data[name]
+            elif name.startswith(CANDY_PREFIX):
+                candies[name[len(CANDY_PREFIX):]] = data[name]
+
+    return (meta, blobs, candies)
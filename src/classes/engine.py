@@ -0,0 +1,577 @@
+import math
+from time import perf_counter_ns
+import numpy as np
+from numpy.random import Generator
+from classes.geometry import Rect
+from classes.blob import Blob, BlobTraits, MutationSdvs
+from classes.candy import Candy
+from classes.constants import *
+from classes import occlusion
+from classes.grid import CellIndex, CELL_SIZE, GRID_COLS, GRID_ROWS
+from classes.obstacles import Obstacles
+from classes.neighbours import NeighbourIndex, Interaction, interaction_accelerations
+from classes.regions import RegionalTraits
+from classes.profiling import lap
+from classes.recording import StepEvents
+from classes.population import *
+from classes.utils import utils
+
+
+# Steps a whole population at once using structure-of-arrays storage.
+#
+# Follows the same rules as Blob._move and World.step.
+
+class ArrayEngine():
+    def __init__(self, *,
+                 rng: Generator,
+                 separators: tuple[Rect, Rect],
+                 mutation_sdvs: MutationSdvs,
+                 candy_energy_density: float,
+                 # Force between nearby blobs while they move, if any.
+                 interaction: Interaction = None):
+        self._rng = rng
+        self._separators = separators
+        self._mutation_sdvs = mutation_sdvs
+        self._candy_energy_d = candy_energy_density
+        self._interaction = interaction
+
+        self.blobs = BlobArrays()
+        self.candies = CandyArrays()
+
+        self._next_id = 0
+
+        # Spatial index over the candies, None when out of date.
+        self._index: CellIndex = None
+        # Same over the blobs, None until asked for after they change.
+        self._neighbours: NeighbourIndex = None
+
+        # Trait statistics per side, kept up to date by step.
+        self.regions = RegionalTraits()
+
+    def _new_ids(self, n: int) -> np.ndarray:
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._next_id += n
+        return ids
+
+    def add_blobs(self, blobs: list[Blob]):
+        columns = blob_columns(blobs, self._new_ids(len(blobs)))
+        self.blobs.append(**columns)
+        self._neighbours = None
+        self.regions.add(columns['position'][:, 0], columns['size'], columns['speed'])
+
+    # The candies added are reported to events, if given.
+    def add_candies(self, candies: list[Candy], events: StepEvents = None):
+        self.add_candy_columns(events, **candy_columns(candies, self._new_ids(len(candies))))
+
+    # Same as add_candies, for candies given as columns.
+    # Ids are assigned here if the columns have none.
+    def add_candy_columns(self, events: StepEvents = None, **columns):
+        if 'id' not in columns:
+            columns['id'] = self._new_ids(len(columns['size']))
+        self.candies.append(**columns)
+        if events != None:
+            events.spawned(columns)
+        self._index = None
+        self._notice_candies(np.arange(len(self.candies) - len(columns['id']), len(self.candies)))
+
+    def _remove_candies(self, mask: np.ndarray):
+        if mask.any():
+            self.candies.keep(~mask)
+            self._index = None
+            # Blobs whose target is gone have to search again.
+            moved = np.cumsum(~mask) - 1
+            moved[mask] = -1
+            self._retarget(moved)
+
+    # Follows the candies to their new indices, given the new index \
+    # of every old one (-1 for removed ones).
+    def _retarget(self, moved: np.ndarray):
+        target = self.blobs.target
+        self.blobs.target = np.where(target >= 0, moved[target], -1)
+
+    # Lowers the clearance of the blobs that the new candies \
+    # (given by index) are closer to (see track_candies).
+    #
+    # Only blobs in the cells around a new candy can have it within \
+    # a clearance of at most Blob.NOTICE_REACH; the few blobs with \
+    # a larger clearance are checked against every new candy.
+    def _notice_candies(self, new: np.ndarray):
+        blobs, candies = self.blobs, self.candies
+        if len(new) == 0 or len(blobs) == 0:
+            return
+
+        blob_layers, candy_layers = self._layers()
+        _, near, dist = self.neighbours().around(candies.position[new],
+                                                 Blob.NOTICE_REACH,
+                                                 candy_layers[new] if candy_layers is not None else None)
+        np.minimum.at(blobs.clearance, near, dist)
+
+        far = np.nonzero(blobs.clearance > Blob.NOTICE_REACH)[0]
+        if len(far) == 0:
+            return
+        # In chunks of about a million pairs.
+        step = max(1, 2**20 // len(far))
+        for start in range(0, len(new), step):
+            chunk = new[start:start + step]
+            delta = candies.position[chunk, None, :] - blobs.position[None, far, :]
+            dist = np.sqrt(delta[..., 0]**2 + delta[..., 1]**2)
+            if blob_layers is not None:
+                dist[candy_layers[chunk, None] != blob_layers[None, far]] = np.inf
+            blobs.clearance[far] = np.minimum(blobs.clearance[far], dist.min(axis=0))
+
+    # Removes the candies that perish at or before time.
+    # The candies removed here and by evict_candies are reported \
+    # to events, if given.
+    def expire_candies(self, time: float, events: StepEvents = None):
+        expired = self.candies.expires <= time
+        if events != None:
+            events.removed(self.candies.id[expired])
+        self._remove_candies(expired)
+
+    # Removes the n oldest candies.
+    def evict_candies(self, n: int, events: StepEvents = None):
+        evicted = np.zeros(len(self.candies), dtype=bool)
+        evicted[:n] = True
+        if events != None:
+            events.removed(self.candies.id[:n])
+        self._remove_candies(evicted)
+
+    # Columns of all blobs and candies and the next free id, \
+    # everything a checkpoint needs to restore the population.
+    def state(self) -> tuple[dict, dict, int]:
+        return (self.blobs.columns(), self.candies.columns(), self._next_id)
+
+    def load_state(self, blobs: dict, candies: dict, next_id: int):
+        self.blobs = BlobArrays()
+        self.blobs.append(**blobs)
+        self.candies = CandyArrays()
+        self.candies.append(**candies)
+        self._next_id = next_id
+        self._index = None
+        self._neighbours = None
+        self._rescan_regions()
+
+    def _rescan_regions(self):
+        self.regions.resync(self.blobs.position[:, 0], self.blobs.size, self.blobs.speed)
+
+    def blob_views(self) -> list[BlobView]:
+        return [BlobView(self.blobs, i) for i in range(len(self.blobs))]
+
+    def candy_views(self) -> list[CandyView]:
+        return [CandyView(self.candies, i) for i in range(len(self.candies))]
+
+    def mean_traits(self) -> tuple[BlobTraits, BlobTraits]:
+        return self.regions.means()
+
+    def trait_variances(self) -> tuple[BlobTraits, BlobTraits]:
+        return self.regions.variances()
+
+    # time is the simulated time at the end of the step.
+    # If sample is given, the phase times and work counts of the step \
+    # are added to it (see classes.profiling).
+    # If events is given, the blobs that died or were born and the \
+    # candies eaten are reported to it.
+    def step(self, timediff: float, time: float,
+             sample: dict[str, int] = None,
+             events: StepEvents = None):
+        blobs = self.blobs
+        timed = sample != None
+        if timed: t = perf_counter_ns()
+
+        old_x = blobs.position[:, 0].copy()
+        self._move(timediff, sample)
+        self.regions.move(old_x, blobs.position[:, 0], blobs.size, blobs.speed)
+        if timed: t = lap(sample, 'move', t)
+
+        blobs.energy -= timediff * Blob.PASSIVE_ENERGY_LOSS * blobs.size
+        blobs.age += timediff
+
+        starved = blobs.energy <= 0
+        if timed: t = lap(sample, 'energy', t)
+
+        # Blobs that die this frame still get to eat, as they do in World.step.
+        eaten = self._eat(events)
+        if timed: t = lap(sample, 'eat', t)
+
+        # Blobs that reached their lifespan reproduce with the energy \
+        # they have after eating, like World._expire_blobs.
+        expired = ~starved & (blobs.expires <= time)
+        parents = expired & (blobs.energy / blobs.max_energy() >= 0.5)
+
+        offspring = self._reproduce(np.nonzero(parents)[0])
+        offspring['expires'] = np.full(len(offspring['id']), time + Blob.LIFESPAN)
+        dead = starved | expired
+        if events != None:
+            events.born(offspring, np.repeat(blobs.id[parents], Blob.N_OFFSPRING))
+            events.died(blobs.id[dead])
+        self.regions.remove(blobs.position[dead, 0], blobs.size[dead], blobs.speed[dead])
+        self.regions.add(offspring['position'][:, 0], offspring['size'], offspring['speed'])
+
+        blobs.keep(~dead)
+        blobs.append(**offspring)
+        self._neighbours = None
+        if self.regions.stale():
+            self._rescan_regions()
+
+        if timed:
+            lap(sample, 'lifecycle', t)
+            sample.update(eaten=eaten,
+                          births=len(offspring['id']),
+                          deaths=int(np.count_nonzero(dead)))
+
+    # Layers of the blobs and of the candies (see CellIndex), \
+    # blobs only see candies in their own layer.
+    # All blobs and candies share a single layer here.
+    def _layers(self) -> tuple[np.ndarray, np.ndarray]:
+        return (None, None)
+
+    # Index over the current candies, rebuilt only after they change.
+    def _candy_index(self) -> CellIndex:
+        if self._index == None:
+            self._index = CellIndex(self.candies.position, self._layers()[1])
+        return self._index
+
+    # Index over the blobs where they are now, built at most once \
+    # between steps, for neighbour queries (see NeighbourIndex).
+    def neighbours(self) -> NeighbourIndex:
+        if self._neighbours == None:
+            self._neighbours = NeighbourIndex(self.blobs.position, self._layers()[0])
+        return self._neighbours
+
+    # Acceleration of every blob due to the interaction, \
+    # None without one.
+    def _pushes(self) -> np.ndarray:
+        if self._interaction == None:
+            return None
+        return interaction_accelerations(self._interaction,
+                                         self.neighbours(),
+                                         self.blobs.position,
+                                         self.blobs.radius)
+
+    def _move(self, timediff: float, sample: dict[str, int] = None):
+        blobs, candies = self.blobs, self.candies
+
+        push = self._pushes()
+        # Without candies, blobs only move when pushed.
+        if len(candies) == 0:
+            if push is None:
+                return
+            closest = np.full(len(blobs), -1, dtype=np.int64)
+        else:
+            closest, scanned, tested = track_candies(blobs.position,
+                                                     candies.position,
+                                                     self._candy_index(),
+                                                     self._separators,
+                                                     self._layers()[0],
+                                                     target=blobs.target,
+                                                     clearance=blobs.clearance)
+            if sample != None:
+                sample['scanned'] = sample.get('scanned', 0) + scanned
+                sample['tested'] = sample.get('tested', 0) + tested
+
+        move_blobs(position=blobs.position,
+                   vel=blobs.vel,
+                   acc=blobs.acc,
+                   energy=blobs.energy,
+                   speed=blobs.speed,
+                   radius=blobs.radius,
+                   size=blobs.size,
+                   targets=candies.position,
+                   closest=closest,
+                   timediff=timediff,
+                   separators=self._separators,
+                   push=push,
+                   clearance=blobs.clearance)
+        self._neighbours = None
+
+    # Returns the number of candies eaten, and reports them to events, if given.
+    def _eat(self, events: StepEvents = None) -> int:
+        blobs, candies = self.blobs, self.candies
+
+        eater = eat_candies(blob_position=blobs.position,
+                            blob_radius=blobs.radius,
+                            candy_position=candies.position,
+                            candy_radius=candies.radius,
+                            index=self._candy_index(),
+                            layers=self._layers()[0])
+        eaten = eater >= 0
+        if events != None:
+            events.eaten(candies.id[eaten], blobs.id[eater[eaten]])
+
+        blobs.energy = np.minimum(blobs.max_energy(),
+                                  blobs.energy + candy_energies(eater,
+                                                                candies.size,
+                                                                self._candy_energy_d,
+                                                                len(blobs)))
+        self._remove_candies(eaten)
+        return int(np.count_nonzero(eaten))
+
+    # Produces the offspring of the given parents (see offspring_columns).
+    def _reproduce(self, parents: np.ndarray) -> dict:
+        blobs = self.blobs
+        columns = offspring_columns(rng=self._rng,
+                                    size=blobs.size[parents],
+                                    speed=blobs.speed[parents],
+                                    position=blobs.position[parents],
+                                    sdvs=self._mutation_sdvs,
+                                    separators=self._separators)
+        columns['id'] = self._new_ids(len(columns['size']))
+        return columns
+
+
+# Blob eating every candy, -1 for candies left uneaten, \
+# once all blobs have moved.
+#
+# A blob eats the candies that lie within its radius (plus 2). \
+# Overlaps are found in one sweep over the cells of index (the \
+# CellIndex of the candies), and a candy overlapped by several blobs \
+# goes to the one whose center is closest to it, or the first of \
+# those if they are just as close, so the outcome does not depend \
+# on the order blobs moved in.
+# With layers, blobs only eat the candies of their own layer.
+def eat_candies(*, blob_position: np.ndarray,
+                blob_radius: np.ndarray,
+                candy_position: np.ndarray,
+                candy_radius: np.ndarray,
+                index: CellIndex,
+                layers: np.ndarray = None) -> np.ndarray:
+    eater = np.full(len(candy_position), -1, dtype=np.int64)
+
+    if len(blob_position) == 0 or len(candy_position) == 0:
+        return eater
+
+    # Only cells within a blob's radius (plus 2) of it need to be checked.
+    reach = int(np.ceil((blob_radius.max() + 2) / CELL_SIZE))
+    offsets = np.array([(dc, dr)
+                        for dc in range(-reach, reach + 1)
+                        for dr in range(-reach, reach + 1)], dtype=np.int64)
+
+    cols, rows = CellIndex.cells(blob_position)
+    owners, items = index.gather_offsets(np.arange(len(blob_position)),
+                                         cols, rows, offsets, layers)
+
+    delta = blob_position[owners] - candy_position[items]
+    dist = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+    overlap = dist + candy_radius[items] - blob_radius[owners] <= 2
+    owners, items, dist = owners[overlap], items[overlap], dist[overlap]
+
+    # First the closest blob of every candy, then the first one.
+    order = np.lexsort((owners, dist, items))
+    owners, items = owners[order], items[order]
+    first = np.ones(len(items), dtype=bool)
+    first[1:] = items[1:] != items[:-1]
+    eater[items[first]] = owners[first]
+    return eater
+
+
+# Energy every one of n blobs gains from the candies it eats \
+# (see eat_candies), to be added to its energy in one go.
+def candy_energies(eater: np.ndarray, size: np.ndarray,
+                   energy_density: float, n: int) -> np.ndarray:
+    eaten = eater >= 0
+    return np.bincount(eater[eaten], energy_density * size[eaten], minlength=n)
+
+
+# Index of the closest visible candy from every one of positions, \
+# -1 if none is visible, along with the number of candies scanned \
+# and tested for visibility.
+#
+# Same ring search as CandyGrid.closest, run for all blobs at once: \
+# each round looks at the next band of rings around every blob that \
+# may still find a closer candy.
+# Every blob is searched for independently of the others, \
+# so any subset of them gives the same result as all of them.
+# With layers, every blob only looks at the candies of its layer in index.
+def closest_candies(positions: np.ndarray,
+                    candy_positions: np.ndarray,
+                    index: CellIndex,
+                    separators: tuple[Rect, Rect],
+                    layers: np.ndarray = None) -> tuple[np.ndarray, int, int]:
+    closest, _, scanned, tested = _search(positions, candy_positions, index,
+                                          separators, layers)
+    return (closest, scanned, tested)
+
+
+# Same as closest_candies, but only searching for blobs whose \
+# previous target may no longer be their closest visible candy.
+#
+# target and clearance are the columns of BlobArrays: the candy every \
+# blob moved towards last, and a lower bound on its distance to every \
+# other candy. A blob keeps its target as long as the target is still \
+# there (see ArrayEngine._remove_candies), is still visible and is \
+# closer than the clearance, in which case a search would find it again; \
+# every other blob is searched for, and its columns updated in place.
+#
+# Searches also work out the clearance from the candies they scanned, so \
+# it has to be kept up to date as the blob moves (see move_blobs) and as \
+# candies are added (see ArrayEngine._notice_candies).
+def track_candies(positions: np.ndarray,
+                  candy_positions: np.ndarray,
+                  index: CellIndex,
+                  separators: tuple[Rect, Rect],
+                  layers: np.ndarray = None, *,
+                  target: np.ndarray,
+                  clearance: np.ndarray) -> tuple[np.ndarray, int, int]:
+    tracked = np.nonzero(target >= 0)[0]
+    targets = candy_positions[target[tracked]]
+    dist = np.sqrt((targets[:, 0] - positions[tracked, 0])**2 +
+                   (targets[:, 1] - positions[tracked, 1])**2)
+    close = dist < clearance[tracked]
+    tracked, dist = tracked[close], dist[close]
+
+    # Targets well within a blob's distance from the obstacles \
+    # cannot be hidden by them, whatever rounding clipping does.
+    unsure = np.ones(len(tracked), dtype=bool)
+    if isinstance(separators, Obstacles):
+        unsure = dist + 2 >= separators.clearance(positions[tracked, 0], positions[tracked, 1])
+    hidden = tracked[unsure][~occlusion.visible(positions[tracked[unsure]],
+                                                candy_positions[target[tracked[unsure]]],
+                                                separators)]
+    tested = np.count_nonzero(unsure)
+    tracked = np.setdiff1d(tracked, hidden, assume_unique=True)
+
+    lost = np.ones(len(positions), dtype=bool)
+    lost[tracked] = False
+    lost = np.nonzero(lost)[0]
+
+    closest, cleared, scanned, searched = _search(positions[lost], candy_positions, index, separators,
+                                                  layers[lost] if layers is not None else None)
+    target[lost] = closest
+    clearance[lost] = cleared
+    return (target.copy(), scanned, tested + searched)
+
+
+# closest_candies, also returning a lower bound on the distance \
+# from every position to every candy (visible or not) other than \
+# its closest visible one.
+def _search(positions: np.ndarray,
+            candy_positions: np.ndarray,
+            index: CellIndex,
+            separators: tuple[Rect, Rect],
+            layers: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, int, int]:
+    closest = np.full(len(positions), -1, dtype=np.int64)
+    # Distance beyond which nothing was left unscanned.
+    clearance = np.full(len(positions), np.inf)
+
+    if len(candy_positions) == 0 or len(positions) == 0:
+        return (closest, clearance, 0, 0)
+
+    best_dist = np.full(len(positions), np.inf)
+    cols, rows = CellIndex.cells(positions)
+    active = np.arange(len(positions))
+    scanned = tested = 0
+    # Every pair scanned, as (owners, items, dist).
+    pairs = []
+
+    for last, offsets in CellIndex.bands():
+        owners, items = index.gather_offsets(active,
+                                             cols[active],
+                                             rows[active],
+                                             offsets,
+                                             layers[active] if layers is not None else None)
+        origins = positions[owners]
+        targets = candy_positions[items]
+        dist = np.sqrt((targets[:, 0] - origins[:, 0])**2 +
+                       (targets[:, 1] - origins[:, 1])**2)
+        pairs.append((owners, items, dist))
+
+        # Only pairs that would improve on the current best need a visibility test.
+        better = dist < best_dist[owners]
+        scanned += len(better)
+        owners, items, dist = owners[better], items[better], dist[better]
+        tested += len(owners)
+        seen = occlusion.visible(positions[owners],
+                                 candy_positions[items],
+                                 separators)
+        owners, items, dist = owners[seen], items[seen], dist[seen]
+
+        # Closest remaining pair of every owner.
+        order = np.lexsort((dist, owners))
+        owners, items, dist = owners[order], items[order], dist[order]
+        first = np.ones(len(owners), dtype=bool)
+        first[1:] = owners[1:] != owners[:-1]
+        closest[owners[first]] = items[first]
+        best_dist[owners[first]] = dist[first]
+
+        x, y = positions[active, 0], positions[active, 1]
+        reach = CellIndex.reach(x, y, cols[active], rows[active], last)
+        done = best_dist[active] <= reach
+        clearance[active[done]] = reach[done]
+        active = active[~done]
+
+        if len(active) == 0:
+            break
+
+    owners, items, dist = (np.concatenate(column) for column in zip(*pairs))
+    other = items != closest[owners]
+    np.minimum.at(clearance, owners[other], dist[other])
+
+    return (closest, clearance, scanned, tested)
+
+
+def _clamp_magnitude(vectors: np.ndarray, limits: np.ndarray) -> np.ndarray:
+    magnitude = np.sqrt(vectors[:, 0]**2 + vectors[:, 1]**2)
+    over = magnitude > limits
+    vectors[over] = vectors[over] * (limits[over] / magnitude[over])[:, None]
+    return vectors
+
+
+# Moves every blob with a closest candy (see closest_candies) towards it, \
+# following Blob._move. Blobs are given as columns; position, vel, acc \
+# and energy are updated in place.
+# push is an (n, 2) array of accelerations added to the blobs' own; \
+# blobs without a candy move too, if they are pushed.
+# clearance, if given, is lowered by how far every blob moved \
+# (see track_candies).
+def move_blobs(*,
+               position: np.ndarray,
+               vel: np.ndarray,
+               acc: np.ndarray,
+               energy: np.ndarray,
+               speed: np.ndarray,
+               radius: np.ndarray,
+               size: np.ndarray,
+               targets: np.ndarray,
+               closest: np.ndarray,
+               timediff: float,
+               separators: tuple[Rect, Rect],
+               push: np.ndarray = None,
+               clearance: np.ndarray = None):
+    moving = closest >= 0
+    # Blobs without a target still move when other blobs push them.
+    if push is not None:
+        moving |= (push != 0).any(axis=1)
+    moving = np.nonzero(moving)[0]
+
+    if len(moving) == 0:
+        return
+
+    start = position[moving]
+    limit = speed[moving]
+
+    aimed = np.nonzero(closest[moving] >= 0)[0]
+    displacement = targets[closest[moving[aimed]]] - start[aimed]
+    dist = np.sqrt(displacement[:, 0]**2 + displacement[:, 1]**2)
+    # A blob sitting exactly on a candy has no direction to move in.
+    dist[dist == 0] = np.inf
+
+    new_acc = np.zeros((len(moving), 2))
+    new_acc[aimed] = Blob.ACC_MULTIPLIER * displacement / dist[:, None]
+    if push is not None:
+        new_acc = new_acc + push[moving]
+    new_vel = _clamp_magnitude(vel[moving] + new_acc * timediff, limit)
+    fvel = _clamp_magnitude(new_vel + 0.2 * new_acc, limit)
+
+    newpos = utils.bound_positions(start + fvel * timediff,
+                                   radius[moving],
+                                   separators)
+    movement = newpos - start
+
+    acc[moving] = new_acc
+    vel[moving] = new_vel
+    position[moving] = newpos
+    moved = np.sqrt(movement[:, 0]**2 + movement[:, 1]**2)
+    energy[moving] -= (Blob.ENERGY_EXP_SIZE_R * size[moving]) * moved * \
+        (1 + Blob.VEL_ENERGY_MULT * np.sqrt(new_vel[:, 0]**2 + new_vel[:, 1]**2))
+    if clearance is not None:
+        clearance[moving] -= moved + Blob.CLEARANCE_SLACK
@@ -0,0 +1,307 @@
+import numpy as np
+from collections.abc import Sequence
+from numpy.random import Generator
+from classes.blob import Blob
+from classes.candy import Candy
+from classes.constants import SIM_WIDTH
+from classes.engine import ArrayEngine
+from classes.population import BlobArrays, CandyArrays, offspring_columns
+from classes.spawn import SpawnTable
+from classes.sweep import FIELDS
+from classes.world import World
+
+# Many replicates of the same simulation, stepped together.
+#
+# The blobs and candies of all replicates are kept in one set of \
+# columns, with the replicate of each entity in a column of its own \
+# and every replicate's entities kept together, in the order a World \
+# of its own would keep them. Every step then takes the same handful \
+# of vectorized operations for all replicates as the 'array' engine \
+# takes for one, and the spatial index keeps replicates apart (see \
+# CellIndex layers), so blobs only ever see their own replicate.
+#
+# Every replicate draws from its own rng, the one a World with its \
+# seed would use, in the same order. A replicate therefore steps \
+# through exactly the same states as World.from_dict(config) with \
+# that seed and the 'array' engine; only the regional means are \
+# computed afresh instead of kept as running values, so they can \
+# differ from the World's in the last few digits.
+
+
+class ReplicateBlobArrays(BlobArrays):
+    FIELDS = BlobArrays.FIELDS + ('replicate',)
+
+    def __init__(self):
+        super().__init__()
+        self.replicate = np.zeros(0, dtype=np.int64)
+
+
+class ReplicateCandyArrays(CandyArrays):
+    FIELDS = CandyArrays.FIELDS + ('replicate',)
+
+    def __init__(self):
+        super().__init__()
+        self.replicate = np.zeros(0, dtype=np.int64)
+
+
+# Position of every entity within its replicate, \
+# for entities grouped by replicate.
+def _ranks(replicate: np.ndarray, n_replicates: int) -> np.ndarray:
+    counts = np.bincount(replicate, minlength=n_replicates)
+    starts = np.cumsum(counts) - counts
+    return np.arange(len(replicate)) - starts[replicate]
+
+
+# Array engine over the entities of several replicates at once.
+class EnsembleEngine(ArrayEngine):
+    def __init__(self, *,
+                 # One per replicate.
+                 rngs: list[Generator],
+                 **kwargs):
+        super().__init__(rng=None, **kwargs)
+        self._rngs = rngs
+
+        self.blobs = ReplicateBlobArrays()
+        self.candies = ReplicateCandyArrays()
+
+        # Next free id of every replicate.
+        self._next_ids = np.zeros(len(rngs), dtype=np.int64)
+
+    def n_replicates(self) -> int:
+        return len(self._rngs)
+
+    # Takes the population of every replicate from the state of \
+    # an ArrayEngine (see ArrayEngine.state), one per replicate.
+    def load_states(self, states: list[tuple[dict, dict, int]]):
+        self.blobs = ReplicateBlobArrays()
+        self.candies = ReplicateCandyArrays()
+        for replicate, (blobs, candies, next_id) in enumerate(states):
+            self.blobs.append(**blobs, replicate=np.full(len(blobs['id']), replicate))
+            self.candies.append(**candies, replicate=np.full(len(candies['id']), replicate))
+            self._next_ids[replicate] = next_id
+        self._index = None
+        self._neighbours = None
+
+    def _layers(self) -> tuple[np.ndarray, np.ndarray]:
+        return (self.blobs.replicate, self.candies.replicate)
+
+    # Ids for new entities of the given replicates, which must be sorted.
+    def _replicate_ids(self, replicate: np.ndarray) -> np.ndarray:
+        ids = self._next_ids[replicate] + _ranks(replicate, self.n_replicates())
+        self._next_ids += np.bincount(replicate, minlength=self.n_replicates())
+        return ids
+
+    # Steps every replicate, following ArrayEngine.step.
+    def step(self, timediff: float, time: float):
+        blobs = self.blobs
+
+        self._move(timediff)
+
+        blobs.energy -= timediff * Blob.PASSIVE_ENERGY_LOSS * blobs.size
+        blobs.age += timediff
+        starved = blobs.energy <= 0
+
+        self._eat()
+
+        expired = ~starved & (blobs.expires <= time)
+        parents = expired & (blobs.energy / blobs.max_energy() >= 0.5)
+
+        offspring = self._reproduce(np.nonzero(parents)[0])
+        offspring['expires'] = np.full(len(offspring['id']), time + Blob.LIFESPAN)
+
+        blobs.keep(~(starved | expired))
+        blobs.append(**offspring)
+        # Offspring go after the other blobs of their replicate.
+        blobs.take(np.argsort(blobs.replicate, kind='stable'))
+        self._neighbours = None
+
+    # Offspring of the given parents, each drawn from the rng of \
+    # its parent's replicate.
+    def _reproduce(self, parents: np.ndarray) -> dict:
+        blobs = self.blobs
+        replicate = blobs.replicate[parents]
+
+        batches = []
+        # Replicates without parents draw nothing, as in a World of their own.
+        for r in np.unique(replicate):
+            mine = parents[replicate == r]
+            columns = offspring_columns(rng=self._rngs[r],
+                                        size=blobs.size[mine],
+                                        speed=blobs.speed[mine],
+                                        position=blobs.position[mine],
+                                        sdvs=self._mutation_sdvs,
+                                        separators=self._separators)
+            columns['replicate'] = np.full(len(columns['size']), r)
+            batches.append(columns)
+
+        if not batches:
+            columns = offspring_columns(rng=self._rngs[0],
+                                        size=np.zeros(0),
+                                        speed=np.zeros(0),
+                                        position=np.zeros((0, 2)),
+                                        sdvs=self._mutation_sdvs,
+                                        separators=self._separators)
+            columns['replicate'] = np.zeros(0, dtype=np.int64)
+            batches.append(columns)
+
+        columns = {field: np.concatenate([batch[field] for batch in batches])
+                   for field in batches[0]}
+        columns['id'] = self._replicate_ids(columns['replicate'])
+        return columns
+
+    # Spawns the candies of every replicate over timediff, then \
+    # drops the oldest candies of every replicate above limit, \
+    # like World._spawn_candy.
+    def spawn_candies(self, table: SpawnTable, *,
+                      timediff: float,
+                      time: float,
+                      limit: int):
+        batches = []
+        for r, rng in enumerate(self._rngs):
+            columns = table.spawn(rng=rng, timediff=timediff, separators=self._separators)
+            columns['replicate'] = np.full(len(columns['size']), r)
+            batches.append(columns)
+
+        columns = {field: np.concatenate([batch[field] for batch in batches])
+                   for field in batches[0]}
+        n = len(columns['size'])
+        if n == 0:
+            return
+
+        columns['expires'] = np.full(n, time + Candy.SHELF_LIFE)
+        columns['id'] = self._replicate_ids(columns['replicate'])
+
+        candies = self.candies
+        n_old = len(candies)
+        candies.append(**columns)
+        order = np.argsort(candies.replicate, kind='stable')
+        candies.take(order)
+        self._index = None
+
+        moved = np.empty(len(order), dtype=np.int64)
+        moved[order] = np.arange(len(order))
+        self._retarget(moved)
+        self._notice_candies(np.nonzero(order >= n_old)[0])
+
+        # The oldest candies of a replicate come first.
+        counts = np.bincount(candies.replicate, minlength=self.n_replicates())
+        excess = np.maximum(counts - limit, 0)
+        self._remove_candies(_ranks(candies.replicate, self.n_replicates()) <
+                             excess[candies.replicate])
+
+    def n_blobs(self) -> np.ndarray:
+        return np.bincount(self.blobs.replicate, minlength=self.n_replicates())
+
+    def n_candies(self) -> np.ndarray:
+        return np.bincount(self.candies.replicate, minlength=self.n_replicates())
+
+    # Mean traits of every replicate and side, as an (R, 2, 2) array \
+    # of [replicate, left / right, size / speed].
+    # Sides without blobs are nan.
+    def replicate_means(self) -> np.ndarray:
+        blobs = self.blobs
+        keys = 2 * blobs.replicate + (blobs.position[:, 0] >= SIM_WIDTH / 2)
+        length = 2 * self.n_replicates()
+
+        counts = np.bincount(keys, minlength=length).astype(float)
+        sums = np.stack((np.bincount(keys, blobs.size, minlength=length),
+                         np.bincount(keys, blobs.speed, minlength=length)), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts[:, None]
+        return means.reshape(self.n_replicates(), 2, 2)
+
+
+# One simulation config run with many seeds at once.
+#
+# Replicates follow the rules of the 'array' engine, whatever \
+# engine config asks for.
+class Ensemble():
+    # Same as World.CANDY_LIMIT, per replicate.
+    CANDY_LIMIT = World.CANDY_LIMIT
+
+    def __init__(self, config: dict, seeds: Sequence[int]):
+        if len(seeds) == 0:
+            raise ValueError('An ensemble needs at least one seed')
+
+        # Every replicate starts out as a World of its own seed, \
+        # and carries on with that World's rng.
+        worlds = [World.from_dict({**config, 'seed': seed, 'engine': 'array'})
+                  for seed in seeds]
+        first = worlds[0]
+
+        self._seeds = list(seeds)
+        self._time: float = 0.
+        self._spawn_table: SpawnTable = first.spawn_table()
+
+        self._engine = EnsembleEngine(rngs=[world.rng() for world in worlds],
+                                      **first.engine_options())
+        self._engine.load_states([world.state_arrays() for world in worlds])
+
+    def seeds(self) -> list[int]:
+        return self._seeds
+
+    def time(self) -> float:
+        return self._time
+
+    # Number of blobs and candies of every replicate, (R,) arrays.
+    def n_blobs(self) -> np.ndarray:
+        return self._engine.n_blobs()
+
+    def n_candies(self) -> np.ndarray:
+        return self._engine.n_candies()
+
+    # See EnsembleEngine.replicate_means.
+    def mean_traits(self) -> np.ndarray:
+        return self._engine.replicate_means()
+
+    # Advances every replicate by timediff, as World.step does.
+    def step(self, timediff: float):
+        self._time += timediff
+        self._engine.step(timediff, self._time)
+        self._engine.spawn_candies(self._spawn_table,
+                                   timediff=timediff,
+                                   time=self._time,
+                                   limit=self.CANDY_LIMIT)
+        self._engine.expire_candies(self._time)
+
+
+# Runs config once per seed, all in one ensemble.
+#
+# Returns the same fields as sweep.run_point, sampled at the same \
+# times: time as a (T,) array, every other field as an (R, T) array \
+# with one row per seed.
+def run(config: dict, seeds: Sequence[int], *,
+        duration: float,
+        dt: float,
+        sample_interval: float) -> dict[str, np.ndarray]:
+    if config.get('fixed_dt') == None:
+        config = {**config, 'fixed_dt': dt}
+
+    ensemble = Ensemble(config, seeds)
+    dt = config['fixed_dt']
+
+    samples = []
+
+    def sample():
+        means = ensemble.mean_traits()
+        samples.append({'time': np.full(len(seeds), ensemble.time()),
+                        'n_blobs': ensemble.n_blobs(),
+                        'n_candies': ensemble.n_candies(),
+                        'l_mean_size': means[:, 0, 0],
+                        'r_mean_size': means[:, 1, 0],
+                        'l_mean_speed': means[:, 0, 1],
+                        'r_mean_speed': means[:, 1, 1]})
+
+    steps = int(round(duration / dt))
+    every = max(1, int(round(sample_interval / dt)))
+
+    sample()
+    for i in range(1, steps + 1):
+        ensemble.step(dt)
+        if i % every == 0:
+            sample()
+
+    columns = {field: np.stack([s[field] for s in samples], axis=1).astype(float)
+               for field in FIELDS}
+    columns['time'] = columns['time'][0]
+    return columns
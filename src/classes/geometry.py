@@ -0,0 +1,147 @@
+import math
+from typing import Self
+
+# Minimal stand-ins for pygame's Vector2 and Rect, so that the \
+# simulation itself can run without importing pygame.
+#
+# Only the parts of the pygame API used by the simulation are provided, \
+# with the same semantics: Rect stores integer coordinates, truncating \
+# floats the way pygame does. Both are sequences, so they can be \
+# handed straight to pygame's drawing functions.
+
+
+class Vector2():
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x: float = 0., y: float = 0.):
+        self.x = float(x)
+        self.y = float(y)
+
+    def magnitude(self) -> float:
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    def __add__(self, other: Self) -> Self:
+        return Vector2(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other: Self) -> Self:
+        return Vector2(self.x - other.x, self.y - other.y)
+
+    def __mul__(self, scalar: float) -> Self:
+        return Vector2(self.x * scalar, self.y * scalar)
+
+    def __rmul__(self, scalar: float) -> Self:
+        return Vector2(scalar * self.x, scalar * self.y)
+
+    def __truediv__(self, scalar: float) -> Self:
+        return Vector2(self.x / scalar, self.y / scalar)
+
+    def __neg__(self) -> Self:
+        return Vector2(-self.x, -self.y)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Vector2):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, index: int) -> float:
+        return (self.x, self.y)[index]
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __repr__(self) -> str:
+        return f'Vector2({self.x}, {self.y})'
+
+
+class Rect():
+    __slots__ = ('x', 'y', 'w', 'h')
+
+    def __init__(self, left: float, top: float, width: float, height: float):
+        self.x = int(left)
+        self.y = int(top)
+        self.w = int(width)
+        self.h = int(height)
+
+    @property
+    def left(self) -> int:
+        return self.x
+
+    @property
+    def top(self) -> int:
+        return self.y
+
+    @property
+    def width(self) -> int:
+        return self.w
+
+    @property
+    def height(self) -> int:
+        return self.h
+
+    @property
+    def right(self) -> int:
+        return self.x + self.w
+
+    @property
+    def bottom(self) -> int:
+        return self.y + self.h
+
+    @property
+    def centerx(self) -> int:
+        return self.x + self.w // 2
+
+    @property
+    def centery(self) -> int:
+        return self.y + self.h // 2
+
+    @property
+    def topleft(self) -> tuple[int, int]:
+        return (self.left, self.top)
+
+    @property
+    def topright(self) -> tuple[int, int]:
+        return (self.right, self.top)
+
+    @property
+    def bottomleft(self) -> tuple[int, int]:
+        return (self.left, self.bottom)
+
+    @property
+    def bottomright(self) -> tuple[int, int]:
+        return (self.right, self.bottom)
+
+    # Same rules as pygame: rects of zero size never collide.
+    def colliderect(self, other: Self) -> bool:
+        if self.w == 0 or self.h == 0 or other.w == 0 or other.h == 0:
+            return False
+        return min(self.x, self.right) < max(other.x, other.right) and \
+               min(self.y, self.bottom) < max(other.y, other.bottom) and \
+               max(self.x, self.right) > min(other.x, other.right) and \
+               max(self.y, self.bottom) > min(other.y, other.bottom)
+
+    def collidelist(self, rects: list[Self]) -> int:
+        for i, rect in enumerate(rects):
+            if self.colliderect(rect):
+                return i
+        return -1
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Rect):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __len__(self) -> int:
+        return 4
+
+    def __getitem__(self, index: int) -> int:
+        return (self.x, self.y, self.w, self.h)[index]
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.w, self.h))
+
+    def __repr__(self) -> str:
+        return f'Rect({self.x}, {self.y}, {self.w}, {self.h})'
@@ -0,0 +1,294 @@
+import math
+import numpy as np
+from collections.abc import Callable, Iterable, Iterator
+from typing import Self
+from classes.geometry import Vector2
+from classes.candy import Candy
+from classes.constants import *
+
+
+# Side length of a grid cell.
+# Should be around the diameter of a blob, so that overlap \
+# queries only have to look at a few cells.
+CELL_SIZE = 40
+
+GRID_COLS = math.ceil(SIM_WIDTH / CELL_SIZE)
+GRID_ROWS = math.ceil(SIM_HEIGHT / CELL_SIZE)
+_N_CELLS = GRID_COLS * GRID_ROWS
+
+
+def _cell(x: float, y: float) -> tuple[int, int]:
+    return (min(max(int(x // CELL_SIZE), 0), GRID_COLS - 1),
+            min(max(int(y // CELL_SIZE), 0), GRID_ROWS - 1))
+
+
+# Distance from (x, y) to the edge of the block of cells within \
+# ring cells of (col, row), i.e. a lower bound on the distance to \
+# any candy outside that block. Sides of the block that reach \
+# the edge of the board do not count, since nothing lies beyond them.
+def _reach(x, y, col, row, ring):
+    reach = math.inf
+    if col - ring > 0:
+        reach = min(reach, x - (col - ring) * CELL_SIZE)
+    if col + ring < GRID_COLS - 1:
+        reach = min(reach, (col + ring + 1) * CELL_SIZE - x)
+    if row - ring > 0:
+        reach = min(reach, y - (row - ring) * CELL_SIZE)
+    if row + ring < GRID_ROWS - 1:
+        reach = min(reach, (row + ring + 1) * CELL_SIZE - y)
+    return reach
+
+
+# Cell offsets at exactly ring cells away (Chebyshev distance).
+def _ring_offsets(ring: int) -> list[tuple[int, int]]:
+    if ring == 0:
+        return [(0, 0)]
+    return [(dc, dr)
+            for dc in range(-ring, ring + 1)
+            for dr in range(-ring, ring + 1)
+            if max(abs(dc), abs(dr)) == ring]
+
+
+# A set of candies that also indexes them by grid cell.
+#
+# Supports the set operations Simulation uses on its candies, \
+# and keeps the index up to date as candies are added and removed, \
+# so that lookups by position only touch nearby cells.
+#
+# Candies are kept in insertion order (dicts are used as ordered \
+# sets), so iteration does not depend on hash values and a world \
+# restored from a checkpoint iterates its candies in the same order.
+class CandyGrid():
+    def __init__(self, candies: Iterable[Candy] = ()):
+        self._candies: dict[Candy, None] = {}
+        self._cells: dict[tuple[int, int], dict[Candy, None]] = {}
+
+        # Running totals of the candies closest has looked at \
+        # and tested for visibility, for profiling.
+        self.scanned = 0
+        self.tested = 0
+        self.update(candies)
+
+    def __len__(self) -> int:
+        return len(self._candies)
+
+    def __iter__(self) -> Iterator[Candy]:
+        return iter(self._candies)
+
+    def __contains__(self, candy: Candy) -> bool:
+        return candy in self._candies
+
+    def add(self, candy: Candy):
+        if candy in self._candies:
+            return
+        self._candies[candy] = None
+        self._cells.setdefault(_cell(candy.position.x, candy.position.y),
+                               {})[candy] = None
+
+    def update(self, candies: Iterable[Candy]):
+        for candy in candies:
+            self.add(candy)
+
+    def remove(self, candy: Candy):
+        del self._candies[candy]
+        cell = _cell(candy.position.x, candy.position.y)
+        del self._cells[cell][candy]
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    # Removes and returns the oldest candy.
+    def pop(self) -> Candy:
+        candy = next(iter(self._candies))
+        self.remove(candy)
+        return candy
+
+    def clear(self):
+        self._candies.clear()
+        self._cells.clear()
+
+    # Candies in the cells overlapping the square of \
+    # half-width radius around position.
+    def near(self, position: Vector2, radius: float) -> Iterator[Candy]:
+        left, top = _cell(position.x - radius, position.y - radius)
+        right, bottom = _cell(position.x + radius, position.y + radius)
+
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                yield from self._cells.get((col, row), ())
+
+    # Closest candy to position that is visible from it.
+    #
+    # Searches rings of cells outwards from position and stops as soon \
+    # as no unsearched cell can hold a closer candy. visible takes an \
+    # (n, 2) array of positions and returns a mask of the visible ones; \
+    # it is called once per ring, on the candies that are closer than \
+    # the best one found so far.
+    def closest(self, position: Vector2, visible: Callable[[np.ndarray], np.ndarray]) -> Candy:
+        return self.closest_clear(position, visible)[0]
+
+    # Same as closest, also returning a lower bound on the distance \
+    # from position to every other candy, visible or not: the closest \
+    # of the other candies it scanned, or the distance to the cells \
+    # it did not get to, whichever is less.
+    def closest_clear(self, position: Vector2,
+                      visible: Callable[[np.ndarray], np.ndarray]) -> tuple[Candy, float]:
+        x, y = position.x, position.y
+        col, row = _cell(x, y)
+
+        best, best_dist = None, math.inf
+        # The two closest candies scanned, visible or not.
+        nearest, nearest_dist, second_dist = None, math.inf, math.inf
+        clearance = math.inf
+
+        for ring, offsets in enumerate(_RINGS):
+            closer = []
+            for dc, dr in offsets:
+                cell = self._cells.get((col + dc, row + dr), ())
+                self.scanned += len(cell)
+                for candy in cell:
+                    dist = math.sqrt((x - candy.position.x)**2 +
+                                     (y - candy.position.y)**2)
+                    if dist < second_dist:
+                        if dist < nearest_dist:
+                            nearest, nearest_dist, second_dist = candy, dist, nearest_dist
+                        else:
+                            second_dist = dist
+                    if dist < best_dist:
+                        closer.append((dist, candy))
+
+            if closer:
+                self.tested += len(closer)
+                positions = np.array([(candy.position.x, candy.position.y)
+                                      for _, candy in closer])
+                for i in np.nonzero(visible(positions))[0]:
+                    if closer[i][0] < best_dist:
+                        best_dist, best = closer[i]
+
+            reach = _reach(x, y, col, row, ring)
+            if best_dist <= reach:
+                clearance = reach
+                break
+
+        return (best, min(clearance, second_dist if nearest is best else nearest_dist))
+
+
+# Read-only index over candy positions stored in an array.
+#
+# Candies are sorted by cell, and each cell refers to a slice \
+# of the sorted order. Used by the array engine to gather the \
+# candies in many cells for many blobs at once.
+#
+# Items may be split into layers (e.g. the replicates of an ensemble), \
+# each with a grid of its own. Owners passed to gather then only \
+# see the items in their own layer.
+class CellIndex():
+    def __init__(self, positions: np.ndarray, layers: np.ndarray = None):
+        cols, rows = CellIndex.cells(positions)
+        cells = cols * GRID_ROWS + rows
+        n_layers = 1
+        if layers is not None:
+            cells = cells + layers * _N_CELLS
+            n_layers = int(layers.max()) + 1 if len(layers) else 1
+
+        self.order = np.argsort(cells, kind='stable')
+        bounds = np.searchsorted(cells[self.order],
+                                 np.arange(n_layers * _N_CELLS + 1))
+        self._start = bounds[:-1]
+        self._count = np.diff(bounds)
+
+    # Index made of the arrays of another one (see arrays), \
+    # e.g. ones that live in shared memory.
+    def from_arrays(order: np.ndarray, start: np.ndarray, count: np.ndarray) -> Self:
+        index = CellIndex.__new__(CellIndex)
+        index.order = order
+        index._start = start
+        index._count = count
+        return index
+
+    # The order, start and count arrays that make up this index.
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (self.order, self._start, self._count)
+
+    def cells(positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        cols = np.clip((positions[..., 0] // CELL_SIZE).astype(np.int64), 0, GRID_COLS - 1)
+        rows = np.clip((positions[..., 1] // CELL_SIZE).astype(np.int64), 0, GRID_ROWS - 1)
+        return (cols, rows)
+
+    # Expands (owner, col, row) triples into (owner, item) pairs, \
+    # one for every item stored in the given cell.
+    # The arguments are arrays of any shape that broadcast together, \
+    # and pairs come out in the (row-major) order of their triples.
+    # Cells outside the grid are ignored, and so are layers the \
+    # index has no items in.
+    def gather(self, owners: np.ndarray,
+               cols: np.ndarray,
+               rows: np.ndarray,
+               layers: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        inside = (cols >= 0) & (cols < GRID_COLS) & (rows >= 0) & (rows < GRID_ROWS)
+        cells = cols * GRID_ROWS + rows
+        if layers is not None:
+            cells = cells + layers * _N_CELLS
+            inside &= cells < len(self._count)
+
+        # Empty cells are dropped before anything is expanded, \
+        # since most cells around a blob usually are.
+        counts = np.where(inside, self._count[np.where(inside, cells, 0)], 0)
+        nonempty = np.nonzero(counts)
+        owners = np.broadcast_to(owners, counts.shape)[nonempty]
+        cells, counts = cells[nonempty], counts[nonempty]
+
+        total = counts.sum()
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty)
+
+        # Position of every pair within the slice of its cell.
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        items = self.order[np.repeat(self._start[cells], counts) + offsets]
+
+        return (np.repeat(owners, counts), items)
+
+    # Same as gather, but for every owner and every cell \
+    # offset in offsets, relative to the owner's own cell.
+    def gather_offsets(self, owners: np.ndarray,
+                       cols: np.ndarray,
+                       rows: np.ndarray,
+                       offsets: np.ndarray,
+                       layers: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        return self.gather(owners[:, None],
+                           cols[:, None] + offsets[None, :, 0],
+                           rows[:, None] + offsets[None, :, 1],
+                           layers[:, None] if layers is not None else None)
+
+    # Splits the rings around a cell into bands that double in width, \
+    # so that a search over the whole grid takes a logarithmic \
+    # number of rounds.
+    # Returns the last ring of every band along with the cell offsets it covers.
+    def bands() -> list[tuple[int, np.ndarray]]:
+        return _BANDS
+
+    # Vectorized version of _reach.
+    def reach(x: np.ndarray, y: np.ndarray,
+              cols: np.ndarray, rows: np.ndarray, ring: int) -> np.ndarray:
+        return np.minimum.reduce([
+            np.where(cols - ring > 0, x - (cols - ring) * CELL_SIZE, np.inf),
+            np.where(cols + ring < GRID_COLS - 1, (cols + ring + 1) * CELL_SIZE - x, np.inf),
+            np.where(rows - ring > 0, y - (rows - ring) * CELL_SIZE, np.inf),
+            np.where(rows + ring < GRID_ROWS - 1, (rows + ring + 1) * CELL_SIZE - y, np.inf),
+        ])
+
+
+def _gen_bands() -> list[tuple[int, np.ndarray]]:
+    bands = []
+    first, last = 0, 0
+    while first < max(GRID_COLS, GRID_ROWS):
+        offsets = [offset
+                   for ring in range(first, last + 1)
+                   for offset in _ring_offsets(ring)]
+        bands.append((last, np.array(offsets, dtype=np.int64)))
+        first, last = last + 1, 2 * last + 1
+    return bands
+
+_BANDS = _gen_bands()
+
+_RINGS = [_ring_offsets(ring) for ring in range(max(GRID_COLS, GRID_ROWS))]
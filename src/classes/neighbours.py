@@ -0,0 +1,199 @@
+import numpy as np
+from typing import Self, Protocol
+from classes.grid import CellIndex, CELL_SIZE
+
+# Neighbour queries between blobs, and the interactions built on them.
+#
+# Blobs are binned into the same grid of cells as the candies (see \
+# CellIndex), once per step, so that every query only compares blobs \
+# in nearby cells and costs about the same per blob however many \
+# there are.
+
+
+# Fixed-radius and k-nearest queries over a set of positions, \
+# answered for all of them at once.
+#
+# The index is a snapshot: it has to be built again once \
+# the positions change.
+# Items may be split into layers (see CellIndex), in which case \
+# they only find neighbours in their own layer.
+class NeighbourIndex():
+    def __init__(self, positions: np.ndarray, layers: np.ndarray = None):
+        self._positions = positions
+        self._layers = layers
+        self._index = CellIndex(positions, layers)
+        self._cols, self._rows = CellIndex.cells(positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _gather(self, owners: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        owners, others = self._index.gather_offsets(owners,
+                                                    self._cols[owners],
+                                                    self._rows[owners],
+                                                    offsets,
+                                                    self._layers[owners] if self._layers is not None else None)
+        distinct = owners != others
+        owners, others = owners[distinct], others[distinct]
+        delta = self._positions[others] - self._positions[owners]
+        return (owners, others, np.sqrt(delta[:, 0]**2 + delta[:, 1]**2))
+
+    # Every pair of distinct items at most radius apart, as \
+    # (owners, others, dist) arrays.
+    # Every pair is listed both ways, sorted by owner and then by other.
+    def within(self, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        reach = int(np.ceil(radius / CELL_SIZE))
+        offsets = np.array([(dc, dr)
+                            for dc in range(-reach, reach + 1)
+                            for dr in range(-reach, reach + 1)], dtype=np.int64)
+
+        owners, others, dist = self._gather(np.arange(len(self)), offsets)
+        close = dist <= radius
+        owners, others, dist = owners[close], others[close], dist[close]
+
+        order = np.lexsort((others, owners))
+        return (owners[order], others[order], dist[order])
+
+    # Every pair of one of points and an item at most radius from it, \
+    # as (points, items, dist) arrays, sorted by point.
+    # With layers (one per point), points only find items in their own layer.
+    def around(self, points: np.ndarray, radius: float,
+               layers: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        reach = int(np.ceil(radius / CELL_SIZE))
+        offsets = np.array([(dc, dr)
+                            for dc in range(-reach, reach + 1)
+                            for dr in range(-reach, reach + 1)], dtype=np.int64)
+
+        cols, rows = CellIndex.cells(points)
+        owners, items = self._index.gather_offsets(np.arange(len(points)), cols, rows,
+                                                   offsets, layers)
+        delta = self._positions[items] - points[owners]
+        dist = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+        close = dist <= radius
+        return (owners[close], items[close], dist[close])
+
+    # The k nearest other items of every item, as an (n, k) array \
+    # of indices sorted by distance (ties by index) and padded with -1, \
+    # along with their distances, padded with inf.
+    #
+    # Searches bands of rings outwards from every item, as \
+    # closest_candies does, until the k-th nearest found so far \
+    # is closer than anything left to search.
+    def nearest(self, k: int) -> tuple[np.ndarray, np.ndarray]:
+        n = len(self)
+        nearest = np.full((n, k), -1, dtype=np.int64)
+        nearest_dist = np.full((n, k), np.inf)
+
+        if k == 0 or n == 0:
+            return (nearest, nearest_dist)
+
+        x, y = self._positions[:, 0], self._positions[:, 1]
+        active = np.arange(n)
+
+        for last, offsets in CellIndex.bands():
+            owners, others, dist = self._gather(active, offsets)
+            better = dist <= nearest_dist[owners, k - 1]
+            owners, others, dist = owners[better], others[better], dist[better]
+
+            # The best found so far compete with the new ones.
+            found = nearest[active] >= 0
+            owners = np.concatenate((np.repeat(active, k)[found.ravel()], owners))
+            others = np.concatenate((nearest[active][found], others))
+            dist = np.concatenate((nearest_dist[active][found], dist))
+
+            order = np.lexsort((others, dist, owners))
+            owners, others, dist = owners[order], others[order], dist[order]
+            first = np.searchsorted(owners, owners)
+            rank = np.arange(len(owners)) - first
+            kept = rank < k
+            nearest[owners[kept], rank[kept]] = others[kept]
+            nearest_dist[owners[kept], rank[kept]] = dist[kept]
+
+            done = nearest_dist[active, k - 1] <= CellIndex.reach(x[active], y[active],
+                                                                  self._cols[active],
+                                                                  self._rows[active],
+                                                                  last)
+            active = active[~done]
+            if len(active) == 0:
+                break
+
+        return (nearest, nearest_dist)
+
+
+# A force between nearby blobs, added to the acceleration of every blob \
+# moving towards a candy (see Blob._move).
+# Engines take any object with these members.
+class Interaction(Protocol):
+    # Furthest apart the edges of two blobs can be for them to interact.
+    reach: float
+
+    # Acceleration of every owner due to its other, one per pair.
+    # offsets is the (m, 2) array of positions of the others relative \
+    # to their owners, dist its lengths (never 0).
+    def accelerations(self, *,
+                      offsets: np.ndarray,
+                      dist: np.ndarray,
+                      owner_radius: np.ndarray,
+                      other_radius: np.ndarray) -> np.ndarray:
+        ...
+
+
+# Blobs closer than margin to each other push each other away, \
+# harder the closer they are, up to strength when they overlap.
+class Crowding():
+    __slots__ = ('strength', 'margin')
+
+    def __init__(self, *,
+                 strength: float = 500.,
+                 margin: float = 10.):
+        self.strength = strength
+        self.margin = margin
+
+    # Fields left out keep their defaults. Unknown fields are an error, \
+    # so that a misspelled one is not silently ignored.
+    def from_dict(obj: dict) -> Self:
+        unknown = set(obj) - set(Crowding.__slots__)
+        if unknown:
+            raise ValueError(f'Unknown crowding fields {sorted(unknown)}, '
+                             f'expected some of {Crowding.__slots__}')
+        return Crowding(**obj)
+
+    def to_dict(self) -> dict:
+        return {'strength': self.strength, 'margin': self.margin}
+
+    @property
+    def reach(self) -> float:
+        return self.margin
+
+    def accelerations(self, *,
+                      offsets: np.ndarray,
+                      dist: np.ndarray,
+                      owner_radius: np.ndarray,
+                      other_radius: np.ndarray) -> np.ndarray:
+        gap = dist - owner_radius - other_radius
+        magnitude = self.strength * np.clip(1 - gap / self.margin, 0, 1)
+        return -offsets * (magnitude / dist)[:, None]
+
+
+# Total acceleration of every blob due to interaction with the \
+# blobs near it, as an (n, 2) array.
+def interaction_accelerations(interaction: Interaction,
+                              neighbours: NeighbourIndex,
+                              positions: np.ndarray,
+                              radius: np.ndarray) -> np.ndarray:
+    total = np.zeros((len(positions), 2))
+    if len(positions) < 2:
+        return total
+
+    owners, others, dist = neighbours.within(2 * radius.max() + interaction.reach)
+    # Blobs on the same spot have no direction to push each other in.
+    close = (dist - radius[owners] - radius[others] <= interaction.reach) & (dist > 0)
+    owners, others, dist = owners[close], others[close], dist[close]
+
+    pushes = interaction.accelerations(offsets=positions[others] - positions[owners],
+                                       dist=dist,
+                                       owner_radius=radius[owners],
+                                       other_radius=radius[others])
+    total[:, 0] = np.bincount(owners, pushes[:, 0], minlength=len(positions))
+    total[:, 1] = np.bincount(owners, pushes[:, 1], minlength=len(positions))
+    return total
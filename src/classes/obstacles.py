@@ -0,0 +1,187 @@
+import math
+import numpy as np
+from collections.abc import Iterable
+from classes.geometry import Rect
+from classes.constants import SIM_WIDTH, SIM_HEIGHT
+
+
+# Pushes circles out of axis-aligned boxes, following the rules \
+# of utils.rect_intersect.
+# Takes the coordinates of many circles and returns their pushed-out \
+# coordinates. The bounds of the box are scalars, or arrays with one \
+# box per circle.
+def push_out_of_boxes(x: np.ndarray, y: np.ndarray, radii: np.ndarray,
+                      left, right, top, bottom) -> tuple[np.ndarray, np.ndarray]:
+    left, right, top, bottom = (np.broadcast_to(bound, x.shape)
+                                for bound in (left, right, top, bottom))
+
+    # Only circles overlapping their box's bounding box can be pushed, \
+    # which is usually none or few of them.
+    near = (x + radii > left) & (x - radii < right) & \
+           (y + radii > top) & (y - radii < bottom)
+    if not near.any():
+        return (x, y)
+    if not near.all():
+        newx, newy = x.copy(), y.copy()
+        newx[near], newy[near] = push_out_of_boxes(x[near], y[near], radii[near],
+                                                   left[near], right[near],
+                                                   top[near], bottom[near])
+        return (newx, newy)
+
+    cleft, cright = (x - radii, x + radii)
+    ctop, cbottom = (y - radii, y + radii)
+
+    newx, newy = x.copy(), y.copy()
+
+    in_rows = (top <= y) & (y <= bottom)
+    hit = in_rows & (cright > left) & (cleft < left)
+    newx[hit] = left[hit] - radii[hit]
+    done = hit
+
+    hit = in_rows & ~done & (cleft < right) & (cright > right)
+    newx[hit] = right[hit] + radii[hit]
+    done = done | hit
+
+    in_cols = ~done & (left <= x) & (x <= right)
+    hit = in_cols & (ctop < bottom) & (cbottom > bottom)
+    newy[hit] = bottom[hit] + radii[hit]
+    done = done | hit
+
+    hit = in_cols & ~done & (cbottom > top) & (ctop < top)
+    newy[hit] = top[hit] - radii[hit]
+    done = done | hit
+
+    # Bottom left, bottom right, top left, top right.
+    for corner_x, corner_y in [(left, bottom), (right, bottom), (left, top), (right, top)]:
+        if done.all():
+            break
+        sx, sy = (corner_x - x, corner_y - y)
+        dist = np.sqrt(sx**2 + sy**2)
+        hit = ~done & (dist < radii) & (dist > 0)
+        newx[hit] = x[hit] + (sx[hit] - (sx[hit] / dist[hit]) * radii[hit])
+        newy[hit] = y[hit] + (sy[hit] - (sy[hit] / dist[hit]) * radii[hit])
+        done = done | hit
+
+    return (newx, newy)
+
+
+# Rects that blobs and candies are kept out of (the separators and any \
+# other obstacles), along with a distance field over the arena that \
+# makes pushing entities out of them cheap.
+#
+# The arena is split into cells of CELL units. For every cell the field \
+# holds its clearance, the distance from the cell to the closest obstacle, \
+# and the obstacles within 2 * REACH of it. An entity whose radius is \
+# within the clearance of its cell cannot touch any obstacle and is done \
+# with after one lookup; any other entity is only checked against the \
+# obstacles near its cell, one at a time and in order, with the rules of \
+# utils.rect_intersect. Pushing entities out thus costs the same however \
+# many obstacles there are, as long as few of them are close together. \
+# Entities larger than REACH are checked against every obstacle.
+#
+# The result is the same as checking every rect in turn, unless being \
+# pushed out of one obstacle moves an entity by more than REACH, onto \
+# another one that was not near where it started.
+#
+# Behaves as the tuple of its rects, so it can be passed wherever \
+# a tuple of rects (e.g. the separators) is taken.
+class Obstacles(tuple):
+    CELL = 20
+    REACH = 64
+
+    def __new__(cls, rects: Iterable[Rect]):
+        return super().__new__(cls, tuple(rects))
+
+    def __init__(self, rects: Iterable[Rect]):
+        self._cols = math.ceil(SIM_WIDTH / self.CELL)
+        self._rows = math.ceil(SIM_HEIGHT / self.CELL)
+
+        bounds = np.array([(rect.left, rect.right, rect.top, rect.bottom) for rect in self],
+                          dtype=np.int64).reshape(-1, 4)
+        self._left, self._right, self._top, self._bottom = bounds.T.copy()
+
+        # Bounds of every cell, indexed by col * rows + row.
+        cols, rows = np.divmod(np.arange(self._cols * self._rows), self._rows)
+        x0, y0 = cols * self.CELL, rows * self.CELL
+        x1, y1 = x0 + self.CELL, y0 + self.CELL
+
+        # Distance from every cell to every obstacle, (cells, obstacles).
+        dx = np.maximum(np.maximum(self._left[None, :] - x1[:, None],
+                                   x0[:, None] - self._right[None, :]), 0)
+        dy = np.maximum(np.maximum(self._top[None, :] - y1[:, None],
+                                   y0[:, None] - self._bottom[None, :]), 0)
+        dist = np.sqrt(dx**2 + dy**2)
+
+        self._clearance = dist.min(axis=1) if len(self) else np.full(len(cols), np.inf)
+
+        # The near obstacles of every cell in order, padded with -1.
+        near = dist < 2 * self.REACH
+        width = int(near.sum(axis=1).max()) if len(self) else 0
+        order = np.argsort(~near, axis=1, kind='stable')[:, :width]
+        self._slots = np.where(np.take_along_axis(near, order, axis=1), order, -1)
+
+        # The same, for looking up one entity at a time.
+        self._cell_clearance: list[float] = self._clearance.tolist()
+        self._cell_rects: list[tuple[Rect, ...]] = [tuple(self[i] for i in slots if i >= 0)
+                                                    for slots in self._slots.tolist()]
+
+    def _cell(self, x: float, y: float) -> int:
+        return min(max(int(x // self.CELL), 0), self._cols - 1) * self._rows + \
+               min(max(int(y // self.CELL), 0), self._rows - 1)
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        cols = np.clip((x // self.CELL).astype(np.int64), 0, self._cols - 1)
+        rows = np.clip((y // self.CELL).astype(np.int64), 0, self._rows - 1)
+        return cols * self._rows + rows
+
+    # Distance from (x, y) to the closest obstacle, at the resolution \
+    # of the field: never more than the exact distance, and at most \
+    # a cell's diagonal less.
+    def clearance(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return self._clearance[self._cells(x, y)]
+
+    # Same as clearance, for a single point.
+    def clearance_at(self, x: float, y: float) -> float:
+        return self._cell_clearance[self._cell(x, y)]
+
+    # The obstacles a circle at (x, y) may overlap, in order.
+    def near(self, x: float, y: float, radius: float) -> tuple[Rect, ...]:
+        cell = self._cell(x, y)
+        if radius <= self._cell_clearance[cell]:
+            return ()
+        if radius > self.REACH:
+            return self
+        return self._cell_rects[cell]
+
+    # Pushes circles out of the obstacles, as if push_out_of_boxes \
+    # was applied for every obstacle in turn.
+    def push_out(self, x: np.ndarray, y: np.ndarray, radii: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        cells = self._cells(x, y)
+        touching = np.nonzero(radii > self._clearance[cells])[0]
+        if len(touching) == 0:
+            return (x, y)
+
+        x, y = x.copy(), y.copy()
+
+        large = radii[touching] > self.REACH
+        if large.any():
+            for i in range(len(self)):
+                which = touching[large]
+                x[which], y[which] = push_out_of_boxes(x[which], y[which], radii[which],
+                                                       self._left[i], self._right[i],
+                                                       self._top[i], self._bottom[i])
+        touching = touching[~large]
+
+        # Every cell's obstacles come first in its slots, \
+        # so the columns only get emptier.
+        slots = self._slots[cells[touching]]
+        for column in slots.T:
+            present = column >= 0
+            if not present.any():
+                break
+            which, obstacle = touching[present], column[present]
+            x[which], y[which] = push_out_of_boxes(x[which], y[which], radii[which],
+                                                   self._left[obstacle], self._right[obstacle],
+                                                   self._top[obstacle], self._bottom[obstacle])
+
+        return (x, y)
@@ -0,0 +1,131 @@
+import numpy as np
+from classes.geometry import Rect
+
+# Batched line-of-sight tests.
+#
+# Rect.clipline hands its arguments to SDL_IntersectRectAndLine, which \
+# truncates every coordinate to an integer and clips the line with \
+# integer Cohen-Sutherland. The functions below run the same algorithm \
+# on whole arrays of segments, so they give exactly the same answers \
+# as calling clipline once per segment.
+
+_TOP = 1
+_BOTTOM = 2
+_LEFT = 4
+_RIGHT = 8
+
+
+def _outcodes(rect: Rect, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    codes = np.where(y < rect.y, _TOP,
+                     np.where(y >= rect.y + rect.h, _BOTTOM, 0))
+    codes |= np.where(x < rect.x, _LEFT,
+                      np.where(x >= rect.x + rect.w, _RIGHT, 0))
+    return codes
+
+
+# Integer division rounding towards zero, like C.
+def _cdiv(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    q = np.abs(a) // np.abs(b)
+    return np.where((a < 0) != (b < 0), -q, q)
+
+
+# Truncates coordinates towards zero, the way pygame converts floats to ints.
+def _ints(values: np.ndarray) -> np.ndarray:
+    return np.trunc(values).astype(np.int64)
+
+
+# Cohen-Sutherland clipping for segments that are neither \
+# trivially accepted nor rejected.
+def _clip(rect: Rect, x1, y1, x2, y2) -> np.ndarray:
+    left, top = rect.x, rect.y
+    right, bottom = rect.x + rect.w - 1, rect.y + rect.h - 1
+
+    result = np.zeros(len(x1), dtype=bool)
+    active = np.arange(len(x1))
+
+    code1 = _outcodes(rect, x1, y1)
+    code2 = _outcodes(rect, x2, y2)
+
+    while len(active):
+        accepted = (code1 == 0) & (code2 == 0)
+        rejected = (code1 & code2) != 0
+        result[active[accepted]] = True
+
+        pending = ~(accepted | rejected)
+        active = active[pending]
+        x1, y1, x2, y2 = x1[pending], y1[pending], x2[pending], y2[pending]
+        code1, code2 = code1[pending], code2[pending]
+
+        # Clip the first point while it is outside, then the second one.
+        first = code1 != 0
+        code = np.where(first, code1, code2)
+
+        horizontal = (code & (_TOP | _BOTTOM)) != 0
+        y = np.where(code & _TOP, top, bottom)
+        x = np.where(code & _LEFT, left, right)
+
+        dy = np.where(horizontal, y2 - y1, 1)
+        dx = np.where(horizontal, 1, x2 - x1)
+        clipped_x = np.where(horizontal, x1 + _cdiv((x2 - x1) * (y - y1), dy), x)
+        clipped_y = np.where(horizontal, y, y1 + _cdiv((y2 - y1) * (x - x1), dx))
+
+        x1 = np.where(first, clipped_x, x1)
+        y1 = np.where(first, clipped_y, y1)
+        x2 = np.where(first, x2, clipped_x)
+        y2 = np.where(first, y2, clipped_y)
+
+        new_codes = _outcodes(rect, clipped_x, clipped_y)
+        code1 = np.where(first, new_codes, code1)
+        code2 = np.where(first, code2, new_codes)
+
+    return result
+
+
+# Whether each segment from start to end touches rect, \
+# i.e. whether rect.clipline(start, end) != ().
+# start and end are (..., 2) arrays that broadcast together.
+def clips(rect: Rect, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    return ~visible(start, end, (rect,))
+
+
+# Whether each target can be seen from its origin, \
+# i.e. the segment between them touches none of the obstacles.
+# origins and targets are (..., 2) arrays that broadcast together.
+def visible(origins: np.ndarray, targets: np.ndarray, obstacles: tuple[Rect, ...]) -> np.ndarray:
+    origins = np.asarray(origins, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+
+    x1, y1 = np.trunc(origins[..., 0]), np.trunc(origins[..., 1])
+    x2, y2 = np.trunc(targets[..., 0]), np.trunc(targets[..., 1])
+
+    shape = np.broadcast_shapes(x1.shape, x2.shape)
+    mask = np.ones(shape, dtype=bool)
+
+    for rect in obstacles:
+        if rect.w <= 0 or rect.h <= 0:
+            continue
+
+        left, top = rect.x, rect.y
+        right, bottom = rect.x + rect.w - 1, rect.y + rect.h - 1
+
+        # Segments with both ends on the same side of the rect cannot touch it.
+        # Checked one axis at a time, since most segments never come close.
+        near = ~(((x1 < left) & (x2 < left)) | ((x1 > right) & (x2 > right)))
+        if not near.any():
+            continue
+        near = near & ~(((y1 < top) & (y2 < top)) | ((y1 > bottom) & (y2 > bottom)))
+        if not near.any():
+            continue
+
+        near = np.nonzero(np.broadcast_to(near, shape))
+        sx1, sy1 = _ints(np.broadcast_to(x1, shape)[near]), _ints(np.broadcast_to(y1, shape)[near])
+        sx2, sy2 = _ints(np.broadcast_to(x2, shape)[near]), _ints(np.broadcast_to(y2, shape)[near])
+
+        # Anything left that is horizontal or vertical has to cross the rect.
+        touches = (sx1 == sx2) | (sy1 == sy2)
+        pending = np.nonzero(~touches)[0]
+        touches[pending] = _clip(rect, sx1[pending], sy1[pending], sx2[pending], sy2[pending])
+
+        mask[near] &= ~touches
+
+    return mask
@@ -0,0 +1,337 @@
+import os
+import weakref
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from classes.geometry import Rect
+from classes.engine import ArrayEngine, track_candies, move_blobs
+from classes.grid import CellIndex, GRID_COLS, GRID_ROWS
+
+
+# Layouts of the shared blocks, as (column, dtype, shape of one row).
+#
+# members holds blob indices sorted by strip (see ParallelEngine._strips).
+_BLOB_LAYOUT = (('position', np.float64, (2,)),
+                ('vel', np.float64, (2,)),
+                ('acc', np.float64, (2,)),
+                ('energy', np.float64, ()),
+                ('target', np.int64, ()),
+                ('clearance', np.float64, ()),
+                ('speed', np.float64, ()),
+                ('radius', np.float64, ()),
+                ('size', np.float64, ()),
+                ('push', np.float64, (2,)),
+                ('members', np.int64, ()))
+
+# The candies and their CellIndex.
+_CANDY_LAYOUT = (('position', np.float64, (2,)),
+                 ('order', np.int64, ()))
+_CELL_LAYOUT = (('start', np.int64, ()),
+                ('count', np.int64, ()))
+
+_N_CELLS = GRID_COLS * GRID_ROWS
+
+_LAYOUTS = {'blobs': _BLOB_LAYOUT,
+            'candies': _CANDY_LAYOUT,
+            'cells': _CELL_LAYOUT}
+
+# Columns of the blobs that moving changes.
+_MOVED = ('position', 'vel', 'acc', 'energy', 'target', 'clearance')
+# Columns moving only reads.
+_READ = ('speed', 'radius', 'size')
+
+
+# Columns of a fixed number of rows in one block of shared memory.
+#
+# The process creating the block and every process attaching to it \
+# by name see the same arrays.
+class SharedColumns():
+    def __init__(self, layout: tuple, capacity: int, name: str = None):
+        rows = [np.dtype(dtype).itemsize * int(np.prod(shape))
+                for _, dtype, shape in layout]
+
+        self.capacity = capacity
+        self._memory = SharedMemory(name=name,
+                                    create=name == None,
+                                    size=max(sum(rows) * capacity, 1))
+        self.name = self._memory.name
+
+        self.arrays: dict[str, np.ndarray] = {}
+        offset = 0
+        for (column, dtype, shape), row in zip(layout, rows):
+            self.arrays[column] = np.ndarray((capacity,) + shape,
+                                             dtype=dtype,
+                                             buffer=self._memory.buf,
+                                             offset=offset)
+            offset += row * capacity
+
+    # Detaches from the block.
+    # No view of the arrays may be left when this is called.
+    def close(self):
+        self.arrays = {}
+        self._memory.close()
+
+    # Frees the block once every process closed it.
+    def unlink(self):
+        self._memory.unlink()
+
+
+# Moves the blobs members[lo:hi] in the shared blocks towards their \
+# closest candies, writing the moved columns back.
+# Returns the candies scanned and tested for visibility.
+def _move_strip(blocks: dict[str, SharedColumns], *,
+                n_candies: int,
+                lo: int,
+                hi: int,
+                timediff: float,
+                separators: tuple[Rect, Rect],
+                push: bool) -> tuple[int, int]:
+    blobs = blocks['blobs'].arrays
+    candies = blocks['candies'].arrays
+    cells = blocks['cells'].arrays
+
+    members = blobs['members'][lo:hi]
+    moved = {column: blobs[column][members] for column in _MOVED}
+    targets = candies['position'][:n_candies]
+    index = CellIndex.from_arrays(candies['order'][:n_candies],
+                                  cells['start'][:_N_CELLS],
+                                  cells['count'][:_N_CELLS])
+
+    closest, scanned, tested = track_candies(moved['position'], targets,
+                                             index, separators,
+                                             target=moved['target'],
+                                             clearance=moved['clearance'])
+    move_blobs(position=moved['position'],
+               vel=moved['vel'],
+               acc=moved['acc'],
+               energy=moved['energy'],
+               clearance=moved['clearance'],
+               **{column: blobs[column][members] for column in _READ},
+               targets=targets,
+               closest=closest,
+               timediff=timediff,
+               separators=separators,
+               push=blobs['push'][members] if push else None)
+
+    for column in _MOVED:
+        blobs[column][members] = moved[column]
+    return (scanned, tested)
+
+
+# Main loop of a worker process.
+#
+# Every message names the shared blocks and the strip to move; \
+# the reply is the work counts, or the exception raised. \
+# None stops the worker.
+def _work(connection: Connection, separators: tuple[Rect, Rect]):
+    blocks: dict[str, SharedColumns] = {}
+
+    while True:
+        message = connection.recv()
+        if message == None:
+            break
+
+        try:
+            # Blocks are replaced when they grow.
+            for role, (name, capacity) in message['blocks'].items():
+                if role in blocks and blocks[role].name == name:
+                    continue
+                if role in blocks:
+                    blocks[role].close()
+                blocks[role] = SharedColumns(_LAYOUTS[role], capacity, name)
+
+            reply = _move_strip(blocks,
+                                n_candies=message['n_candies'],
+                                lo=message['lo'],
+                                hi=message['hi'],
+                                timediff=message['timediff'],
+                                separators=separators,
+                                push=message['push'])
+        except Exception as error:
+            reply = error
+        connection.send(reply)
+
+    for block in blocks.values():
+        block.close()
+
+
+# Stops the workers and frees the shared blocks.
+# Kept apart from ParallelEngine so that it can run as its finalizer.
+def _shutdown(processes: list, connections: list[Connection],
+              blocks: dict[str, SharedColumns]):
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for process in processes:
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+    for block in blocks.values():
+        block.close()
+        block.unlink()
+    processes.clear()
+    connections.clear()
+    blocks.clear()
+
+
+# Array engine that moves blobs on several cores.
+#
+# Every step, the arena is split into vertical strips holding the same \
+# number of blobs, and the blobs of each strip are moved (the closest \
+# candy search and the movement, most of the time of a step) by a \
+# worker process, over copies of the blob and candy arrays kept in \
+# shared memory. This process moves one of the strips itself.
+#
+# Strips are drawn again every step from where the blobs are, so a \
+# blob that crossed into a neighbouring strip is handed over to that \
+# strip's worker on the next step. Every worker sees all candies, so \
+# a blob whose closest candy lies in another strip (or on the other \
+# side of the separators) finds the same one as in a single process.
+#
+# Eating, energy and the lifecycle stay in this process, where \
+# contested candies and reproduction are resolved in a fixed order. \
+# Moving a blob does not depend on any other blob, so steps give \
+# exactly the same results as the 'array' engine, for any number \
+# of workers.
+class ParallelEngine(ArrayEngine):
+    # Fewest blobs worth giving a strip of their own. \
+    # Smaller populations take fewer strips, down to stepping \
+    # in this process alone, where handing them over costs more \
+    # than it saves.
+    MIN_STRIP = 500
+
+    def __init__(self, *,
+                 # Processes moving blobs, including this one.
+                 # None uses every core.
+                 workers: int = None,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self._n_workers = max(workers or os.cpu_count() or 1, 1)
+
+        # Worker processes and their ends of the pipes, \
+        # started on the first step that needs them.
+        self._processes: list = []
+        self._connections: list[Connection] = []
+
+        self._blocks: dict[str, SharedColumns] = {}
+        # Index whose arrays are in the shared blocks.
+        self._shared_index: CellIndex = None
+
+        # Stops the workers once the engine is collected, or at exit.
+        weakref.finalize(self, _shutdown, self._processes,
+                         self._connections, self._blocks)
+
+    def _start_workers(self):
+        # Spawned rather than forked, since the UI may be running threads.
+        context = multiprocessing.get_context('spawn')
+        while len(self._processes) < self._n_workers - 1:
+            ours, theirs = context.Pipe()
+            process = context.Process(target=_work,
+                                      args=(theirs, self._separators),
+                                      daemon=True)
+            process.start()
+            theirs.close()
+            self._processes.append(process)
+            self._connections.append(ours)
+
+    # Makes room for n rows in the block of role.
+    def _reserve(self, role: str, n: int) -> SharedColumns:
+        block = self._blocks.get(role)
+        if block != None and block.capacity >= n:
+            return block
+
+        if block != None:
+            block.close()
+            block.unlink()
+        capacity = max(n, 2 * block.capacity if block != None else 1024)
+        self._blocks[role] = SharedColumns(_LAYOUTS[role], capacity)
+        if role != 'blobs':
+            self._shared_index = None
+        return self._blocks[role]
+
+    # Copies what moving reads into the shared blocks, \
+    # along with the blobs' pushes if there are any.
+    def _share(self, push: np.ndarray):
+        blobs, candies = self.blobs, self.candies
+        n, m = len(blobs), len(candies)
+
+        shared = self._reserve('blobs', n).arrays
+        for column in _MOVED + _READ:
+            shared[column][:n] = getattr(blobs, column)
+        if push is not None:
+            shared['push'][:n] = push
+
+        self._reserve('candies', m)
+        self._reserve('cells', _N_CELLS)
+
+        # The candies only change between some steps.
+        index = self._candy_index()
+        if index is not self._shared_index:
+            order, start, count = index.arrays()
+            self._blocks['candies'].arrays['position'][:m] = candies.position
+            self._blocks['candies'].arrays['order'][:m] = order
+            self._blocks['cells'].arrays['start'][:_N_CELLS] = start
+            self._blocks['cells'].arrays['count'][:_N_CELLS] = count
+            self._shared_index = index
+
+    # Splits the blobs into n vertical strips of about the same size.
+    # Writes the blobs of every strip, left to right, into the shared \
+    # members column and returns the bounds of every strip in it.
+    def _strips(self, n: int) -> np.ndarray:
+        blobs = self.blobs
+        members = self._blocks['blobs'].arrays['members']
+        members[:len(blobs)] = np.argsort(blobs.position[:, 0], kind='stable')
+        return np.linspace(0, len(blobs), n + 1).astype(np.int64)
+
+    def _move(self, timediff: float, sample: dict[str, int] = None):
+        blobs, candies = self.blobs, self.candies
+        n_strips = min(self._n_workers, len(blobs) // self.MIN_STRIP)
+
+        if len(candies) == 0 or n_strips < 2:
+            return super()._move(timediff, sample)
+
+        # Pushes come from where all blobs are before any of them moves.
+        push = self._pushes()
+
+        self._start_workers()
+        self._share(push)
+        bounds = self._strips(n_strips)
+
+        blocks = {role: (block.name, block.capacity)
+                  for role, block in self._blocks.items()}
+        for connection, lo, hi in zip(self._connections, bounds[1:-1], bounds[2:]):
+            connection.send({'blocks': blocks,
+                             'n_candies': len(candies),
+                             'lo': int(lo),
+                             'hi': int(hi),
+                             'timediff': timediff,
+                             'push': push is not None})
+
+        try:
+            replies = [_move_strip(self._blocks,
+                                   n_candies=len(candies),
+                                   lo=0,
+                                   hi=int(bounds[1]),
+                                   timediff=timediff,
+                                   separators=self._separators,
+                                   push=push is not None)]
+        except Exception as error:
+            replies = [error]
+        # Every worker has to answer before the next step, even after an error.
+        replies += [connection.recv()
+                    for connection in self._connections[:n_strips - 1]]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+
+        shared = self._blocks['blobs'].arrays
+        for column in _MOVED:
+            getattr(blobs, column)[:] = shared[column][:len(blobs)]
+        self._neighbours = None
+
+        if sample != None:
+            sample['scanned'] = sample.get('scanned', 0) + sum(scanned for scanned, _ in replies)
+            sample['tested'] = sample.get('tested', 0) + sum(tested for _, tested in replies)
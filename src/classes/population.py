@@ -0,0 +1,296 @@
+import math
+import numpy as np
+from numpy.random import Generator
+from classes.geometry import Vector2, Rect
+from classes.blob import Blob, BlobTraits, MutationSdvs
+from classes.constants import SIZE_SCALE
+from classes.candy import Candy
+from classes.utils import utils
+
+
+# Structure-of-arrays storage for a group of entities.
+# Every field is a numpy array whose first axis is the entity index, \
+# so a whole population can be updated with a handful of vectorized \
+# operations instead of one Python call per entity.
+class _Columns():
+    FIELDS: tuple[str, ...] = ()
+
+    # Fields of FIELDS that only cache what can be worked out again \
+    # from the rest, with the value new entities start out with.
+    # They are left out of columns, so they are never saved.
+    CACHED: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def columns(self) -> dict[str, np.ndarray]:
+        return {field: getattr(self, field) for field in self.FIELDS
+                if field not in self.CACHED}
+
+    # Appends a batch of entities.
+    # Every field in FIELDS must be present in columns, \
+    # except for the cached ones.
+    def append(self, **columns):
+        n = len(columns['id'])
+        for field in self.FIELDS:
+            new = columns[field] if field in columns else np.full(n, self.CACHED[field])
+            setattr(self, field, np.concatenate((getattr(self, field), new)))
+
+    # Drops every entity whose entry in mask is False, \
+    # preserving the order of the remaining entities.
+    def keep(self, mask: np.ndarray):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field)[mask])
+
+    # Keeps the entities at indices, in that order.
+    def take(self, indices: np.ndarray):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field)[indices])
+
+
+class BlobArrays(_Columns):
+    FIELDS = ('id', 'position', 'vel', 'acc', 'energy',
+              'age', 'size', 'speed', 'hue', 'radius', 'expires',
+              'target', 'clearance')
+    CACHED = {'target': -1, 'clearance': -np.inf}
+
+    def __init__(self):
+        self.id = np.zeros(0, dtype=np.int64)
+        self.position = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.acc = np.zeros((0, 2))
+        self.energy = np.zeros(0)
+        self.age = np.zeros(0)
+        self.size = np.zeros(0)
+        self.speed = np.zeros(0)
+        self.hue = np.zeros(0)
+        # Derived from size, cached since it is needed every frame.
+        self.radius = np.zeros(0)
+        # Simulated time at which each blob reaches its lifespan.
+        self.expires = np.zeros(0)
+        # Index of the candy each blob last moved towards (-1 for none), \
+        # and a lower bound on its distance to every other candy \
+        # (see track_candies).
+        self.target = np.zeros(0, dtype=np.int64)
+        self.clearance = np.zeros(0)
+
+    def max_energy(self) -> np.ndarray:
+        return Blob.ENERGY_SIZE_R * self.size
+
+
+class CandyArrays(_Columns):
+    FIELDS = ('id', 'position', 'size', 'radius', 'expires')
+
+    def __init__(self):
+        self.id = np.zeros(0, dtype=np.int64)
+        self.position = np.zeros((0, 2))
+        self.size = np.zeros(0)
+        self.radius = np.zeros(0)
+        # Simulated time at which each candy perishes.
+        self.expires = np.zeros(0)
+
+
+# Read-only views used for rendering and inspection.
+# A view refers to an index into the arrays, so it is only \
+# valid until the population is next stepped.
+class BlobView():
+    __slots__ = ('_blobs', '_index')
+
+    def __init__(self, blobs: BlobArrays, index: int):
+        self._blobs = blobs
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return int(self._blobs.id[self._index])
+
+    @property
+    def position(self) -> Vector2:
+        return Vector2(*self._blobs.position[self._index])
+
+    @property
+    def vel(self) -> Vector2:
+        return Vector2(*self._blobs.vel[self._index])
+
+    @property
+    def acc(self) -> Vector2:
+        return Vector2(*self._blobs.acc[self._index])
+
+    @property
+    def traits(self) -> BlobTraits:
+        return BlobTraits(size=float(self._blobs.size[self._index]),
+                          speed=float(self._blobs.speed[self._index]))
+
+    @property
+    def energy(self) -> float:
+        return float(self._blobs.energy[self._index])
+
+    @property
+    def max_energy(self) -> float:
+        return Blob.ENERGY_SIZE_R * float(self._blobs.size[self._index])
+
+    @property
+    def age(self) -> float:
+        return float(self._blobs.age[self._index])
+
+    @property
+    def hue(self) -> float:
+        return float(self._blobs.hue[self._index])
+
+    def radius(self) -> float:
+        return float(self._blobs.radius[self._index])
+
+
+class CandyView():
+    __slots__ = ('_candies', '_index')
+
+    def __init__(self, candies: CandyArrays, index: int):
+        self._candies = candies
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return int(self._candies.id[self._index])
+
+    @property
+    def position(self) -> Vector2:
+        return Vector2(*self._candies.position[self._index])
+
+    @property
+    def size(self) -> float:
+        return float(self._candies.size[self._index])
+
+    def radius(self) -> float:
+        return float(self._candies.radius[self._index])
+
+
+# Offspring positions around each of centers.
+def _offspring_positions(rng: Generator,
+                         centers: np.ndarray,
+                         separators: tuple[Rect, Rect]) -> np.ndarray:
+    n = len(centers)
+    area = Blob.OFFSPRING_AREA
+
+    angle = rng.uniform(0, 2*math.pi, n)
+    r = np.sqrt(rng.uniform(0, area * SIZE_SCALE, n) / (2 * math.pi))
+
+    centers = utils.bound_positions(centers,
+                                    np.full(n, utils.radius(area)),
+                                    separators)
+
+    return centers + np.stack((r * np.cos(angle), r * np.sin(angle)), axis=1)
+
+
+# Columns (all but id and expires) of the offspring of parents \
+# with the given traits and positions.
+#
+# Each offspring is generated from the previous one: the second \
+# offspring mutates from the first and is placed around it, and so on. \
+# The offspring of each parent are kept next to each other.
+def offspring_columns(*, rng: Generator,
+                      size: np.ndarray,
+                      speed: np.ndarray,
+                      position: np.ndarray,
+                      sdvs: MutationSdvs,
+                      separators: tuple[Rect, Rect]) -> dict[str, np.ndarray]:
+    n = len(size)
+
+    generations = []
+    for _ in range(Blob.N_OFFSPRING):
+        columns = Blob.random_columns(rng=rng,
+                                      n=n,
+                                      mean_traits=BlobTraits(size=size, speed=speed),
+                                      sdvs=sdvs,
+                                      separators=separators,
+                                      positions=_offspring_positions(rng, position, separators))
+        # Bounded a second time, as blobs have always been.
+        columns['position'] = utils.bound_positions(columns['position'], columns['radius'], separators)
+
+        size, speed, position = columns['size'], columns['speed'], columns['position']
+        generations.append(columns)
+
+    total = n * Blob.N_OFFSPRING
+    columns = {field: np.stack([g[field] for g in generations], axis=1)
+                        .reshape((total,) + generations[0][field].shape[1:])
+               for field in generations[0]}
+
+    columns['vel'] = np.zeros((total, 2))
+    columns['acc'] = np.zeros((total, 2))
+    columns['age'] = np.zeros(total)
+    columns['energy'] = Blob.ENERGY_SIZE_R * columns['size'] / 2
+
+    return columns
+
+
+# Converts blob objects into columns.
+# Ids are assigned by the caller, since the array engine \
+# numbers its entities separately.
+def blob_columns(blobs: list[Blob], ids: np.ndarray) -> dict:
+    n = len(blobs)
+    return {
+        'id': ids,
+        'position': np.array([(b.position.x, b.position.y) for b in blobs],
+                             dtype=float).reshape(n, 2),
+        'vel': np.array([(b.vel.x, b.vel.y) for b in blobs],
+                        dtype=float).reshape(n, 2),
+        'acc': np.array([(b.acc.x, b.acc.y) for b in blobs],
+                        dtype=float).reshape(n, 2),
+        'energy': np.array([b.energy for b in blobs], dtype=float),
+        'age': np.array([b.age for b in blobs], dtype=float),
+        'size': np.array([b.traits.size for b in blobs], dtype=float),
+        'speed': np.array([b.traits.speed for b in blobs], dtype=float),
+        'hue': np.array([b.hue for b in blobs], dtype=float),
+        'radius': np.array([b.radius() for b in blobs], dtype=float),
+        'expires': np.array([b.expires for b in blobs], dtype=float),
+    }
+
+
+def candy_columns(candies: list[Candy], ids: np.ndarray) -> dict:
+    n = len(candies)
+    return {
+        'id': ids,
+        'position': np.array([(c.position.x, c.position.y) for c in candies],
+                             dtype=float).reshape(n, 2),
+        'size': np.array([c.size for c in candies], dtype=float),
+        'radius': np.array([c.radius() for c in candies], dtype=float),
+        'expires': np.array([c.expires for c in candies], dtype=float),
+    }
+
+
+# Inverse of blob_columns, creates a blob object for every row.
+def blobs_from_columns(columns: dict) -> list[Blob]:
+    blobs = []
+    for id, (x, y), (vx, vy), (ax, ay), energy, age, size, speed, hue, expires in zip(
+            columns['id'].tolist(),
+            columns['position'].tolist(),
+            columns['vel'].tolist(),
+            columns['acc'].tolist(),
+            columns['energy'].tolist(),
+            columns['age'].tolist(),
+            columns['size'].tolist(),
+            columns['speed'].tolist(),
+            columns['hue'].tolist(),
+            columns['expires'].tolist()):
+        blob = Blob(traits=BlobTraits(size=size, speed=speed),
+                    position=Vector2(x, y),
+                    hue=hue,
+                    id=id)
+        blob.vel = Vector2(vx, vy)
+        blob.acc = Vector2(ax, ay)
+        blob.energy = energy
+        blob.age = age
+        blob.expires = expires
+        blobs.append(blob)
+    return blobs
+
+
+def candies_from_columns(columns: dict) -> list[Candy]:
+    candies = []
+    for id, (x, y), size, expires in zip(columns['id'].tolist(),
+                                         columns['position'].tolist(),
+                                         columns['size'].tolist(),
+                                         columns['expires'].tolist()):
+        candy = Candy(size=size, position=Vector2(x, y), id=id)
+        candy.expires = expires
+        candies.append(candy)
+    return candies
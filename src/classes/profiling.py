@@ -0,0 +1,115 @@
+import csv
+import json
+import threading
+from collections import deque
+from time import perf_counter_ns, time
+from typing import IO, Self
+import numpy as np
+
+# Phases the time of a step or frame is split into, in nanoseconds.
+#
+# move, energy, eat: the per-blob part of a step (energy covers \
+# passive energy loss, aging and starvation).
+# lifecycle: blobs reaching their lifespan, reproduction, \
+# and adding and removing blobs (with the regional statistics).
+# spawn, expire: candies appearing and perishing.
+# stats: sampling SimStats.
+# record: writing the step to the world's recorder, if it has one.
+# step: all of World.step.
+# draw: Simulation.draw; ui: the toolbar and overlays.
+PHASES = ('move', 'energy', 'eat', 'lifecycle', 'spawn', 'expire', 'stats',
+          'record', 'step', 'draw', 'ui')
+
+# Work done during a step.
+#
+# scanned: candies whose distance to a blob was computed \
+# while looking for its closest candy.
+# tested: candies tested for visibility.
+COUNTERS = ('scanned', 'tested', 'eaten', 'births', 'deaths', 'spawns')
+
+
+# Adds the time since start to phase in sample.
+# Returns the current time, to be passed as start of the next phase.
+def lap(sample: dict[str, int], phase: str, start: int) -> int:
+    now = perf_counter_ns()
+    sample[phase] = sample.get(phase, 0) + now - start
+    return now
+
+
+# Writes every sample a Profiler records to a file, \
+# as JSON lines or as CSV with one column per phase and counter.
+class ProfileWriter():
+    FORMATS = ('jsonl', 'csv')
+
+    def __init__(self, file: IO, format: str = 'jsonl'):
+        if format not in self.FORMATS:
+            raise ValueError(f'Unknown format {format!r}, expected one of {self.FORMATS}')
+
+        self._file = file
+        self._format = format
+        # Samples can come from the simulation and the render thread.
+        self._lock = threading.Lock()
+
+        if format == 'csv':
+            self._csv = csv.DictWriter(file, fieldnames=('wall_time',) + PHASES + COUNTERS,
+                                       restval='')
+            self._csv.writeheader()
+
+    # Picks the format from the extension of path.
+    def open(path: str) -> Self:
+        return ProfileWriter(open(path, 'w', newline=''),
+                             'csv' if path.endswith('.csv') else 'jsonl')
+
+    def write(self, sample: dict[str, int]):
+        row = {'wall_time': time(), **sample}
+        with self._lock:
+            if self._format == 'csv':
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(row) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+# Rolling record of how long the phases of a step or frame take, \
+# and how much work they do.
+#
+# World.step and Simulation.draw record a sample (a dict of phase \
+# times and counters) into their profiler, if they have one. Without \
+# a profiler they skip all measuring, so instrumentation costs only \
+# a few checks per step.
+class Profiler():
+    def __init__(self, *,
+                 # Number of samples kept per phase or counter.
+                 window: int = 300,
+                 output: ProfileWriter = None):
+        self._series: dict[str, deque[int]] = {name: deque(maxlen=window)
+                                                for name in PHASES + COUNTERS}
+        self._output = output
+
+    def record(self, sample: dict[str, int]):
+        for name, value in sample.items():
+            self._series[name].append(value)
+
+        if self._output != None:
+            self._output.write(sample)
+
+    # Recorded values of name, oldest first.
+    def series(self, name: str) -> np.ndarray:
+        return np.array(self._series[name], dtype=np.int64)
+
+    # Percentiles q of every phase (in milliseconds) and counter \
+    # over the kept samples, leaving out those never recorded.
+    def percentiles(self, q: tuple[float, ...] = (50, 90, 99)) -> dict[str, np.ndarray]:
+        result = {}
+        for name in PHASES + COUNTERS:
+            values = self.series(name)
+            if len(values) == 0:
+                continue
+            result[name] = np.percentile(values, q) / (1e6 if name in PHASES else 1)
+        return result
+
+    def close(self):
+        if self._output != None:
+            self._output.close()
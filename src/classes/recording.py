@@ -0,0 +1,466 @@
+import os
+import json
+import struct
+import numpy as np
+from collections.abc import Callable
+from typing import IO, Self
+from classes.blob import BlobTraits
+from classes.utils import utils
+from classes.constants import SIM_WIDTH
+
+# Recording of a run as a compact stream of events, and replaying it \
+# without simulating.
+#
+# A recording is a file of frames, one per step, each holding what \
+# happened during that step: the blobs that died and the ones born \
+# (with their parent and traits), the candies spawned, eaten (and by \
+# whom) or otherwise removed, and how far every other blob moved. \
+# Every keyframe_interval frames, and whenever a step cannot be written \
+# as a delta, a frame also holds the full state (a keyframe), so that \
+# any point in time is at most keyframe_interval frames from one.
+#
+# Positions are stored in fixed point, in units of 1 / SCALE: as int32 \
+# in keyframes, births and spawns, and as int16 differences to the \
+# previous frame otherwise. Differences are taken between the rounded \
+# positions, so decoding never drifts from what was recorded. Traits \
+# and candy sizes are stored as float32.
+#
+# The file starts with MAGIC, the length of a JSON header (the config \
+# of the world and the parameters above) and the header itself. Frames \
+# follow, each made of FRAME_HEADER (its kind, simulated time, length \
+# in bytes and the number of records in each of SECTIONS) and then the \
+# records of every section, padded to 8 bytes. Frames are only ever \
+# appended, so a recording can be read while it is still being written, \
+# and a frame cut short by a crash is simply not there yet.
+
+MAGIC = b'BLOBREC\0'
+VERSION = 1
+
+SCALE = 64
+
+DELTA = 0
+KEYFRAME = 1
+
+_BLOB_FIELDS = [('id', '<i8'), ('position', '<i4', (2,)),
+                ('size', '<f4'), ('speed', '<f4'), ('hue', '<f4')]
+_CANDY_FIELDS = [('id', '<i8'), ('position', '<i4', (2,)), ('size', '<f4')]
+
+# Records of every section of a frame, in the order they are stored.
+#
+# deaths: ids of the blobs that died.
+# births: the blobs born, with the id of their parent.
+# moves: position differences of every blob that was there before \
+# and still is, in the order of the previous frame.
+# spawns: the candies that appeared.
+# eats: ids of the candies eaten, with the blob that ate them.
+# removals: ids of the candies that perished or were evicted.
+# blobs, candies: the full state, in keyframes only.
+SECTIONS = {
+    'deaths': np.dtype('<i8'),
+    'births': np.dtype(_BLOB_FIELDS + [('parent', '<i8')]),
+    'moves': np.dtype(('<i2', (2,))),
+    'spawns': np.dtype(_CANDY_FIELDS),
+    'eats': np.dtype([('candy', '<i8'), ('blob', '<i8')]),
+    'removals': np.dtype('<i8'),
+    'blobs': np.dtype(_BLOB_FIELDS),
+    'candies': np.dtype(_CANDY_FIELDS),
+}
+
+# Frame magic, kind, time, length, then one count per section.
+FRAME_HEADER = struct.Struct('<4sIdQ' + 'I' * len(SECTIONS))
+_FRAME_MAGIC = b'FRAM'
+
+_META_LENGTH = struct.Struct('<I')
+
+_MAX_MOVE = np.iinfo(np.int16).max
+
+_NO_IDS = np.zeros(0, dtype=np.int64)
+
+
+def _padding(n: int) -> bytes:
+    return b'\0' * (-n % 8)
+
+
+# Mask of the values that are in among.
+# Both engines keep their ids in increasing order, which makes this \
+# a binary search, several times faster than np.isin for a few \
+# thousand ids.
+def _isin(values: np.ndarray, among: np.ndarray) -> np.ndarray:
+    if len(values) == 0 or len(among) == 0:
+        return np.zeros(len(values), dtype=bool)
+    if not (among[1:] > among[:-1]).all():
+        return np.isin(values, among)
+    at = np.minimum(np.searchsorted(among, values), len(among) - 1)
+    return among[at] == values
+
+
+def _quantize(position: np.ndarray) -> np.ndarray:
+    return np.rint(position * SCALE).astype(np.int32)
+
+
+def _records(section: str, columns: dict[str, np.ndarray]) -> np.ndarray:
+    dtype = SECTIONS[section]
+    records = np.empty(len(columns['id']), dtype)
+    for field in dtype.names:
+        records[field] = columns[field]
+    return records
+
+
+# What happened during a step that the state after it does not show, \
+# reported by World.step and the engines as it happens.
+# Every kind of event may be reported several times in a step, \
+# and nothing is built for the kinds that are not.
+class StepEvents():
+    def __init__(self):
+        self._sections: dict[str, list[np.ndarray]] = {}
+
+    def _add(self, section: str, records: np.ndarray):
+        if len(records):
+            self._sections.setdefault(section, []).append(records)
+
+    def died(self, ids: np.ndarray):
+        self._add('deaths', np.asarray(ids, dtype=np.int64))
+
+    # blobs has the columns id, position, size, speed and hue, \
+    # parents the id of the parent of every one of them.
+    def born(self, blobs: dict[str, np.ndarray], parents: np.ndarray):
+        if len(blobs['id']):
+            self._add('births', _records('births', {**blobs,
+                                                    'position': _quantize(blobs['position']),
+                                                    'parent': parents}))
+
+    # candies has the columns id, position and size.
+    def spawned(self, candies: dict[str, np.ndarray]):
+        if len(candies['id']):
+            self._add('spawns', _records('spawns', {**candies,
+                                                    'position': _quantize(candies['position'])}))
+
+    def eaten(self, candies: np.ndarray, blobs: np.ndarray):
+        if len(candies):
+            eats = np.empty(len(candies), SECTIONS['eats'])
+            eats['candy'], eats['blob'] = candies, blobs
+            self._add('eats', eats)
+
+    # Candies that perished or were evicted.
+    def removed(self, ids: np.ndarray):
+        self._add('removals', np.asarray(ids, dtype=np.int64))
+
+    # The records of every section reported (see SECTIONS).
+    def sections(self) -> dict[str, np.ndarray]:
+        return {section: records[0] if len(records) == 1 else np.concatenate(records)
+                for section, records in self._sections.items()}
+
+
+# Writes the steps of a world to a file as they are taken.
+#
+# World.step hands every step to its recorder, if it has one. The \
+# first step recorded is written as a keyframe.
+class EventRecorder():
+    KEYFRAME_INTERVAL = 100
+
+    def __init__(self, file: IO, config: dict, *,
+                 # Frames between keyframes.
+                 keyframe_interval: int = KEYFRAME_INTERVAL):
+        self._file = file
+        self._keyframe_interval = keyframe_interval
+
+        meta = json.dumps({'version': VERSION,
+                           'scale': SCALE,
+                           'keyframe_interval': keyframe_interval,
+                           'config': config}).encode()
+        start = MAGIC + _META_LENGTH.pack(len(meta)) + meta
+        file.write(start + _padding(len(start)))
+
+        # Blob ids and rounded positions as of the last frame, \
+        # in the order the next frame's moves refer to them. \
+        # The ids are kept up to date from the deaths and births \
+        # rather than read from the world.
+        self._blob_ids: np.ndarray = None
+        self._positions: np.ndarray = None
+        self._since_keyframe = 0
+
+    def open(path: str, config: dict, **kwargs) -> Self:
+        return EventRecorder(open(path, 'wb'), config, **kwargs)
+
+    # Writes one step.
+    #
+    # positions are those of all blobs after the step, in the order of \
+    # the world. Survivors must keep their order and the newborn come \
+    # after them, as both engines do. entities returns the columns of \
+    # World.entity_columns and is only called for keyframes.
+    def record(self, time: float,
+               positions: np.ndarray,
+               events: StepEvents,
+               entities: Callable[[], tuple[dict[str, np.ndarray], dict[str, np.ndarray]]]):
+        positions = _quantize(positions)
+        sections = events.sections()
+        deaths = sections.get('deaths', _NO_IDS)
+        births = sections.get('births')
+
+        keyframe = self._blob_ids is None or self._since_keyframe + 1 >= self._keyframe_interval
+        if not keyframe:
+            # None when every blob survived, which saves the lookup.
+            alive = ~_isin(self._blob_ids, np.sort(deaths)) if len(deaths) else None
+            previous = self._positions if alive is None else self._positions[alive]
+            n_born = len(births) if births is not None else 0
+
+            if len(previous) + n_born == len(positions):
+                moves = positions[:len(previous)] - previous
+                if len(moves) == 0 or np.abs(moves).max() <= _MAX_MOVE:
+                    sections['moves'] = moves.astype(np.int16)
+                else:
+                    keyframe = True
+            else:
+                keyframe = True
+
+        if keyframe:
+            blobs, candies = entities()
+            ids = blobs['id'].copy()
+            sections['blobs'] = _records('blobs', {**blobs, 'position': positions})
+            sections['candies'] = _records('candies', {**candies,
+                                                       'position': _quantize(candies['position'])})
+            sections.pop('moves', None)
+        else:
+            ids = self._blob_ids if alive is None else self._blob_ids[alive]
+            if births is not None:
+                ids = np.concatenate((ids, births['id']))
+
+        self._write(KEYFRAME if keyframe else DELTA, time, sections)
+
+        self._blob_ids = ids
+        self._positions = positions
+        self._since_keyframe = 0 if keyframe else self._since_keyframe + 1
+
+    def _write(self, kind: int, time: float, sections: dict[str, np.ndarray]):
+        chunks = []
+        counts = []
+        for section in SECTIONS:
+            records = sections.get(section)
+            counts.append(len(records) if records is not None else 0)
+            if records is not None and len(records):
+                # The base of moves is the int16 of its pairs.
+                data = np.ascontiguousarray(records, SECTIONS[section].base).tobytes()
+                chunks += [data, _padding(len(data))]
+
+        length = FRAME_HEADER.size + sum(len(chunk) for chunk in chunks)
+        self._file.write(b''.join([FRAME_HEADER.pack(_FRAME_MAGIC, kind, time, length, *counts)] +
+                                  chunks))
+        # Readers following the file see it up to the last keyframe.
+        if kind == KEYFRAME:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# The state of a recorded world at one frame.
+#
+# blobs has the columns id, position (rounded, see SCALE), size, speed \
+# and hue; candies has id, position and size. Neither is ever modified, \
+# so a state stays valid while the recording is read further.
+class ReplayState():
+    def __init__(self, *,
+                 frame: int,
+                 time: float,
+                 blobs: dict[str, np.ndarray],
+                 candies: dict[str, np.ndarray]):
+        self.frame = frame
+        self.time = time
+        self.blobs = blobs
+        self.candies = candies
+
+    def n_blobs(self) -> int:
+        return len(self.blobs['id'])
+
+    def n_candies(self) -> int:
+        return len(self.candies['id'])
+
+    # Same as World.blob_shapes.
+    def blob_shapes(self) -> dict[str, np.ndarray]:
+        return {'position': self.blobs['position'] / SCALE,
+                'radius': utils.radii(self.blobs['size'].astype(float)),
+                'hue': self.blobs['hue'].astype(float)}
+
+    # Same as World.candy_shapes.
+    def candy_shapes(self) -> dict[str, np.ndarray]:
+        return {'position': self.candies['position'] / SCALE,
+                'radius': utils.radii(self.candies['size'].astype(float))}
+
+    # Same as World.mean_traits.
+    def mean_traits(self) -> tuple[BlobTraits, BlobTraits]:
+        left = self.blobs['position'][:, 0] < SIM_WIDTH / 2 * SCALE
+        means = []
+        for side in (left, ~left):
+            if not side.any():
+                means.append(BlobTraits(size=None, speed=None))
+                continue
+            means.append(BlobTraits(size=float(self.blobs['size'][side].mean(dtype=float)),
+                                    speed=float(self.blobs['speed'][side].mean(dtype=float))))
+        return tuple(means)
+
+
+def _columns(records: np.ndarray) -> dict[str, np.ndarray]:
+    return {field: records[field] for field in records.dtype.names if field != 'parent'}
+
+
+def _concat(columns: dict[str, np.ndarray], records: np.ndarray) -> dict[str, np.ndarray]:
+    if len(records) == 0:
+        return columns
+    return {field: np.concatenate((column, records[field])) for field, column in columns.items()}
+
+
+def _keep(columns: dict[str, np.ndarray], keep: np.ndarray) -> dict[str, np.ndarray]:
+    if keep.all():
+        return columns
+    return {field: column[keep] for field, column in columns.items()}
+
+
+# A recording written by EventRecorder, memory-mapped for reading.
+#
+# The frame headers are scanned once, which gives the time and offset \
+# of every frame along with the keyframe it decodes from. Finding the \
+# state at any time then takes a binary search over the frame times, \
+# a lookup of its keyframe and decoding at most keyframe_interval \
+# frames. The last state decoded is kept, so that stepping forwards \
+# only decodes the frames in between.
+class Recording():
+    def __init__(self, path: str):
+        self._path = path
+        self._data: np.ndarray = None
+        self.meta: dict = None
+
+        self._offsets: list[int] = []
+        self._kinds: list[int] = []
+        self._times: list[float] = []
+        # Last keyframe at or before every frame.
+        self._keyframes: list[int] = []
+        # Offset of the first frame not scanned yet.
+        self._end: int = None
+
+        self._time_array = np.zeros(0)
+        self._state: ReplayState = None
+
+        self.refresh()
+        if len(self) == 0:
+            raise ValueError(f'{path} holds no frames')
+
+    # Picks up the frames written since the recording was opened, \
+    # for recordings still being written.
+    # Returns the number of new frames.
+    def refresh(self) -> int:
+        size = os.path.getsize(self._path)
+        if self._data is not None and size == len(self._data):
+            return 0
+        self._data = np.memmap(self._path, dtype=np.uint8, mode='r')
+
+        if self.meta == None:
+            self._read_meta()
+
+        n = len(self._offsets)
+        while self._end + FRAME_HEADER.size <= size:
+            magic, kind, time, length, *_ = FRAME_HEADER.unpack_from(self._data, self._end)
+            if magic != _FRAME_MAGIC:
+                raise ValueError(f'Corrupt frame at byte {self._end} of {self._path}')
+            if self._end + length > size:
+                break
+            if kind != KEYFRAME and not self._keyframes:
+                raise ValueError(f'{self._path} does not start with a keyframe')
+
+            self._keyframes.append(len(self._offsets) if kind == KEYFRAME else self._keyframes[-1])
+            self._offsets.append(self._end)
+            self._kinds.append(kind)
+            self._times.append(time)
+            self._end += length
+
+        self._time_array = np.array(self._times)
+        return len(self._offsets) - n
+
+    def _read_meta(self):
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{self._path} is not a recording')
+        (length,) = _META_LENGTH.unpack_from(self._data, len(MAGIC))
+        start = len(MAGIC) + _META_LENGTH.size
+        self.meta = json.loads(bytes(self._data[start:start + length]))
+        if self.meta.get('version') != VERSION:
+            raise ValueError(f'Unsupported recording version {self.meta.get("version")!r}, '
+                             f'expected {VERSION}')
+        self._end = start + length + len(_padding(start + length))
+
+    # Config of the recorded world, as taken by World.from_dict.
+    def config(self) -> dict:
+        return self.meta['config']
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    # Simulated time of every frame.
+    def times(self) -> np.ndarray:
+        return self._time_array
+
+    # Last frame at or before time (the first one if there is none).
+    def frame_at(self, time: float) -> int:
+        return max(int(np.searchsorted(self._time_array, time, side='right')) - 1, 0)
+
+    def keyframe_of(self, frame: int) -> int:
+        return self._keyframes[frame]
+
+    # The records of every section of a frame (see SECTIONS), \
+    # as read-only views of the file.
+    def events(self, frame: int) -> dict[str, np.ndarray]:
+        offset = self._offsets[frame]
+        _, _, _, _, *counts = FRAME_HEADER.unpack_from(self._data, offset)
+        offset += FRAME_HEADER.size
+
+        sections = {}
+        for (section, dtype), count in zip(SECTIONS.items(), counts):
+            sections[section] = np.frombuffer(self._data, dtype, count, offset)
+            offset += count * dtype.itemsize
+            offset += -offset % 8
+        return sections
+
+    # State of the world at frame.
+    def state(self, frame: int) -> ReplayState:
+        frame = min(max(frame, 0), len(self) - 1)
+        keyframe = self._keyframes[frame]
+
+        state = self._state
+        if state == None or not keyframe <= state.frame <= frame:
+            state = None
+            first = keyframe
+        else:
+            first = state.frame + 1
+
+        for i in range(first, frame + 1):
+            state = self._advance(state, i)
+
+        self._state = state
+        return state
+
+    # Same as state, for the last frame at or before time.
+    def state_at(self, time: float) -> ReplayState:
+        return self.state(self.frame_at(time))
+
+    def _advance(self, state: ReplayState, frame: int) -> ReplayState:
+        sections = self.events(frame)
+
+        if self._kinds[frame] == KEYFRAME:
+            return ReplayState(frame=frame,
+                               time=self._times[frame],
+                               blobs=_columns(sections['blobs']),
+                               candies=_columns(sections['candies']))
+
+        blobs = _keep(state.blobs, ~np.isin(state.blobs['id'], sections['deaths']))
+        if len(sections['moves']):
+            blobs = {**blobs, 'position': blobs['position'] + sections['moves']}
+        blobs = _concat(blobs, sections['births'])
+
+        # Spawned first, as a candy may be evicted in the step it appeared.
+        candies = _concat(state.candies, sections['spawns'])
+        gone = np.concatenate((sections['eats']['candy'], sections['removals']))
+        candies = _keep(candies, ~np.isin(candies['id'], gone))
+
+        return ReplayState(frame=frame, time=self._times[frame], blobs=blobs, candies=candies)
+
+    def close(self):
+        self._data = None
+        self._state = None
@@ -0,0 +1,150 @@
+import numpy as np
+from classes.blob import BlobTraits
+from classes.constants import SIM_WIDTH
+
+# Running trait statistics for each side of the separator.
+#
+# Counts, means and sums of squared deviations are updated as blobs \
+# are born, die or cross SIM_WIDTH / 2, so reading them costs O(1) \
+# instead of a pass over the population. Batches are merged into (and \
+# taken out of) the running values with the pairwise form of Welford's \
+# algorithm (Chan et al.).
+#
+# Taking batches out again cancels: the sums of squares left are \
+# differences of larger numbers, with the rounding error of the largest \
+# sum reached. So a side is reset exactly once it is empty, and the \
+# owner rebuilds the whole from a full rescan (see resync) when a sum \
+# of squares falls far below its peak, and every RESYNC_INTERVAL \
+# removals regardless.
+
+
+# Count, mean and sum of squared deviations of the rows of values.
+def _moments(values: np.ndarray) -> tuple[int, np.ndarray, np.ndarray]:
+    mean = values.mean(axis=0)
+    return (len(values), mean, ((values - mean)**2).sum(axis=0))
+
+
+class Moments():
+    # The rounding error of m2 is a small multiple of 1e-16 of its peak, \
+    # so rescanning once m2 falls below this fraction of the peak keeps \
+    # the relative error of the variance near 1e-10.
+    CANCELLATION = 1e-5
+
+    def __init__(self, k: int):
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        # Largest m2 since the last reset, which bounds its rounding error.
+        self.peak = np.zeros(k)
+
+    def merge(self, n: int, mean: np.ndarray, m2: np.ndarray):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.n * n / total)
+        self.peak = np.maximum(self.peak, self.m2)
+        self.n = total
+
+    # Inverse of merge, for a batch that was merged earlier.
+    def unmerge(self, n: int, mean: np.ndarray, m2: np.ndarray):
+        if n == 0:
+            return
+        rest = self.n - n
+        if rest <= 0:
+            self.n = 0
+            self.mean = np.zeros_like(self.mean)
+            self.m2 = np.zeros_like(self.m2)
+            self.peak = np.zeros_like(self.peak)
+            return
+        rest_mean = (self.n * self.mean - n * mean) / rest
+        delta = mean - rest_mean
+        self.m2 = np.maximum(self.m2 - m2 - delta**2 * (rest * n / self.n), 0.)
+        self.mean = rest_mean
+        self.n = rest
+
+    # Whether m2 fell so far below its peak that its rounding error \
+    # may show in the variance.
+    def cancelled(self) -> bool:
+        return bool(np.any(self.m2 < self.peak * self.CANCELLATION))
+
+    # Population variance (divided by n, not n - 1).
+    def variance(self) -> np.ndarray:
+        return self.m2 / self.n
+
+
+class RegionalTraits():
+    # Blobs taken out between two rescans.
+    RESYNC_INTERVAL = 4096
+
+    def __init__(self):
+        # Left and right of SIM_WIDTH / 2, over (size, speed).
+        self._sides = (Moments(2), Moments(2))
+        self._removed = 0
+
+    def _apply(self, x, size, speed, remove: bool):
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        if len(x) == 0:
+            return
+        values = np.stack((np.atleast_1d(np.asarray(size, dtype=float)),
+                           np.atleast_1d(np.asarray(speed, dtype=float))), axis=1)
+
+        left = x < SIM_WIDTH / 2
+        for side, mask in zip(self._sides, (left, ~left)):
+            if mask.any():
+                moments = _moments(values[mask])
+                if remove:
+                    side.unmerge(*moments)
+                else:
+                    side.merge(*moments)
+
+    # Blobs born at x. Arguments are scalars or arrays of equal length.
+    def add(self, x, size, speed):
+        self._apply(x, size, speed, remove=False)
+
+    # Blobs last seen at x that died.
+    def remove(self, x, size, speed):
+        self._removed += np.size(x)
+        self._apply(x, size, speed, remove=True)
+
+    # Blobs that moved from old_x to new_x.
+    # Only the ones that changed sides are passed on.
+    def move(self, old_x: np.ndarray, new_x: np.ndarray, size: np.ndarray, speed: np.ndarray):
+        crossed = (old_x < SIM_WIDTH / 2) != (new_x < SIM_WIDTH / 2)
+        if crossed.any():
+            self.remove(old_x[crossed], size[crossed], speed[crossed])
+            self.add(new_x[crossed], size[crossed], speed[crossed])
+
+    def clear(self):
+        self._sides = (Moments(2), Moments(2))
+        self._removed = 0
+
+    # Whether a rescan is due, after enough blobs were taken out or \
+    # a side's sums of squares cancelled.
+    def stale(self) -> bool:
+        return (self._removed >= self.RESYNC_INTERVAL or
+                any(side.cancelled() for side in self._sides))
+
+    # Starts over from every blob there is.
+    def resync(self, x, size, speed):
+        self.clear()
+        self.add(x, size, speed)
+
+    def counts(self) -> tuple[int, int]:
+        return (self._sides[0].n, self._sides[1].n)
+
+    def means(self) -> tuple[BlobTraits, BlobTraits]:
+        return tuple(BlobTraits(size=float(side.mean[0]), speed=float(side.mean[1]))
+                     if side.n != 0 else BlobTraits(size=None, speed=None)
+                     for side in self._sides)
+
+    def variances(self) -> tuple[BlobTraits, BlobTraits]:
+        variances = []
+        for side in self._sides:
+            if side.n == 0:
+                variances.append(BlobTraits(size=None, speed=None))
+                continue
+            var = side.variance()
+            variances.append(BlobTraits(size=float(var[0]), speed=float(var[1])))
+        return tuple(variances)
@@ -0,0 +1,35 @@
+import heapq
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+# Priority queue of things that are due at a given simulated time.
+#
+# Events are ordered by time and then by id, so events due at the \
+# same time always come out in the same order, and a scheduler can \
+# be rebuilt from its items alone (e.g. after loading a checkpoint).
+#
+# Events are never cancelled: an item that has gone away (a candy \
+# that was eaten, a blob that starved) stays queued, and whoever \
+# consumes the events skips it when it comes due.
+class Scheduler(Generic[T]):
+    def __init__(self):
+        self._events: list[tuple[float, int, T]] = []
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    # Queues item to come due at time.
+    # id must be unique among the queued items.
+    def schedule(self, time: float, id: int, item: T):
+        heapq.heappush(self._events, (time, id, item))
+
+    # Removes and yields, in order, every item due at or before time.
+    def due(self, time: float) -> Iterator[T]:
+        events = self._events
+        while events and events[0][0] <= time:
+            yield heapq.heappop(events)[2]
+
+    def clear(self):
+        self._events.clear()
@@ -0,0 +1,70 @@
+import numpy as np
+from numpy.random import Generator
+from classes.geometry import Rect
+from classes.candy import Candy
+from classes.utils import utils
+
+# Candy spawning over a fixed set of vertical strips ("intervals").
+#
+# Everything that only depends on where a strip lies (its bounds, \
+# spawn rate, mean candy size and size deviation) is worked out once \
+# into arrays. Spawning a frame's candies is then a single Poisson draw \
+# for their total number, one draw per candy to pick its strip (which \
+# splits the total into independent Poisson counts per strip), and a \
+# few batched draws for the candies themselves. None of it depends on \
+# the number of strips.
+class SpawnTable():
+    def __init__(self, *,
+                 # Bounds of every strip, (n,) arrays.
+                 left: np.ndarray,
+                 right: np.ndarray,
+                 top: np.ndarray,
+                 bottom: np.ndarray,
+                 # Expected number of candies per simulated second in every strip.
+                 rates: np.ndarray,
+                 mean_sizes: np.ndarray,
+                 sdvs: np.ndarray):
+        self.left = left
+        self.right = right
+        self.top = top
+        self.bottom = bottom
+        self.rates = rates
+        self.mean_sizes = mean_sizes
+        self.sdvs = sdvs
+
+        self._total_rate = float(rates.sum())
+        # Cumulative share of every strip in the total rate.
+        self._shares = np.cumsum(rates) / self._total_rate if self._total_rate > 0 else None
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    # Candies spawned over timediff seconds, as columns \
+    # (position, size, radius) without ids.
+    #
+    # Same distribution as Candy.random in every strip: candies too large \
+    # to fit in their strip are dropped, the rest are placed uniformly \
+    # and then bounded away from the walls and separators.
+    def spawn(self, *, rng: Generator,
+              timediff: float,
+              separators: tuple[Rect, Rect]) -> dict[str, np.ndarray]:
+        n = rng.poisson(self._total_rate * timediff) if self._total_rate > 0 else 0
+
+        if n == 0:
+            return {'position': np.zeros((0, 2)), 'size': np.zeros(0), 'radius': np.zeros(0)}
+
+        strips = np.minimum(np.searchsorted(self._shares, rng.random(n), side='right'),
+                            len(self._shares) - 1)
+
+        columns = Candy.random_columns(rng=rng,
+                                       n=n,
+                                       mean_size=self.mean_sizes[strips],
+                                       sdv=self.sdvs[strips],
+                                       left=self.left[strips],
+                                       right=self.right[strips],
+                                       top=self.top[strips],
+                                       bottom=self.bottom[strips])
+
+        return {'position': utils.bound_positions(columns['position'], columns['radius'], separators),
+                'size': columns['size'],
+                'radius': columns['radius']}
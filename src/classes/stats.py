@@ -1,4 +1,5 @@
-from pandas import DataFrame
+import os
+import numpy as np
 
 class DataPoint():
     def __init__(self, *,
@@ -14,22 +15,145 @@ class DataPoint():
         self.r_mean_speed = r_mean_speed
 
 
-class SimStats():
-    def __init__(self):
-        self.means = DataFrame({
-            'time': [],
-            'l_mean_size': [],
-            'r_mean_size': [],
-            'l_mean_speed': [],
-            'r_mean_speed': []
-        })
-        
-    def add_data(self, data: DataPoint):
-        self.means.loc[len(self.means)] = [data.time,
-                                           data.l_mean_size,
-                                           data.r_mean_size,
-                                           data.l_mean_speed,
-                                           data.r_mean_speed]
+# Time series of float fields, stored column by column.
+#
+# Samples are written into a preallocated chunk of chunk_size rows; \
+# when it fills up it is either kept in memory or, if a directory \
+# is given, saved there as segment_<n>.npy and dropped, so memory \
+# use stays bounded however long the run. Each segment is a \
+# (fields, rows) array, i.e. every column is contiguous, and is \
+# memory-mapped again when read.
+#
+# Missing values (e.g. the mean size of an empty side) are stored as nan.
+#
+# With a sample_interval, samples are kept on a grid of that interval \
+# starting at the first sample's time, at most one per slot. Slots are \
+# counted rather than compared with the previous sample's time, so that \
+# times summed from many small steps (which fall just short of a slot) \
+# do not make every sample a step late.
+class Recorder():
+    CHUNK_SIZE = 4096
+    # Fraction of sample_interval a sample may come early by.
+    SLOT_TOLERANCE = 1e-6
+
+    def __init__(self, fields: tuple[str, ...], *,
+                 # Smallest gap in time between two samples, \
+                 # samples arriving sooner are dropped.
+                 sample_interval: float = 0.,
+                 chunk_size: int = CHUNK_SIZE,
+                 # Where full chunks are written, None keeps them in memory.
+                 directory: str = None):
+        if 'time' not in fields:
+            raise ValueError("Recorder fields must include 'time'")
+
+        self.fields = tuple(fields)
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+        self._sample_interval = sample_interval
+        self._chunk_size = chunk_size
+        self._directory = directory
+
+        self._chunk = np.empty((len(self.fields), chunk_size))
+        self._rows = 0
+
+        # Full chunks kept in memory, or paths of the segments written.
+        self._chunks: list[np.ndarray] = []
+        self._segments: list[str] = []
+
+        self._length = 0
+        # Time of the first sample, and the slot the next sample \
+        # has to fall in or after.
+        self._start: float = None
+        self._next_slot = 0
+
+        if directory != None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return self._length
+
+    # Slot of the sample grid a sample taken at time falls in.
+    def _slot(self, time: float) -> int:
+        if self._start == None or self._sample_interval <= 0:
+            return self._next_slot
+        # Allows for the rounding error of times summed from steps.
+        return int(np.floor((time - self._start) / self._sample_interval + self.SLOT_TOLERANCE))
+
+    # Whether a sample taken at time would be recorded.
+    def due(self, time: float) -> bool:
+        return self._slot(time) >= self._next_slot
+
+    # Records a sample, unless it comes too soon after the previous one.
+    # Returns whether it was recorded.
+    def append(self, **values: float) -> bool:
+        if not self.due(values['time']):
+            return False
+        if self._start == None:
+            self._start = values['time']
+        self._next_slot = self._slot(values['time']) + 1
+
+        row = self._rows
+        for field, i in self._columns.items():
+            value = values[field]
+            self._chunk[i, row] = np.nan if value == None else value
+
+        self._rows += 1
+        self._length += 1
+        if self._rows == self._chunk_size:
+            self._retire_chunk()
+        return True
+
+    def _retire_chunk(self):
+        if self._directory == None:
+            self._chunks.append(self._chunk)
+        else:
+            path = os.path.join(self._directory, f'segment_{len(self._segments):05d}.npy')
+            np.save(path, self._chunk)
+            self._segments.append(path)
+
+        self._chunk = np.empty((len(self.fields), self._chunk_size))
+        self._rows = 0
+
+    # Writes the partially filled chunk as a segment of its own.
+    # Only has an effect when recording to a directory.
+    def flush(self):
+        if self._directory == None or self._rows == 0:
+            return
+        self._chunk = self._chunk[:, :self._rows]
+        self._retire_chunk()
+
+    def _parts(self):
+        for path in self._segments:
+            yield np.load(path, mmap_mode='r')
+        yield from self._chunks
+        yield self._chunk[:, :self._rows]
+
+    def column(self, field: str) -> np.ndarray:
+        i = self._columns[field]
+        return np.concatenate([part[i] for part in self._parts()])
+
+    def columns(self) -> dict[str, np.ndarray]:
+        data = np.concatenate(list(self._parts()), axis=1)
+        return {field: data[i] for field, i in self._columns.items()}
+
+    # The recorded samples as a pandas DataFrame.
+    # pandas is only imported when this is called.
+    def dataframe(self):
+        from pandas import DataFrame
+        return DataFrame(self.columns())
+
+
+class SimStats(Recorder):
+    FIELDS = ('time', 'l_mean_size', 'r_mean_size', 'l_mean_speed', 'r_mean_speed')
+
+    def __init__(self, **kwargs):
+        super().__init__(self.FIELDS, **kwargs)
+
+    def add_data(self, data: DataPoint) -> bool:
+        return self.append(time=data.time,
+                           l_mean_size=data.l_mean_size,
+                           r_mean_size=data.r_mean_size,
+                           l_mean_speed=data.l_mean_speed,
+                           r_mean_speed=data.r_mean_speed)
+
     def times(self) -> list[float]:
-        return list(self.means['time'])
-    
\ No newline at end of file
+        return self.column('time').tolist()
@@ -0,0 +1,277 @@
+import os
+import json
+import copy
+import hashlib
+import itertools
+import numpy as np
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from classes.world import World
+from classes.stats import Recorder
+
+# Parameter sweeps over config.json.
+#
+# A sweep is described by a dict (usually loaded from a JSON file):
+#
+# {
+#     "base": "./config.json",      base config, path or dict
+#     "duration": 60,               simulated seconds per run
+#     "dt": 0.02,                   step length, unless the config sets fixed_dt
+#     "sample_interval": 1.0,       simulated seconds between samples
+#     "grid": {                     every combination of these values
+#         "separation_gap": [0.2, 0.5, 0.8],
+#         "seed": [1, 2, 3]
+#     },
+#     "random": {                   and/or n random points
+#         "n": 50,
+#         "seed": 0,
+#         "params": {
+#             "mutation_sdvs.size_sdv": [0.5, 3.0],   [low, high] range
+#             "engine": {"choices": ["object", "array"]}
+#         }
+#     }
+# }
+#
+# Keys are dotted paths into the config, list entries are addressed by \
+# index (e.g. "candy_spawn_rates.1"). When both "grid" and "random" are \
+# given, every grid point is combined with every random point.
+#
+# Runs are written to a results directory as one .npz file per point, \
+# plus a points.jsonl manifest with a line per finished point. Points \
+# already in the manifest are skipped, so a killed sweep can be resumed \
+# by running it again with the same output directory.
+# A point is identified by its whole config and run options, not just \
+# its overrides, so that changing the base config or the options \
+# runs every point again instead of resuming from stale results.
+# Points whose run raised are listed in failed.jsonl instead, with \
+# the error, and are run again when the sweep is resumed.
+
+# Fields recorded for every sample of a run.
+FIELDS = ('time', 'n_blobs', 'n_candies',
+          'l_mean_size', 'r_mean_size',
+          'l_mean_speed', 'r_mean_speed')
+
+MANIFEST = 'points.jsonl'
+FAILURES = 'failed.jsonl'
+
+
+def _set_path(config: dict, path: str, value):
+    keys = [int(key) if key.isdigit() else key for key in path.split('.')]
+    target = config
+    for key in keys[:-1]:
+        target = target[key]
+    target[keys[-1]] = value
+
+
+def _grid_points(grid: dict) -> list[dict]:
+    paths = list(grid)
+    return [dict(zip(paths, values))
+            for values in itertools.product(*(grid[path] for path in paths))]
+
+
+def _random_points(design: dict) -> list[dict]:
+    rng = np.random.default_rng(design.get('seed'))
+    points = []
+    for _ in range(design['n']):
+        point = {}
+        for path, spec in design['params'].items():
+            if isinstance(spec, dict):
+                choices = spec['choices']
+                point[path] = choices[int(rng.integers(len(choices)))]
+            else:
+                low, high = spec
+                value = rng.uniform(low, high)
+                if isinstance(low, int) and isinstance(high, int):
+                    value = int(round(value))
+                point[path] = float(value) if isinstance(value, float) else value
+        points.append(point)
+    return points
+
+
+# Expands a sweep description into a list of overrides, \
+# one dict of {path: value} per point.
+def expand(sweep: dict) -> list[dict]:
+    grid = _grid_points(sweep['grid']) if 'grid' in sweep else [{}]
+    randoms = _random_points(sweep['random']) if 'random' in sweep else [{}]
+    return [{**g, **r} for g in grid for r in randoms]
+
+
+# Stable identifier of a point, used to match it against the manifest. \
+# config is the point's full config (see apply), options the run options \
+# (see run_point).
+def point_key(config: dict, options: dict) -> str:
+    text = json.dumps({'config': config, 'options': options}, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def apply(base: dict, overrides: dict) -> dict:
+    config = copy.deepcopy(base)
+    for path, value in overrides.items():
+        _set_path(config, path, value)
+    return config
+
+
+# Run options of a sweep, as passed to run_point.
+def options(sweep: dict) -> dict:
+    return {
+        'duration': sweep.get('duration', 60.),
+        'dt': sweep.get('dt', 0.02),
+        'sample_interval': sweep.get('sample_interval', 1.),
+    }
+
+
+# Every point of a sweep, as (key, overrides, config).
+def points(sweep: dict) -> list[tuple[str, dict, dict]]:
+    base = sweep.get('base', './config.json')
+    if isinstance(base, str):
+        with open(base) as file:
+            base = json.load(file)
+
+    run_options = options(sweep)
+    configs = [(overrides, apply(base, overrides)) for overrides in expand(sweep)]
+    return [(point_key(config, run_options), overrides, config)
+            for overrides, config in configs]
+
+
+# Runs a single point headless and returns its trajectory as columns.
+def run_point(config: dict, *,
+              duration: float,
+              dt: float,
+              sample_interval: float) -> dict[str, np.ndarray]:
+    if config.get('fixed_dt') == None:
+        config = {**config, 'fixed_dt': dt}
+
+    world = World.from_dict(config)
+    dt = config['fixed_dt']
+
+    samples = Recorder(FIELDS)
+
+    def sample():
+        lmean, rmean = world.mean_traits()
+        samples.append(time=world.time(),
+                       n_blobs=world.n_blobs(),
+                       n_candies=world.n_candies(),
+                       l_mean_size=lmean.size,
+                       r_mean_size=rmean.size,
+                       l_mean_speed=lmean.speed,
+                       r_mean_speed=rmean.speed)
+
+    steps = int(round(duration / dt))
+    every = max(1, int(round(sample_interval / dt)))
+
+    sample()
+    for i in range(1, steps + 1):
+        world.step(dt)
+        if i % every == 0:
+            sample()
+
+    return samples.columns()
+
+
+def _run_and_save(directory: str, key: str, config: dict, options: dict) -> str:
+    columns = run_point(config, **options)
+
+    # Written under a temporary name first, so that a killed \
+    # sweep never leaves a truncated result behind.
+    path = os.path.join(directory, 'runs', f'{key}.npz')
+    partial = path + '.partial.npz'
+    np.savez_compressed(partial, **columns)
+    os.replace(partial, path)
+    return path
+
+
+def finished_keys(directory: str) -> set[str]:
+    manifest = os.path.join(directory, MANIFEST)
+    if not os.path.exists(manifest):
+        return set()
+
+    keys = set()
+    with open(manifest) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of a sweep killed mid-write.
+                continue
+            if os.path.exists(os.path.join(directory, entry['file'])):
+                keys.add(entry['key'])
+    return keys
+
+
+# Runs every point of the sweep that has not finished yet, \
+# yielding each manifest entry as its run completes.
+# A point that fails does not stop the others: its entry has an \
+# 'error' instead of a 'file', and goes to FAILURES instead of the manifest.
+def run(sweep: dict, directory: str, workers: int = None) -> Iterator[dict]:
+    run_options = options(sweep)
+
+    os.makedirs(os.path.join(directory, 'runs'), exist_ok=True)
+    done = finished_keys(directory)
+
+    pending = [(key, overrides, config)
+               for key, overrides, config in points(sweep)
+               if key not in done]
+
+    if not pending:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, \
+         open(os.path.join(directory, MANIFEST), 'a') as manifest, \
+         open(os.path.join(directory, FAILURES), 'a') as failures:
+        futures = {pool.submit(_run_and_save, directory, key,
+                               config, run_options): (key, overrides)
+                   for key, overrides, config in pending}
+
+        for future in as_completed(futures):
+            key, overrides = futures[future]
+            try:
+                path = future.result()
+            except Exception as error:
+                entry = {'key': key,
+                         'overrides': overrides,
+                         'error': f'{type(error).__name__}: {error}'}
+                output = failures
+            else:
+                entry = {'key': key,
+                         'overrides': overrides,
+                         'file': os.path.relpath(path, directory)}
+                output = manifest
+            # Written before it is yielded, so that it is kept \
+            # even if the caller stops iterating.
+            output.write(json.dumps(entry) + '\n')
+            output.flush()
+            yield entry
+
+
+# Loads every finished run of a results directory, or only those \
+# of the points of sweep as it is now, if given.
+# Returns the manifest entries and, for each field, an array of \
+# shape (runs, samples), padded with nan where runs differ in length.
+def load(directory: str, sweep: dict = None) -> tuple[list[dict], dict[str, np.ndarray]]:
+    entries = []
+    with open(os.path.join(directory, MANIFEST)) as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    entries = [entry for entry in entries
+               if os.path.exists(os.path.join(directory, entry['file']))]
+    if sweep != None:
+        keys = {key for key, _, _ in points(sweep)}
+        entries = [entry for entry in entries if entry['key'] in keys]
+    runs = [np.load(os.path.join(directory, entry['file'])) for entry in entries]
+
+    length = max((len(run['time']) for run in runs), default=0)
+    columns = {}
+    for field in FIELDS:
+        column = np.full((len(runs), length), np.nan)
+        for i, run in enumerate(runs):
+            column[i, :len(run[field])] = run[field]
+        columns[field] = column
+
+    return (entries, columns)
@@ -1,12 +1,27 @@
 import math
+import itertools
+import numpy as np
 from classes.constants import *
 from numpy.random import Generator
-from pygame import Vector2, Rect
+from classes.geometry import Vector2, Rect
+from classes.obstacles import Obstacles, push_out_of_boxes
+
+# Source of ids for entities created without one.
+_ids = itertools.count()
 
 class utils:
+    # Returns a fresh entity id.
+    # Ids are plain increasing integers, so that they (and the \
+    # iteration order of sets hashed by them) are the same on every run.
+    def next_id() -> int:
+        return next(_ids)
+
     def radius(size: float) -> float:
         return math.sqrt(size * SIZE_SCALE / (2 * math.pi))
 
+    def radii(sizes: np.ndarray) -> np.ndarray:
+        return np.sqrt(sizes * SIZE_SCALE / (2 * math.pi))
+
     def sample_normal(*, rng: Generator,
                     mean: float,
                     std_dev: float,
@@ -56,16 +71,39 @@ class utils:
     
     # Used to bound the position of a blob within the
     # dimensions of the screen.
-    def bound_position(position: Vector2, radius: float, separators: tuple[Rect, Rect]) -> tuple[Vector2, bool]:
+    # separators may be any rects to push the blob out of, in order; \
+    # Obstacles only checks the ones near the blob.
+    def bound_position(position: Vector2, radius: float, separators: tuple[Rect, ...]) -> tuple[Vector2, bool]:
         bx, clampedx = utils._clamp(position.x, radius, SIM_WIDTH-radius)
         by, clampedy =  utils._clamp(position.y, radius, SIM_HEIGHT-radius)
         pos = Vector2(bx, by)
-    
-        top, bottom = separators
-        
-        for rect in [top, bottom]:
+
+        if isinstance(separators, Obstacles):
+            separators = separators.near(bx, by, radius)
+
+        for rect in separators:
             _, newpos = utils.rect_intersect(pos, radius, rect)
             if newpos != None:
                 pos = newpos
                 
-        return pos
\ No newline at end of file
+        return pos
+
+    # Vectorized version of rect_intersect.
+    # Takes the coordinates of many circles and returns their \
+    # pushed-out coordinates, applying the same rules in the same order.
+    def rect_intersects(x: np.ndarray, y: np.ndarray, radii: np.ndarray, rect: Rect) -> tuple[np.ndarray, np.ndarray]:
+        return push_out_of_boxes(x, y, radii, rect.left, rect.right, rect.top, rect.bottom)
+
+    # Vectorized version of bound_position.
+    # positions is an (n, 2) array, radii an (n,) array.
+    def bound_positions(positions: np.ndarray, radii: np.ndarray, separators: tuple[Rect, ...]) -> np.ndarray:
+        x = np.minimum(np.maximum(positions[:, 0], radii), SIM_WIDTH - radii)
+        y = np.minimum(np.maximum(positions[:, 1], radii), SIM_HEIGHT - radii)
+
+        if isinstance(separators, Obstacles):
+            x, y = separators.push_out(x, y, radii)
+        else:
+            for rect in separators:
+                x, y = utils.rect_intersects(x, y, radii, rect)
+
+        return np.stack((x, y), axis=1)
@@ -0,0 +1,959 @@
+import json
+import math
+import itertools
+from time import perf_counter_ns
+from typing import Self, IO, Iterable, Collection
+import numpy as np
+from numpy import random
+from classes.blob import *
+from classes.candy import Candy
+from classes.engine import ArrayEngine, eat_candies, candy_energies
+from classes.parallel import ParallelEngine
+from classes.population import blob_columns, candy_columns, blobs_from_columns, candies_from_columns, offspring_columns
+from classes import checkpoint
+from classes.stats import SimStats, DataPoint
+from classes.regions import RegionalTraits
+from classes.schedule import Scheduler
+from classes.profiling import Profiler, lap
+from classes.recording import EventRecorder, StepEvents
+from classes.spawn import SpawnTable
+from classes.grid import CandyGrid, CellIndex
+from classes.obstacles import Obstacles
+from classes.neighbours import Crowding, NeighbourIndex, interaction_accelerations
+from classes.geometry import Rect, Vector2
+from classes.constants import SIZE_SCALE, SIM_WIDTH, SIM_HEIGHT
+
+# Simulation state and step logic.
+#
+# Has no dependency on pygame, so it can be stepped headless. \
+# Rendering and wall-clock timing are layered on top by \
+# components.simulation.Simulation.
+class World():
+    SIM_WIDTH=SIM_WIDTH
+    SIM_HEIGHT=SIM_HEIGHT
+    
+    SEPARATOR_WIDTH = 80
+    
+    # Number of strips candy spawning is split into.
+    # Spawn parameters are tabulated per strip once (see SpawnTable), \
+    # so more strips give a smoother cline at no per-frame cost.
+    N_INTERVALS = 400
+
+    FRICTION = 0.1
+    
+    # Whether the candy should be regenerated for each generation.
+    RESET_CANDY_PER_LIFESPAN = True
+    
+    # Limit after which candy will start to disappear.
+    # Candy lookups go through a spatial grid, so this \
+    # only has to keep memory use bounded.
+    CANDY_LIMIT = 10000
+    
+    # Available population engines.
+    # 'object' steps one Blob object at a time,
+    # 'array' steps the whole population using numpy arrays.
+    # 'parallel' is 'array' with blobs moved on several cores.
+    ENGINES = ('object', 'array', 'parallel')
+    
+    # Longest stretch of wall-clock time (in seconds) that advance \
+    # will account for in one call. Anything beyond this, e.g. after \
+    # a stall, is dropped instead of being simulated in one huge step.
+    MAX_ELAPSED = 0.25
+        
+    def __init__(self, *,
+                # Rng seed
+                seed: int = None,
+                        
+                # Mean trait values for the starting population
+                mean_traits: BlobTraits = BlobTraits(size = 20.0,
+                                         speed = 300.0),
+                
+                # Mean candy size
+                mean_candy_sizes: tuple[float, float] = (5.0, 5.0),
+                
+                # Mutation standard deviation
+                mutation_sdvs: MutationSdvs = MutationSdvs(size_sdv = 5,
+                                             speed_sdv = 2),
+                initial_sdvs: MutationSdvs = MutationSdvs(size_sdv = 5,
+                                             speed_sdv = 2),
+                
+                # Candy size standard deviation
+                candy_size_sdvs: tuple[float, float] = (2.0, 2.0),
+                
+                # Starting number of candy
+                n_candies: tuple[int, int] = (20, 20),
+                candy_spawn_rates: tuple[float, float] = (10, 10),
+                
+                # Energy a candy provides when \
+                # eaten per unit size.
+                candy_energy_density: float = 2000,
+                
+                cutoff_sharpness: float = 2,
+                        
+                # Starting number of blobs
+                n_blobs: int = 10,
+                
+                
+                separation_gap: float = 1,
+                sim_speed: float = 1,
+                
+                # Population engine, one of ENGINES
+                engine: str = 'object',
+                
+                # Simulated seconds per step.
+                # None steps by however much time has passed (see advance).
+                fixed_dt: float = None,
+                
+                # With fixed_dt, the most steps advance takes per call.
+                substeps: int = 1,
+                
+                # With fixed_dt, whether advance follows the wall clock \
+                # (scaled by sim_speed) or always takes substeps steps, \
+                # running as fast as possible.
+                realtime: bool = True,
+                
+                # Simulated seconds between samples recorded in stats.
+                stats_interval: float = 1.,
+                
+                # With the 'parallel' engine, processes moving blobs.
+                # None uses every core.
+                workers: int = None,
+                
+                # Rects blobs and candies are kept out of besides \
+                # the separators, as (x, y, width, height).
+                obstacles: Iterable[tuple[float, float, float, float]] = (),
+                
+                # Blobs close to each other push each other away, if set.
+                crowding: Crowding = None
+                ):
+
+        if engine not in self.ENGINES:
+            raise ValueError(f'Unknown engine {engine!r}, expected one of {self.ENGINES}')
+
+        self._seed = seed
+        self._mean_traits = BlobTraits(size=mean_traits.size,
+                                      speed=mean_traits.speed)
+     
+        self._initial_sdvs = initial_sdvs
+        
+        '''Simulation parameters'''
+        self._mutation_sdvs = MutationSdvs(size_sdv=mutation_sdvs.size,
+                                           speed_sdv=mutation_sdvs.speed)
+        self._candy_energy_d = candy_energy_density
+        self._rng = random.default_rng(seed=seed)
+        self._gap = separation_gap
+        self._sim_speed = sim_speed
+        self._engine = engine
+        self._fixed_dt = fixed_dt
+        self._substeps = substeps
+        self._realtime = realtime
+        self._stats_interval = stats_interval
+        self._workers = workers
+        self._extra_obstacles = [tuple(obstacle) for obstacle in obstacles]
+        self._interaction = crowding
+        
+        # The separators and the other obstacles, with their distance field \
+        # (see classes.obstacles), used for everything they get in the way of.
+        self._obstacles = Obstacles(self._separators() +
+                                    tuple(Rect(*obstacle) for obstacle in self._extra_obstacles))
+        
+        # Mean traits of both sides over time.
+        self.stats = SimStats(sample_interval=stats_interval)
+        
+        # Phase timings and work counts of every step, if set.
+        self.profiler: Profiler = None
+        
+        # Writes every step to a recording, if set (see classes.recording).
+        self.recorder: EventRecorder = None
+        
+        # Simulated time owed to advance but not stepped yet.
+        self._backlog: float = 0.
+        
+        # Ids for new blobs and candies.
+        # Kept per world so that runs with the same seed match exactly.
+        self._ids = itertools.count()
+        self._mean_candy_sizes = mean_candy_sizes
+        self._candy_size_sdvs = candy_size_sdvs
+        self._candy_spawn_rates = candy_spawn_rates
+        self._n_candies = n_candies
+        self._n_blobs = n_blobs
+        self._cutoff_sharpness = cutoff_sharpness
+        
+        self._spawn_table: SpawnTable = self._gen_spawn_table()
+        
+        self._time: float = 0
+        
+        # Candies by the time they perish, and blobs by the time \
+        # they reach their lifespan. Only used with the 'object' engine.
+        self._expiries: Scheduler[Candy] = Scheduler()
+        self._lifespans: Scheduler[Blob] = Scheduler()
+        
+        self._candies = self._gen_initial_candies(n_candies)
+        self._blobs = self._gen_initial_blobs(n_blobs)
+        
+        # Trait statistics per side of the separator, \
+        # kept up to date as blobs are born, die and move.
+        self._regions = RegionalTraits()
+        self._track_blobs(self._blobs)
+        self._schedule(self._blobs, self._candies)
+        
+        # Only used with the 'array' and 'parallel' engines, \
+        # in which case it owns all blobs and candies.
+        self._arrays: ArrayEngine = None
+        
+        if engine == 'array':
+            self._arrays = ArrayEngine(rng=self._rng, **self.engine_options())
+        elif engine == 'parallel':
+            self._arrays = ParallelEngine(rng=self._rng, workers=workers,
+                                          **self.engine_options())
+        
+        if self._arrays != None:
+            self._arrays.add_candies(list(self._candies))
+            self._arrays.add_blobs(list(self._blobs))
+            self._candies.clear()
+            self._blobs.clear()
+            self._regions.clear()
+            self._expiries.clear()
+            self._lifespans.clear()
+    
+        
+    @classmethod
+    def from_config(cls, file: IO) -> Self:
+        config: dict = json.load(file)
+        print(config)
+        return cls.from_dict(config)
+    
+    @classmethod
+    def from_dict(cls, config: dict) -> Self:
+        return cls(
+            seed=config.get('seed'),
+            mean_traits=BlobTraits.from_dict(config.get('mean_traits') or {'size': 20., 'speed': 300.}),
+            mean_candy_sizes=tuple(config.get('mean_candy_sizes') or [5., 5.]),
+            mutation_sdvs=MutationSdvs.from_dict(config.get('mutation_sdvs') or {'size_sdv': 5., 'speed_sdv': 2.}),
+            initial_sdvs=MutationSdvs.from_dict(config.get('initial_sdvs') or {'size_sdv': 5., 'speed_sdv': 2.}),
+            candy_size_sdvs=tuple(config.get('candy_size_sdvs') or [2., 2.]),
+            n_candies=tuple(config.get('n_candies') or [20, 20]),
+            candy_spawn_rates=tuple(config.get('candy_spawn_rates') or [20, 20]),
+            candy_energy_density=config.get('candy_energy_density') if 'candy_energy_density' in config else 2000.,
+            cutoff_sharpness=config.get('cutoff_sharpness') if 'cutoff_sharpness' in config else 3.,
+            n_blobs=config.get('n_blobs') if 'n_blobs' in config else 10,
+            separation_gap=config.get('separation_gap') if 'separation_gap' in config else 1.,
+            sim_speed=config.get('sim_speed') if 'sim_speed' in config else 1.,
+            engine=config.get('engine') or 'object',
+            fixed_dt=config.get('fixed_dt'),
+            substeps=config.get('substeps') or 1,
+            realtime=config.get('realtime') if 'realtime' in config else True,
+            stats_interval=config.get('stats_interval') if 'stats_interval' in config else 1.,
+            workers=config.get('workers'),
+            obstacles=config.get('obstacles') or (),
+            crowding=Crowding.from_dict(config['crowding']) if config.get('crowding') else None
+        )
+    
+     
+    # Parameters of this world in the format read by from_dict.
+    # n_blobs and n_candies are the starting values.
+    def config(self) -> dict:
+        return {
+            'seed': self._seed,
+            'mean_traits': {'size': self._mean_traits.size,
+                            'speed': self._mean_traits.speed},
+            'mean_candy_sizes': list(self._mean_candy_sizes),
+            'mutation_sdvs': {'size_sdv': self._mutation_sdvs.size,
+                              'speed_sdv': self._mutation_sdvs.speed},
+            'initial_sdvs': {'size_sdv': self._initial_sdvs.size,
+                             'speed_sdv': self._initial_sdvs.speed},
+            'candy_size_sdvs': list(self._candy_size_sdvs),
+            'n_candies': list(self._n_candies),
+            'candy_spawn_rates': list(self._candy_spawn_rates),
+            'candy_energy_density': self._candy_energy_d,
+            'cutoff_sharpness': self._cutoff_sharpness,
+            'n_blobs': self._n_blobs,
+            'separation_gap': self._gap,
+            'sim_speed': self._sim_speed,
+            'engine': self._engine,
+            'fixed_dt': self._fixed_dt,
+            'substeps': self._substeps,
+            'realtime': self._realtime,
+            'stats_interval': self._stats_interval,
+            'workers': self._workers,
+            'obstacles': [list(obstacle) for obstacle in self._extra_obstacles],
+            'crowding': self._interaction.to_dict() if self._interaction != None else None
+        }
+
+    # Writes the complete state of the world to file (see classes.checkpoint).
+    def save(self, file: str | IO):
+        # Peeking at a count consumes a value, so it is restarted there.
+        next_id = next(self._ids)
+        self._ids = itertools.count(next_id)
+
+        meta = {
+            'config': self.config(),
+            'time': self._time,
+            'backlog': self._backlog,
+            'next_id': next_id,
+            'rng': self._rng.bit_generator.state
+        }
+
+        blobs, candies, array_next_id = self.state_arrays()
+        if self._arrays != None:
+            meta['array_next_id'] = array_next_id
+
+        checkpoint.write(file, meta, blobs, candies)
+
+    # Restores a world written by save.
+    # Stepping the restored world gives exactly the same results \
+    # as stepping the original would have.
+    @classmethod
+    def load(cls, file: str | IO) -> Self:
+        meta, blobs, candies = checkpoint.read(file)
+
+        # Created empty, the saved population replaces the initial one.
+        world = cls.from_dict({**meta['config'],
+                               'n_blobs': 0,
+                               'n_candies': [0, 0]})
+        world._n_blobs = meta['config']['n_blobs']
+        world._n_candies = tuple(meta['config']['n_candies'])
+
+        world._time = meta['time']
+        world._backlog = meta['backlog']
+        world._ids = itertools.count(meta['next_id'])
+        world._rng.bit_generator.state = meta['rng']
+
+        if world._arrays != None:
+            world._arrays.load_state(blobs, candies, meta['array_next_id'])
+        else:
+            world._blobs = {blob: None for blob in blobs_from_columns(blobs)}
+            world._candies = CandyGrid(candies_from_columns(candies))
+            world._rescan_regions()
+            world._schedule(world._blobs, world._candies)
+
+        return world
+
+    # Simulated seconds since the start.
+    def time(self) -> float:
+        return self._time
+    
+    # The random generator every draw of the world comes from.
+    def rng(self) -> random.Generator:
+        return self._rng
+    
+    def spawn_table(self) -> SpawnTable:
+        return self._spawn_table
+    
+    # Arguments (other than rng) the array engines of this world are \
+    # built with, for building others that follow the same rules \
+    # (e.g. an ensemble's).
+    def engine_options(self) -> dict:
+        return {'separators': self._obstacles,
+                'mutation_sdvs': self._mutation_sdvs,
+                'candy_energy_density': self._candy_energy_d,
+                'interaction': self._interaction}
+    
+    # The blobs and candies as columns (see classes.population), \
+    # along with the id the next entity will get.
+    # With the 'array' and 'parallel' engines, this is the engine's \
+    # state, as taken by ArrayEngine.load_state.
+    def state_arrays(self) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], int]:
+        if self._arrays != None:
+            return self._arrays.state()
+        
+        # Peeking at a count consumes a value, so it is restarted there.
+        next_id = next(self._ids)
+        self._ids = itertools.count(next_id)
+        
+        blobs = blob_columns(list(self._blobs),
+                             np.array([blob.id for blob in self._blobs], dtype=np.int64))
+        candies = candy_columns(list(self._candies),
+                                np.array([candy.id for candy in self._candies], dtype=np.int64))
+        return (blobs, candies, next_id)
+
+    def n_blobs(self) -> int:
+        if self._arrays != None:
+            return len(self._arrays.blobs)
+        return len(self._blobs)
+    
+    def n_candies(self) -> int:
+        if self._arrays != None:
+            return len(self._arrays.candies)
+        return len(self._candies)
+    
+    # Blobs currently alive.
+    # With the 'array' and 'parallel' engines these are read-only views.
+    def blobs(self) -> Iterable[Blob]:
+        if self._arrays != None:
+            return self._arrays.blob_views()
+        return self._blobs
+    
+    # Candies currently on the board.
+    # With the 'array' and 'parallel' engines these are read-only views.
+    def candies(self) -> Iterable[Candy]:
+        if self._arrays != None:
+            return self._arrays.candy_views()
+        return self._candies
+
+    # What is needed to draw the blobs, as the columns \
+    # position (n, 2), radius and hue.
+    # With the 'array' and 'parallel' engines these are the engine's own arrays, \
+    # which must not be modified.
+    def blob_shapes(self) -> dict[str, np.ndarray]:
+        if self._arrays != None:
+            blobs = self._arrays.blobs
+            return {'position': blobs.position, 'radius': blobs.radius, 'hue': blobs.hue}
+
+        n = len(self._blobs)
+        return {'position': np.array([(b.position.x, b.position.y) for b in self._blobs],
+                                     dtype=float).reshape(n, 2),
+                'radius': np.fromiter((b.radius() for b in self._blobs), float, count=n),
+                'hue': np.fromiter((b.hue for b in self._blobs), float, count=n)}
+
+    # Same as blob_shapes, for the candies (position and radius).
+    def candy_shapes(self) -> dict[str, np.ndarray]:
+        if self._arrays != None:
+            candies = self._arrays.candies
+            return {'position': candies.position, 'radius': candies.radius}
+
+        n = len(self._candies)
+        return {'position': np.array([(c.position.x, c.position.y) for c in self._candies],
+                                     dtype=float).reshape(n, 2),
+                'radius': np.fromiter((c.radius() for c in self._candies), float, count=n)}
+
+    # What a recording keeps of the blobs and candies (see EventRecorder), \
+    # as the blob columns id, position, size, speed and hue, and the \
+    # candy columns id, position and size.
+    # Same caveat as blob_shapes.
+    def entity_columns(self) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        if self._arrays != None:
+            blobs, candies = self._arrays.blobs, self._arrays.candies
+            return ({'id': blobs.id, 'position': blobs.position,
+                     'size': blobs.size, 'speed': blobs.speed, 'hue': blobs.hue},
+                    {'id': candies.id, 'position': candies.position, 'size': candies.size})
+
+        return (World._blob_entities(self._blobs), World._candy_entities(self._candies))
+
+    # Same as entity_columns, for blob objects.
+    def _blob_entities(blobs: Collection[Blob]) -> dict[str, np.ndarray]:
+        n = len(blobs)
+        return {'id': np.fromiter((b.id for b in blobs), np.int64, count=n),
+                'position': np.array([(b.position.x, b.position.y) for b in blobs],
+                                     dtype=float).reshape(n, 2),
+                'size': np.fromiter((b.traits.size for b in blobs), float, count=n),
+                'speed': np.fromiter((b.traits.speed for b in blobs), float, count=n),
+                'hue': np.fromiter((b.hue for b in blobs), float, count=n)}
+
+    # Same as entity_columns, for candy objects.
+    def _candy_entities(candies: Collection[Candy]) -> dict[str, np.ndarray]:
+        n = len(candies)
+        return {'id': np.fromiter((c.id for c in candies), np.int64, count=n),
+                'position': np.array([(c.position.x, c.position.y) for c in candies],
+                                     dtype=float).reshape(n, 2),
+                'size': np.fromiter((c.size for c in candies), float, count=n)}
+
+    # Mean traits of the blobs left and right of SIM_WIDTH / 2.
+    # Kept up to date while stepping, so this does not scan the blobs.
+    def mean_traits(self) -> tuple[BlobTraits, BlobTraits]:
+        if self._arrays != None:
+            return self._arrays.mean_traits()
+        return self._regions.means()
+    
+    # Same as mean_traits, for the (population) variance of the traits.
+    def trait_variances(self) -> tuple[BlobTraits, BlobTraits]:
+        if self._arrays != None:
+            return self._arrays.trait_variances()
+        return self._regions.variances()
+    
+    def _track_blobs(self, blobs: Iterable[Blob], remove: bool = False):
+        blobs = list(blobs)
+        if not blobs:
+            return
+        
+        x = [blob.position.x for blob in blobs]
+        size = [blob.traits.size for blob in blobs]
+        speed = [blob.traits.speed for blob in blobs]
+        
+        if remove:
+            self._regions.remove(x, size, speed)
+        else:
+            self._regions.add(x, size, speed)
+      
+    # Rebuilds the regional statistics from every blob (see RegionalTraits).
+    def _rescan_regions(self):
+        blobs = list(self._blobs)
+        self._regions.resync([blob.position.x for blob in blobs],
+                             [blob.traits.size for blob in blobs],
+                             [blob.traits.speed for blob in blobs])
+    
+    # Advances the simulation after elapsed seconds of wall-clock time.
+    #
+    # Without fixed_dt this is a single step of elapsed * sim_speed.
+    # With fixed_dt, every step is exactly fixed_dt long, so runs with \
+    # the same seed produce identical trajectories: in realtime mode \
+    # as many steps are taken as fit in the elapsed time (at most \
+    # substeps, dropping the rest if the simulation falls behind), \
+    # otherwise exactly substeps steps are taken regardless of elapsed.
+    # Returns the number of steps taken.
+    def advance(self, elapsed: float) -> int:
+        elapsed = min(elapsed, self.MAX_ELAPSED)
+        
+        if self._fixed_dt == None:
+            self.step(self._sim_speed * elapsed)
+            return 1
+        
+        if self._realtime:
+            self._backlog += self._sim_speed * elapsed
+            steps = min(int(self._backlog / self._fixed_dt), self._substeps)
+            self._backlog -= steps * self._fixed_dt
+            if steps == self._substeps:
+                self._backlog = min(self._backlog, self._fixed_dt)
+        else:
+            steps = self._substeps
+        
+        for _ in range(steps):
+            self.step(self._fixed_dt)
+        
+        return steps
+    
+    # Advances the simulation by timediff seconds of simulated time.
+    #
+    # With a profiler, records how long each phase took \
+    # and how much work it did (see classes.profiling).
+    # With a recorder, writes the step to its recording.
+    def step(self, timediff: float):
+        timed = self.profiler != None
+        if timed:
+            sample = {}
+            start = t = perf_counter_ns()
+        
+        # What the recorder writes besides where the blobs moved.
+        events = StepEvents() if self.recorder != None else None
+        
+        self._time += timediff
+        
+        if self._arrays != None:
+            self._arrays.step(timediff, self._time, sample if timed else None, events)
+            if timed: t = perf_counter_ns()
+            spawns = self._spawn_candy(timediff, events)
+            if timed: t = lap(sample, 'spawn', t)
+            self._arrays.expire_candies(self._time, events)
+            if timed: t = lap(sample, 'expire', t)
+            self._record_stats()
+            if events != None:
+                if timed: t = lap(sample, 'stats', t)
+                self._record(events)
+                if timed: t = lap(sample, 'record', t)
+            if timed:
+                sample['spawns'] = spawns
+                self._record_profile(sample, start, t)
+            return
+        
+        # Used as an ordered set.
+        deadblobs: dict[Blob, None] = {}
+        newblobs = []
+        
+        # Blobs that moved to the other side of SIM_WIDTH / 2, \
+        # with the position they started from.
+        crossed = []
+        
+        if timed:
+            scanned, tested = self._candies.scanned, self._candies.tested
+        
+        pushes = self._pushes()
+        
+        for blob in self._blobs:
+            x = blob.position.x
+            self._move_blob(blob, timediff, pushes.get(blob))
+            if (x < SIM_WIDTH / 2) != (blob.position.x < SIM_WIDTH / 2):
+                crossed.append((x, blob))
+            if timed: t = lap(sample, 'move', t)
+            self._passive_energy_loss(blob, timediff)
+            blob.age_by(timediff)
+            
+            if self._starved(blob):
+                deadblobs[blob] = None
+            if timed: t = lap(sample, 'energy', t)
+        
+        # Blobs that die this frame still get to eat.
+        n_eaten = self._eat(events)
+        if timed: t = lap(sample, 'eat', t)
+        
+        self._expire_blobs(deadblobs, newblobs, events)
+        
+        if crossed:
+            self._regions.move(np.array([x for x, _ in crossed]),
+                               np.array([blob.position.x for _, blob in crossed]),
+                               np.array([blob.traits.size for _, blob in crossed]),
+                               np.array([blob.traits.speed for _, blob in crossed]))
+        
+        dying = [blob for blob in deadblobs if blob in self._blobs]
+        if events != None:
+            events.died([blob.id for blob in dying])
+        self._track_blobs(dying, remove=True)
+        self._track_blobs(newblobs)
+        
+        for blob in dying:
+            del self._blobs[blob]
+        
+        for blob in newblobs:
+            self._blobs[blob] = None
+        if self._regions.stale():
+            self._rescan_regions()
+        self._schedule(newblobs, ())
+        if timed:
+            t = lap(sample, 'lifecycle', t)
+            sample.update(scanned=self._candies.scanned - scanned,
+                          tested=self._candies.tested - tested,
+                          eaten=n_eaten,
+                          births=len(newblobs),
+                          deaths=len(dying))
+            
+        spawns = self._spawn_candy(timediff, events)
+        if timed: t = lap(sample, 'spawn', t)
+        self._expire_candies(events)
+        if timed: t = lap(sample, 'expire', t)
+        self._record_stats()
+        if events != None:
+            if timed: t = lap(sample, 'stats', t)
+            self._record(events)
+            if timed: t = lap(sample, 'record', t)
+        if timed:
+            sample['spawns'] = spawns
+            self._record_profile(sample, start, t)
+    
+    def _record_profile(self, sample: dict[str, int], start: int, t: int):
+        t = lap(sample, 'stats', t)
+        sample['step'] = t - start
+        self.profiler.record(sample)
+    
+    # Only the blob positions are gathered every step, \
+    # the full columns are left to the keyframes.
+    def _record(self, events: StepEvents):
+        if self._arrays != None:
+            positions = self._arrays.blobs.position
+        else:
+            positions = np.array([(b.position.x, b.position.y) for b in self._blobs],
+                                 dtype=float).reshape(len(self._blobs), 2)
+        self.recorder.record(self._time, positions, events, self.entity_columns)
+    
+    def _schedule(self, blobs: Iterable[Blob], candies: Iterable[Candy]):
+        for blob in blobs:
+            self._lifespans.schedule(blob.expires, blob.id, blob)
+        for candy in candies:
+            self._expiries.schedule(candy.expires, candy.id, candy)
+    
+    # Blobs that reached their lifespan during this step reproduce, \
+    # if they have enough energy left, and die.
+    # This comes after eating, so what a blob ate in this step counts \
+    # towards reproducing (see "Step order" in the README).
+    # Only the blobs that are due are looked at.
+    # The offspring are reported to events, if given.
+    def _expire_blobs(self, deadblobs: dict[Blob, None], newblobs: list[Blob],
+                      events: StepEvents = None):
+        parents = []
+        for blob in self._lifespans.due(self._time):
+            # Already gone or starved.
+            if blob not in self._blobs or blob in deadblobs:
+                continue
+            
+            if blob.energy / blob.max_energy >= 0.5:
+                parents.append(blob)
+            deadblobs[blob] = None
+        
+        offspring = self._reproduce(parents)
+        newblobs.extend(offspring)
+        
+        if events != None and offspring:
+            events.born(World._blob_entities(offspring),
+                        np.repeat(np.array([blob.id for blob in parents], dtype=np.int64),
+                                  Blob.N_OFFSPRING))
+    
+    def _expire_candies(self, events: StepEvents = None):
+        expired = []
+        for candy in self._expiries.due(self._time):
+            # Eaten or evicted candies are skipped.
+            if candy in self._candies:
+                self._candies.remove(candy)
+                expired.append(candy.id)
+        if events != None:
+            events.removed(expired)
+    
+    def _record_stats(self):
+        if not self.stats.due(self._time):
+            return
+        
+        lmean, rmean = self.mean_traits()
+        self.stats.add_data(DataPoint(time=self._time,
+                                      l_mean_size=lmean.size,
+                                      r_mean_size=rmean.size,
+                                      l_mean_speed=lmean.speed,
+                                      r_mean_speed=rmean.speed))
+    
+
+    def _interpolate(self, *, x: float, range: tuple[float, float]):
+        low, high = range
+        x = x / self.SIM_WIDTH
+        
+        # Steepness.
+        # k=1 is a line
+        k = self._cutoff_sharpness
+        
+        rawval = 1 - (1 / (1 + (1 / x - 1)**(-k)))
+        
+        scaled = (high - low) * rawval + low
+        
+        return scaled
+        
+        # slope = (range[1] - range[0]) / self.SCREEN_WIDTH
+        # return slope * x + range[0]
+    
+    def _interval_width(self):
+        return self.SIM_WIDTH / self.N_INTERVALS
+    
+    # Spawn parameters of every interval.
+    # Depends on the separation gap, spawn rates and candy sizes, \
+    # and has to be regenerated if any of them change.
+    def _gen_spawn_table(self) -> SpawnTable:
+        width = self._interval_width()
+        left = np.arange(self.N_INTERVALS) * width
+        right = left + width
+        top = np.zeros(self.N_INTERVALS)
+        bottom = np.full(self.N_INTERVALS, float(self.SIM_HEIGHT))
+        
+        # Intervals overlapping the separators only span the gap between them.
+        separators = self._separators()
+        if separators[0].height > 0:
+            blocked = (left < separators[0].right) & (right > separators[0].left)
+            top[blocked] = separators[0].bottom
+            bottom[blocked] = separators[0].bottom + self._gap * self.SIM_HEIGHT
+        
+        x = (left + right) / 2
+        area_ratio = (width * (bottom - top)) / (self.SIM_WIDTH * self.SIM_HEIGHT)
+        
+        return SpawnTable(left=left,
+                          right=right,
+                          top=top,
+                          bottom=bottom,
+                          rates=self._interpolate(x=x, range=self._candy_spawn_rates) * area_ratio,
+                          mean_sizes=self._interpolate(x=x, range=self._mean_candy_sizes),
+                          sdvs=self._interpolate(x=x, range=self._candy_size_sdvs))
+            
+    
+    def _radius(self, size: float) -> float:
+        return math.sqrt(size * SIZE_SCALE / (2 * math.pi))
+        
+    # Blobs are kept in a dict used as an ordered set, so that they \
+    # are stepped in a fixed order that a checkpoint can reproduce.
+    def _gen_initial_blobs(self, n) -> dict[Blob, None]:
+        blobs = {}
+        for blob in Blob.random_many(rng=self._rng,
+                                     n=n,
+                                     mean_traits=self._mean_traits,
+                                     sdvs=self._initial_sdvs,
+                                     separators=self._obstacles,
+                                     ids=self._ids):
+            blob.expires = self._time + Blob.LIFESPAN
+            blobs[blob] = None
+        return blobs
+    
+   
+    def _generate_candies(self, n: int,
+                          mean_size: float,
+                          sdv: float,
+                          region: Rect) -> list[Candy]:
+        candies = Candy.random_many(rng=self._rng,
+                                    n=n,
+                                    mean_size=mean_size,
+                                    sdv=sdv,
+                                    bounds=region,
+                                    ids=self._ids)
+        for candy in candies:
+            candy.position = utils.bound_position(candy.position, candy.radius(), self._obstacles)
+            candy.expires = self._time + candy.time_to_perish
+        return candies
+    
+    def _gen_initial_candies(self, n):
+        candies = CandyGrid()
+        candies.update(self._generate_candies(self._n_candies[0],
+                                              self._mean_candy_sizes[0],
+                                              self._candy_size_sdvs[0],
+                                              Rect(0,
+                                                   0,
+                                                   (self.SIM_WIDTH - self.SEPARATOR_WIDTH) / 2,
+                                                   self.SIM_HEIGHT)))
+        candies.update(self._generate_candies(self._n_candies[1],
+                                              self._mean_candy_sizes[1],
+                                              self._candy_size_sdvs[1],
+                                              Rect((self.SIM_WIDTH + self.SEPARATOR_WIDTH)/2,
+                                                   0,
+                                                   (self.SIM_WIDTH - self.SEPARATOR_WIDTH) / 2,
+                                                   self.SIM_HEIGHT)))
+        return candies
+    
+    def _reset_candies(self):
+        self._candies.clear()
+        for i in range(self._n_candies):
+            self._candies.add(Candy.random(mean_size=self._mean_candy_sizes,
+                                          sdv=self._candy_size_sdv,
+                                          rng=self._rng))
+    
+    def _random_normal(self, 
+                           mean: float,
+                           std_dev: float):
+        return utils.sample_normal(rng=rng, mean=mean, std_dev=std_dev)
+
+    def _move_blob(self, blob, timediff, push: Vector2 = None):
+        blob._move(self._candies, self._blobs, self._obstacles, timediff, push)
+    
+    # Acceleration of every blob due to the interaction, computed \
+    # from where all blobs are before any of them moves, as the \
+    # array engine does. Empty without an interaction.
+    def _pushes(self) -> dict[Blob, Vector2]:
+        if self._interaction == None or len(self._blobs) < 2:
+            return {}
+        
+        blobs = list(self._blobs)
+        positions = np.array([(blob.position.x, blob.position.y) for blob in blobs])
+        radius = np.array([blob.radius() for blob in blobs])
+        pushes = interaction_accelerations(self._interaction,
+                                           NeighbourIndex(positions),
+                                           positions,
+                                           radius)
+        return {blob: Vector2(x, y) for blob, (x, y) in zip(blobs, pushes.tolist())}
+
+    def _passive_energy_loss(self, blob, timediff):
+        blob.energy -= timediff * blob.PASSIVE_ENERGY_LOSS * blob.traits.size
+
+    # Offspring of every parent, created in one batch.
+    # The offspring of each parent are next to each other, in order.
+    def _reproduce(self, parents: list[Blob]) -> list[Blob]:
+        if not parents:
+            return []
+        
+        columns = offspring_columns(rng=self._rng,
+                                    size=np.array([blob.traits.size for blob in parents]),
+                                    speed=np.array([blob.traits.speed for blob in parents]),
+                                    position=np.array([(blob.position.x, blob.position.y)
+                                                       for blob in parents]),
+                                    sdvs=self._mutation_sdvs,
+                                    separators=self._obstacles)
+        n = len(columns['size'])
+        columns['id'] = self._next_ids(n)
+        columns['expires'] = np.full(n, self._time + Blob.LIFESPAN)
+        return blobs_from_columns(columns)
+    
+    def _next_ids(self, n: int) -> np.ndarray:
+        return np.fromiter(self._ids, dtype=np.int64, count=n)
+        
+    # Every blob eats the candies it overlaps, once all blobs moved, \
+    # with the rules of the array engine (see engine.eat_candies).
+    # Returns the number of candies eaten, and reports them to events, if given.
+    def _eat(self, events: StepEvents = None) -> int:
+        blobs, candies = list(self._blobs), list(self._candies)
+        if not blobs or not candies:
+            return 0
+        
+        candy_position = np.array([(c.position.x, c.position.y) for c in candies])
+        eater = eat_candies(blob_position=np.array([(b.position.x, b.position.y) for b in blobs]),
+                            blob_radius=np.array([b.radius() for b in blobs]),
+                            candy_position=candy_position,
+                            candy_radius=np.array([c.radius() for c in candies]),
+                            index=CellIndex(candy_position))
+        
+        gained = candy_energies(eater,
+                                np.array([c.size for c in candies]),
+                                self._candy_energy_d,
+                                len(blobs))
+        for i in np.nonzero(gained)[0].tolist():
+            blob = blobs[i]
+            blob.energy = min(blob.max_energy, blob.energy + float(gained[i]))
+        
+        eaten = np.nonzero(eater >= 0)[0].tolist()
+        for i in eaten:
+            self._candies.remove(candies[i])
+        
+        if events != None:
+            events.eaten(np.array([candies[i].id for i in eaten], dtype=np.int64),
+                         np.array([blobs[eater[i]].id for i in eaten], dtype=np.int64))
+        return len(eaten)
+    
+    # End of life by lifespan is handled by _expire_blobs.
+    def _starved(self, blob) -> bool:
+        return blob.energy <= 0
+    
+    # The candies added and evicted are reported to events, if given.
+    def _add_candies(self, candies: list[Candy], events: StepEvents = None):
+        if self._arrays != None:
+            self._arrays.add_candies(candies, events)
+            self._evict_candies(events)
+            return
+        
+        evicted = []
+        for candy in candies:
+            self._candies.add(candy)
+            
+            # The grid keeps candies in the order they were added, \
+            # so this evicts the oldest one.
+            if len(self._candies) > self.CANDY_LIMIT:
+                evicted.append(self._candies.pop().id)
+        
+        if events != None:
+            events.spawned(World._candy_entities(candies))
+            events.removed(evicted)
+        self._notice(candies)
+        self._schedule((), candies)
+    
+    # Has the blobs notice the new candies closer to them than their \
+    # clearance, looking up only those in the cells around every candy, \
+    # as ArrayEngine._notice_candies does.
+    def _notice(self, candies: list[Candy]):
+        blobs = list(self._blobs)
+        if not blobs or not candies:
+            return
+        
+        positions = np.array([(blob.position.x, blob.position.y) for blob in blobs])
+        points = np.array([(candy.position.x, candy.position.y) for candy in candies])
+        owners, near, _ = NeighbourIndex(positions).around(points, Blob.NOTICE_REACH)
+        for i, j in zip(near.tolist(), owners.tolist()):
+            blobs[i].notice((candies[j],))
+        
+        for blob in blobs:
+            if blob.clearance() > Blob.NOTICE_REACH:
+                blob.notice(candies)
+    
+    # Drops the oldest candies of the array engine above CANDY_LIMIT.
+    def _evict_candies(self, events: StepEvents = None):
+        excess = len(self._arrays.candies) - self.CANDY_LIMIT
+        if excess > 0:
+            self._arrays.evict_candies(excess, events)
+    
+    # Returns the number of candies spawned.
+    def _spawn_candy(self, timediff, events: StepEvents = None) -> int:
+        columns = self._spawn_table.spawn(rng=self._rng,
+                                          timediff=timediff,
+                                          separators=self._obstacles)
+        n = len(columns['size'])
+        if n == 0:
+            return 0
+        
+        columns['expires'] = np.full(n, self._time + Candy.SHELF_LIFE)
+        
+        # The array engine takes the columns as they are.
+        if self._arrays != None:
+            self._arrays.add_candy_columns(events, **columns)
+            self._evict_candies(events)
+            return n
+        
+        columns['id'] = self._next_ids(n)
+        self._add_candies(candies_from_columns(columns), events)
+        return n
+                    
+   
+    def _separators(self) -> tuple[Rect, Rect]:
+        width = self.SEPARATOR_WIDTH
+        height = self.SIM_HEIGHT * (1 - self._gap)/2
+        return (Rect(self.SIM_WIDTH/2 - width/2,
+                    0,
+                    width,
+                    height),
+                Rect(self.SIM_WIDTH/2 - width/2,
+                    self.SIM_HEIGHT - height,
+                    width,
+                    height))
@@ -0,0 +1,66 @@
+from time import perf_counter
+from pygame import Surface, Rect
+from classes.profiling import Profiler, PHASES, COUNTERS
+from components.text import TextCache
+
+# Table of a profiler's rolling percentiles, drawn over the simulation.
+#
+# The table is only rendered again every REFRESH seconds, which \
+# keeps it readable and its own cost out of the measurements.
+class ProfileOverlay():
+    REFRESH = 0.5
+
+    PERCENTILES = (50, 90, 99)
+
+    PADDING = 8
+    TEXT_SIZE = 16
+    LINE_HEIGHT = 18
+    # Width of the name column and of each percentile column.
+    NAME_WIDTH = 90
+    COLUMN_WIDTH = 70
+
+    BACKGROUND = (245, 245, 245)
+
+    def __init__(self):
+        self._text = TextCache(font_name='Noto Sans Mono')
+        self._surface: Surface = None
+        self._rendered_at: float = None
+
+    def _row(self, cells: list[str]) -> list[Surface]:
+        return [self._text.render(cell, self.TEXT_SIZE) for cell in cells]
+
+    def _render(self, profiler: Profiler):
+        percentiles = profiler.percentiles(self.PERCENTILES)
+        header = [''] + [f'p{q}' for q in self.PERCENTILES]
+
+        rows = [self._row(['ms'] + header[1:])]
+        rows += [self._row([name] + [f'{value:.2f}' for value in percentiles[name]])
+                 for name in PHASES if name in percentiles]
+        rows.append(self._row(['count'] + header[1:]))
+        rows += [self._row([name] + [f'{value:.0f}' for value in percentiles[name]])
+                 for name in COUNTERS if name in percentiles]
+
+        width = 2 * self.PADDING + self.NAME_WIDTH + self.COLUMN_WIDTH * len(self.PERCENTILES)
+        height = 2 * self.PADDING + self.LINE_HEIGHT * len(rows)
+        if self._surface == None or self._surface.get_size() != (width, height):
+            self._surface = Surface((width, height))
+        self._surface.fill(self.BACKGROUND)
+
+        for i, row in enumerate(rows):
+            y = self.PADDING + self.LINE_HEIGHT * i
+            x = self.PADDING + self.NAME_WIDTH
+            self._surface.blit(row[0], (self.PADDING, y))
+            for cell in row[1:]:
+                # Right aligned.
+                x += self.COLUMN_WIDTH
+                self._surface.blit(cell, (x - cell.get_width(), y))
+
+    # Draws the table with its top left corner at position.
+    # Returns the rect drawn into.
+    def draw(self, screen: Surface, position: tuple[int, int], profiler: Profiler) -> Rect:
+        now = perf_counter()
+        if self._rendered_at == None or now - self._rendered_at >= self.REFRESH:
+            self._render(profiler)
+            self._rendered_at = now
+
+        return screen.blit(self._surface, position)
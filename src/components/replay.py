@@ -0,0 +1,182 @@
+import pygame
+from pygame import Rect, Surface, Vector2
+from pygame.time import Clock
+from classes.recording import Recording, ReplayState
+from components.simulation import Simulation, Snapshot
+from components.toolbar import Toolbar
+from components.text import TextCache
+
+
+# Plays a recording (see classes.recording) back, forwards or \
+# backwards at any speed, without simulating.
+#
+# P or space pauses, the left and right arrows play backwards and \
+# forwards, up and down double and halve the speed, comma and period \
+# step one frame back and forth, Home and End jump to either end, and \
+# clicking or dragging along the timeline at the bottom seeks.
+# Playing on at the end of a recording that is still being written \
+# follows it as it grows.
+class ReplayWindow():
+    WIDTH = 1920
+    HEIGHT = 1080
+
+    FPS = 60
+
+    TIMELINE_HEIGHT = 28
+    TIMELINE_BACKGROUND = (225, 225, 225)
+    TIMELINE_COLOR = (150, 150, 150)
+    TEXT_SIZE = 16
+    PADDING = 6
+
+    def __init__(self, path: str):
+        pygame.init()
+
+        self._recording = Recording(path)
+        config = self._recording.config()
+
+        # Only draws, so it is created empty (but with the recorded obstacles).
+        self._simulation = Simulation.from_dict({**config,
+                                                 'n_blobs': 0,
+                                                 'n_candies': [0, 0],
+                                                 'engine': 'object'})
+        self._toolbar = Toolbar()
+        self._text = TextCache(font_name='Noto Sans Mono')
+        self._clock = Clock()
+
+        # Simulated time shown, and how many simulated seconds \
+        # are played per second, in either direction.
+        self._time = float(self._recording.times()[0])
+        self._speed: float = config['sim_speed']
+        self._direction = 1
+        self._playing = True
+
+        self._screen: Surface = None
+
+    def _size(self) -> tuple[int, int]:
+        return self._screen.get_size()
+
+    def _timeline_rect(self) -> Rect:
+        width, height = self._size()
+        return Rect(0, height - self.TIMELINE_HEIGHT,
+                    width - Toolbar.WIDTH, self.TIMELINE_HEIGHT)
+
+    def _play(self, elapsed: float):
+        times = self._recording.times()
+        self._time += self._direction * self._speed * elapsed
+
+        if self._time >= times[-1]:
+            self._recording.refresh()
+            self._time = min(self._time, float(self._recording.times()[-1]))
+        elif self._time <= times[0]:
+            self._time = float(times[0])
+            self._playing = False
+
+    def _seek(self, time: float):
+        times = self._recording.times()
+        self._time = min(max(time, float(times[0])), float(times[-1]))
+
+    # Moves by frames and pauses.
+    def _step_frames(self, frames: int):
+        frame = self._recording.frame_at(self._time) + frames
+        frame = min(max(frame, 0), len(self._recording) - 1)
+        self._time = float(self._recording.times()[frame])
+        self._playing = False
+
+    def _seek_to(self, x: int):
+        rect = self._timeline_rect()
+        times = self._recording.times()
+        fraction = min(max((x - rect.left) / rect.width, 0), 1)
+        self._seek(float(times[0] + fraction * (times[-1] - times[0])))
+
+    def _play_towards(self, direction: int):
+        self._direction = direction
+        self._playing = True
+
+    def _draw(self):
+        width, height = self._size()
+        self._screen.fill((255, 255, 255))
+
+        state = self._recording.state_at(self._time)
+        means = state.mean_traits()
+        snapshot = Snapshot(time=state.time,
+                            blobs=state.blob_shapes(),
+                            candies=state.candy_shapes(),
+                            mean_traits=means)
+
+        self._simulation.draw(self._screen,
+                              Vector2(0, 0),
+                              (width - Toolbar.WIDTH, height - self.TIMELINE_HEIGHT),
+                              snapshot)
+        self._toolbar.draw(self._screen, means, force=True)
+        self._draw_timeline(state)
+
+    def _draw_timeline(self, state: ReplayState):
+        rect = self._timeline_rect()
+        times = self._recording.times()
+        span = times[-1] - times[0]
+        fraction = (state.time - times[0]) / span if span > 0 else 1.
+
+        self._screen.fill(self.TIMELINE_BACKGROUND, rect)
+        self._screen.fill(self.TIMELINE_COLOR,
+                          Rect(rect.left, rect.top, rect.width * fraction, rect.height))
+
+        if not self._playing:
+            mode = 'paused'
+        else:
+            mode = 'playing' if self._direction > 0 else 'rewinding'
+        label = self._text.render(f'{state.time:9.2f}s / {times[-1]:.2f}s'
+                                  f'   x{self._speed:g} {mode}'
+                                  f'   frame {state.frame + 1}/{len(self._recording)}'
+                                  f'   {state.n_blobs()} blobs, {state.n_candies()} candies',
+                                  self.TEXT_SIZE)
+        self._screen.blit(label, (rect.left + self.PADDING,
+                                  rect.centery - label.get_height() / 2))
+
+    def _on_key(self, key: int):
+        if key in (pygame.K_p, pygame.K_SPACE):
+            self._playing = not self._playing
+        elif key == pygame.K_LEFT:
+            self._play_towards(-1)
+        elif key == pygame.K_RIGHT:
+            self._play_towards(1)
+        elif key == pygame.K_UP:
+            self._speed *= 2
+        elif key == pygame.K_DOWN:
+            self._speed /= 2
+        elif key == pygame.K_COMMA:
+            self._step_frames(-1)
+        elif key == pygame.K_PERIOD:
+            self._step_frames(1)
+        elif key == pygame.K_HOME:
+            self._seek(float(self._recording.times()[0]))
+        elif key == pygame.K_END:
+            self._recording.refresh()
+            self._seek(float(self._recording.times()[-1]))
+
+    def run(self):
+        self._screen = pygame.display.set_mode([self.WIDTH, self.HEIGHT], pygame.RESIZABLE)
+        self._clock.tick()
+        running = True
+
+        while running:
+            elapsed = self._clock.tick(self.FPS) / 1000
+            if self._playing:
+                self._play(elapsed)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    self._on_key(event.key)
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and \
+                     self._timeline_rect().collidepoint(event.pos):
+                    self._seek_to(event.pos[0])
+                elif event.type == pygame.MOUSEMOTION and event.buttons[0] and \
+                     self._timeline_rect().collidepoint(event.pos):
+                    self._seek_to(event.pos[0])
+
+            self._draw()
+            pygame.display.flip()
+
+        self._recording.close()
+        pygame.quit()
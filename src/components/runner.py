@@ -0,0 +1,74 @@
+import time
+import threading
+from components.simulation import Simulation, Snapshot
+
+# Runs a simulation's on_loop on a worker thread, so that how fast it \
+# steps no longer depends on how long drawing a frame takes.
+#
+# After every on_loop the worker publishes a fresh snapshot: it is \
+# built while the previous one may still be drawn, and then replaces \
+# it in a single assignment. The renderer only ever reads the latest \
+# published snapshot, so it never sees a half-stepped state.
+#
+# Anything else that touches the simulation while the runner is \
+# running (saving, pausing) has to hold lock.
+class SimRunner():
+    # How long the worker sleeps between checks while paused, in seconds.
+    PAUSED_WAIT = 0.02
+
+    def __init__(self, simulation: Simulation, *,
+                 # Calls to on_loop per second.
+                 # None runs the simulation as fast as possible.
+                 rate: float = None):
+        self.simulation = simulation
+        self.lock = threading.Lock()
+
+        self._rate = rate
+        self._snapshot: Snapshot = simulation.snapshot()
+        self._running = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Stops the worker and waits for it to finish its current loop.
+    def stop(self):
+        self._running.clear()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+    # Latest published snapshot.
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def playpause(self) -> bool:
+        with self.lock:
+            return self.simulation.playpause()
+
+    def _run(self):
+        period = 1 / self._rate if self._rate != None else 0.
+        deadline = time.perf_counter()
+
+        while self._running.is_set():
+            if self.simulation.paused():
+                time.sleep(self.PAUSED_WAIT)
+                deadline = time.perf_counter()
+                continue
+
+            with self.lock:
+                self.simulation.on_loop()
+                snapshot = self.simulation.snapshot()
+            self._snapshot = snapshot
+
+            deadline += period
+            wait = deadline - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                # Behind schedule, don't try to catch up.
+                deadline = time.perf_counter()
+                # Still give the renderer a chance to take the GIL.
+                time.sleep(0)
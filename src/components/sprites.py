@@ -0,0 +1,91 @@
+import math
+import numpy as np
+import pygame
+from collections.abc import Callable, Iterator
+from pygame import Color, Surface
+
+# Pre-rasterized circles, for drawing many of them with one Surface.blits.
+#
+# Sprites are keyed by their on-screen radius, rounded to RADIUS_STEP \
+# pixels, and an integer color key that color turns into the actual \
+# color. They are drawn SUPERSAMPLE times larger and scaled down, \
+# which gives them the same smooth edges smoothscaling the whole \
+# frame used to.
+class SpriteCache():
+    RADIUS_STEP = 0.5
+
+    SUPERSAMPLE = 4
+
+    # The cache is emptied once it holds this many sprites, \
+    # e.g. after the window was resized a few times.
+    MAX_SPRITES = 8192
+
+    # Color keys must be smaller than this.
+    N_COLOR_KEYS = 1 << 16
+
+    def __init__(self, color: Callable[[int], Color]):
+        self._color = color
+        self._sprites: dict[int, Surface] = {}
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def clear(self):
+        self._sprites.clear()
+
+    # Sprite of a circle with radius steps * RADIUS_STEP pixels, \
+    # centered on a square surface of odd size.
+    def _rasterize(self, steps: int, color_key: int) -> Surface:
+        radius = steps * self.RADIUS_STEP
+        half = math.ceil(radius)
+        size = 2 * half + 1
+
+        # Opaque, since that is how the circles used to be drawn.
+        color = Color(self._color(color_key))
+        color.a = 255
+        
+        large = Surface((size * self.SUPERSAMPLE, size * self.SUPERSAMPLE), pygame.SRCALPHA)
+        # Transparent pixels get the color too, so that scaling \
+        # the sprite down does not darken its edges.
+        large.fill((color.r, color.g, color.b, 0))
+        pygame.draw.circle(large,
+                           color,
+                           (large.get_width() / 2, large.get_height() / 2),
+                           radius * self.SUPERSAMPLE)
+
+        sprite = pygame.transform.smoothscale(large, (size, size))
+        if pygame.display.get_surface() != None:
+            sprite = sprite.convert_alpha()
+        # Run-length encoded, which makes blitting the mostly \
+        # opaque or transparent pixels several times faster.
+        sprite.set_alpha(255, pygame.RLEACCEL)
+        return sprite
+
+    # Blit sequence drawing a circle for every row of positions, \
+    # (n, 2) screen coordinates of the centers, with the given \
+    # radii in pixels and color keys.
+    def blits(self, positions: np.ndarray,
+              radii: np.ndarray,
+              color_keys: np.ndarray) -> Iterator[tuple[Surface, list[int]]]:
+        if len(positions) == 0:
+            return iter(())
+
+        steps = np.rint(radii / self.RADIUS_STEP).astype(np.int64)
+        keys, inverse = np.unique(steps * self.N_COLOR_KEYS + color_keys, return_inverse=True)
+
+        if len(self._sprites) + len(keys) > self.MAX_SPRITES:
+            self._sprites.clear()
+
+        sprites = np.empty(len(keys), dtype=object)
+        sizes = np.empty(len(keys))
+        for i, key in enumerate(keys.tolist()):
+            sprite = self._sprites.get(key)
+            if sprite == None:
+                sprite = self._rasterize(*divmod(key, self.N_COLOR_KEYS))
+                self._sprites[key] = sprite
+            sprites[i] = sprite
+            sizes[i] = sprite.get_width()
+
+        topleft = np.rint(positions - sizes[inverse, None] / 2).astype(np.int64)
+
+        return zip(sprites[inverse].tolist(), topleft.tolist())
@@ -1,71 +1,87 @@
-from pygame import Surface, Rect, Vector2
-from classes.constants import SIM_WIDTH, SIM_HEIGHT
+import pygame
+from pygame import Surface, Rect
+from classes.blob import BlobTraits
+from classes.constants import THEME
+from components.text import TextCache
+
+# Panel listing the mean traits of the blobs on either side.
+#
+# The panel is only rendered again when the text it shows or its \
+# width changes, and only drawn to the screen when it was rendered \
+# again (or when asked to), so frames where the means stay the same \
+# cost nothing.
 class Statbar():
-    WIDTH = 80
+    HEIGHT = 340
+
+    PADDING = 20
+
+    # Vertical distance between lines of text.
+    LINE_HEIGHT = 50
+
+    TITLE_SIZE = 30
+    TEXT_SIZE = 30
 
-    HEIGHT = 180
     def __init__(self):
-        self._surface = Surface((self.WIDTH, self.HEIGHT))
-        
+        self._text = TextCache()
+        self._surface: Surface = None
+
+        # Lines shown on self._surface.
+        self._lines: tuple[str, ...] = None
+
+    def _format(value: float) -> str:
+        return f'{value:.2f}' if value != None else 'N/A'
+
+    def _lines_for(self, means: tuple[BlobTraits, BlobTraits]) -> tuple[str, ...]:
+        lines = []
+        for side, mean in zip(('left', 'right'), means):
+            lines += [f'Mean Phenotype Values ({side})',
+                      f'Mean size: {Statbar._format(mean.size)}',
+                      f'Mean speed: {Statbar._format(mean.speed)}']
+        return tuple(lines)
+
     def _draw_trait_values(self, *,
-                           position: tuple[int, int], 
-                           mean_size: float,
-                           mean_speed: float,
+                           position: tuple[int, int],
+                           lines: tuple[str, str, str],
                            alignleft: bool):
-        
-        titlefont = pygame.font.SysFont('Noto Sans', 30, True)
-        font = pygame.font.SysFont('Noto Sans', 30, False)
-
-        text1 = titlefont.render('Mean Phenotype Values', True, (0, 0, 0))
-        text2 = font.render(f'Mean size: {mean_size if mean_size != None else "N/A"}', True, (0, 0, 0))
-        text3 = font.render(f'Mean speed: {mean_speed if mean_speed != None else "N/A"}', True, (0, 0, 0))
-
-        text2.get_width()
-        
-        margin = 50
-
-        if alignleft:
-            self._surface.blit(text1, position)
-            self._surface.blit(text2, (position[0], position[1] + margin))
-            self._surface.blit(text3, (position[0], position[1] + margin * 2))
-        else:
-            self._surface.blit(text1, (position[0] - text1.get_width(), position[1]))
-            self._surface.blit(text2, (position[0] - text2.get_width(), position[1] + margin))
-            self._surface.blit(text3, (position[0] - text3.get_width(), position[1] + margin * 2))
-            
-
-    
-    def _draw(self, lmean: float, rmean: float):
-        pygame.draw.rect(self._surface, (0, 0, 0), Rect(0, SIM_HEIGHT-1, SIM_WIDTH, 5))
-        pygame.draw.line(self._surface, (0, 0, 0), (SIM_WIDTH/2, SIM_HEIGHT),
-                         (SIM_WIDTH/2, SIM_HEIGHT + self.STATBAR_HEIGHT),
-                         5)
-                
-        self._draw_trait_values(position=(20, SIM_HEIGHT + 20),
-                                mean_size=lmean.size,
-                                mean_speed=lmean.speed,
+        texts = (self._text.render(lines[0], self.TITLE_SIZE, True),
+                 self._text.render(lines[1], self.TEXT_SIZE),
+                 self._text.render(lines[2], self.TEXT_SIZE))
+
+        for i, text in enumerate(texts):
+            x = position[0] if alignleft else position[0] - text.get_width()
+            self._surface.blit(text, (x, position[1] + self.LINE_HEIGHT * i))
+
+    def _draw(self, width: int, lines: tuple[str, ...]):
+        if self._surface == None or self._surface.get_width() != width:
+            self._surface = Surface((width, self.HEIGHT))
+
+        self._surface.fill(THEME['toolbar_bg'])
+
+        half = self.HEIGHT // 2
+        self._draw_trait_values(position=(self.PADDING, self.PADDING),
+                                lines=lines[:3],
                                 alignleft=True)
-        self._draw_trait_values(position=(SIM_WIDTH / 2 + 20, SIM_HEIGHT + 20),
-                                mean_size=rmean.size,
-                                mean_speed=rmean.speed,
+        pygame.draw.line(self._surface, (0, 0, 0),
+                         (self.PADDING, half), (width - self.PADDING, half), 2)
+        self._draw_trait_values(position=(self.PADDING, half + self.PADDING),
+                                lines=lines[3:],
                                 alignleft=True)
-    
-    def draw(self, screen: Surface, offset: float, bounds: tuple[int, int], means: tuple[float, float]): 
-        self._draw(means[0], means[1])
-        dims = self.size(bounds)
-        pos = ((bounds[0] - dims[0]) / 2, offset)
-        
-        screen.blit(pygame.transform.smoothscale(self._surface, dims),
-                    pos)
-        return Rect(pos[0], pos[1], dims[1], dims[1])
-        
-        
-    def size(self, bounds: tuple[int, int]):
-        width, height = bounds
-        
-        if width / height < SIM_WIDTH / SIM_HEIGHT:
-            dims = (width, (SIM_HEIGHT/SIM_WIDTH) * width)
-        else:
-            dims = (height * (SIM_WIDTH/SIM_HEIGHT), height)
-        
-        return dims
\ No newline at end of file
+
+        self._lines = lines
+
+    # Draws the panel with its top left corner at position.
+    # Returns the rect drawn into, or None if the panel was already \
+    # showing means at this width and force is not set.
+    def draw(self, screen: Surface, position: tuple[int, int], width: int,
+             means: tuple[BlobTraits, BlobTraits], force: bool = False) -> Rect:
+        lines = self._lines_for(means)
+
+        changed = (self._surface == None or
+                   self._surface.get_width() != width or
+                   lines != self._lines)
+        if changed:
+            self._draw(width, lines)
+        elif not force:
+            return None
+
+        return screen.blit(self._surface, position)
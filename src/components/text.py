@@ -0,0 +1,42 @@
+import pygame
+from pygame import Surface
+from pygame.font import Font
+
+# Fonts by (name, size, bold).
+# Looking up a system font is slow, so every font is only loaded once.
+_fonts: dict[tuple[str, int, bool], Font] = {}
+
+def font(name: str, size: int, bold: bool = False) -> Font:
+    key = (name, size, bold)
+    if key not in _fonts:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        _fonts[key] = pygame.font.SysFont(name, size, bold)
+    return _fonts[key]
+
+
+# Rendered text, keyed on the string and how it is drawn.
+#
+# Labels that stay the same are rendered once, and values that \
+# take turns (e.g. "N/A" and a number) are only rendered the first \
+# time they are shown.
+class TextCache():
+    # The cache is emptied once it holds this many surfaces.
+    MAX_ENTRIES = 1024
+
+    def __init__(self, *,
+                 font_name: str = 'Noto Sans',
+                 color: tuple[int, int, int] = (0, 0, 0)):
+        self._font_name = font_name
+        self._color = color
+        self._texts: dict[tuple[str, int, bool], Surface] = {}
+
+    def render(self, text: str, size: int, bold: bool = False) -> Surface:
+        key = (text, size, bold)
+        surface = self._texts.get(key)
+        if surface == None:
+            if len(self._texts) >= self.MAX_ENTRIES:
+                self._texts.clear()
+            surface = font(self._font_name, size, bold).render(text, True, self._color)
+            self._texts[key] = surface
+        return surface
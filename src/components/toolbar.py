@@ -1,26 +1,49 @@
 import pygame
 from pygame import Surface, Rect, Vector2
-from classes.stats import SimStats
+from classes.blob import BlobTraits
 from classes.constants import SIM_WIDTH, SIM_HEIGHT, THEME
+from components.statbar import Statbar
+
+# Panel on the right edge of the window.
+#
+# Its background is only rendered again when the window height \
+# changes, and the statbar on it redraws itself when its values do.
 class Toolbar():
     WIDTH = 600
 
     def __init__(self):
-        self._surface = Surface((self.WIDTH, 200))
-        
-        
+        self._surface: Surface = None
+        self._statbar = Statbar()
+
+
 
     def _draw(self, height: int):
-        
+
         self._surface = Surface((self.WIDTH, height))
-        
+
         self._surface.fill(THEME['toolbar_bg'])
-        
-        
-    
-    def draw(self, screen: Surface): 
+
+
+
+    # Draws the toolbar, showing the given mean traits.
+    # Returns the rects of the screen that changed, \
+    # everything it covers when force is set.
+    def draw(self, screen: Surface, means: tuple[BlobTraits, BlobTraits],
+             force: bool = False) -> list[Rect]:
         width, height = screen.get_size()
+        position = (width - self.WIDTH, 0)
+
+        dirty = []
+
+        if self._surface == None or self._surface.get_height() != height:
+            self._draw(height)
+            force = True
+
+        if force:
+            dirty.append(screen.blit(self._surface, position))
+
+        statbar = self._statbar.draw(screen, position, self.WIDTH, means, force)
+        if statbar != None:
+            dirty.append(statbar)
 
-        self._draw(height)
-        
-        screen.blit(self._surface, (width-self.WIDTH, 0))        
\ No newline at end of file
+        return dirty
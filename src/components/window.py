@@ -7,6 +7,11 @@ from pygame.font import Font
 from pygame import Rect, Surface, Vector2
 from components.toolbar import Toolbar
 from components.simulation import Simulation
+from components.runner import SimRunner
+from components.overlay import ProfileOverlay
+from classes.profiling import Profiler, ProfileWriter
+from classes.recording import EventRecorder
+from time import perf_counter_ns
 from classes.constants import SIZE_SCALE, SIM_WIDTH, SIM_HEIGHT
 
 
@@ -14,6 +19,12 @@ class Window():
     WIDTH = 1920
     HEIGHT = 1080
     
+    # Written when S is pressed, restored when L is pressed.
+    CHECKPOINT_FILE = './checkpoint.npz'
+    
+    # Frame rate cap when the simulation runs on its own thread.
+    FPS = 60
+    
 
     
     def __init__(self, config: IO):
@@ -25,13 +36,42 @@ class Window():
         self._paused_clock = Clock()
         self._paused_time = 0
 
-        self._simulation: Simulation = Simulation.from_config(config)
+        config: dict = json.load(config)
+        self._simulation: Simulation = Simulation.from_dict(config)
         self._toolbar: Toolbar = Toolbar()
         
+        # Whether the simulation steps on a worker thread (see SimRunner) \
+        # instead of once per frame, and how often it steps there.
+        self._threaded: bool = config.get('threaded', False)
+        self._sim_rate: float = config.get('sim_rate')
+        self._runner: SimRunner = None
+        
+        # Steps per drawn frame while fast-forwarding (toggled with F).
+        self._fast_forward_steps: int = config.get('fast_forward_steps', 10)
+        
+        # Phase timings, collected with "profile" set or once I is pressed, \
+        # and written to "profile_output" (.csv or .jsonl) if given.
+        if config.get('profile', False):
+            self._simulation.profiler = self._new_profiler(config.get('profile_output'))
+        # Every step is written to "record_output", if given, \
+        # to be played back with replay.py.
+        if config.get('record_output') != None:
+            self._simulation.recorder = EventRecorder.open(config['record_output'],
+                                                           self._simulation.config())
+        # Shows the profiler's percentiles (toggled with I).
+        self._overlay: ProfileOverlay = None
+        
         # Screen for drawing with pygame.
         # Initialized in self.run()
         self._screen: Surface = None
         
+        # Whether the next frame has to redraw the whole screen, \
+        # e.g. after the window was resized.
+        self._full_redraw = True
+        
+        # Simulated time of the state last drawn.
+        self._drawn_time: float = None
+        
         
     # Gets current window dimensions
     def _size(self):
@@ -47,26 +87,123 @@ class Window():
           anchors={'center': 'center'})
 
     
-    def _draw(self):
-        simrect = self._simulation.draw(self._screen, 
-                                        Vector2(0, 0),
-                                        (self._size()[0] - Toolbar.WIDTH,
-                                         self._size()[1]))
-        self._toolbar.draw(self._screen)
+    # Draws whatever changed since the last frame.
+    # Returns the changed rects of the screen, or None if \
+    # all of it was drawn.
+    def _draw(self) -> list[Rect]:
+        if self._runner != None:
+            snapshot = self._runner.snapshot()
+            time, means = snapshot.time, snapshot.mean_traits
+        else:
+            # Drawn from the simulation directly.
+            snapshot = None
+            time, means = self._simulation.time(), self._simulation.mean_traits()
+        
+        full = self._full_redraw
+        self._full_redraw = False
+        if full:
+            self._screen.fill((255, 255, 255))
         
+        dirty = []
         
+        # The simulation only looks different once it has stepped.
+        if full or time != self._drawn_time:
+            dirty.append(self._simulation.draw(self._screen, 
+                                               Vector2(0, 0),
+                                               (self._size()[0] - Toolbar.WIDTH,
+                                                self._size()[1]),
+                                               snapshot))
+            self._drawn_time = time
         
+        profiler = self._simulation.profiler
+        if profiler != None:
+            start = perf_counter_ns()
+        
+        dirty += self._toolbar.draw(self._screen, means, force=full)
+        if self._overlay != None:
+            dirty.append(self._overlay.draw(self._screen, (0, 0), profiler))
+        
+        if profiler != None:
+            profiler.record({'ui': perf_counter_ns() - start})
+        
+        return None if full else dirty
+
+
+    def _new_profiler(self, output: str = None) -> Profiler:
+        return Profiler(output=ProfileWriter.open(output) if output != None else None)
+
+    def _toggle_overlay(self):
+        if self._overlay != None:
+            self._overlay = None
+            # Uncovers what was under it.
+            self._full_redraw = True
+            return
+        
+        if self._simulation.profiler == None:
+            self._simulation.profiler = self._new_profiler()
+        self._overlay = ProfileOverlay()
+
+
+    def _start_simulation(self):
+        if self._threaded:
+            self._runner = SimRunner(self._simulation, rate=self._sim_rate)
+            self._runner.start()
+
+    def _stop_simulation(self):
+        if self._runner != None:
+            self._runner.stop()
+            self._runner = None
+
+    def _toggle_fast_forward(self):
+        if self._simulation.fast_forwarding():
+            self._simulation.fast_forward(1)
+        else:
+            self._simulation.fast_forward(self._fast_forward_steps)
+
+    def _save(self):
+        if self._runner != None:
+            with self._runner.lock:
+                self._simulation.save(self.CHECKPOINT_FILE)
+        else:
+            self._simulation.save(self.CHECKPOINT_FILE)
+
+    # Replaces the simulation with the one saved by _save, \
+    # keeping fast-forward and the profiler as they were.
+    # A recording holds a single run, so it ends here.
+    def _load(self):
+        steps = self._fast_forward_steps if self._simulation.fast_forwarding() else 1
+        profiler = self._simulation.profiler
+
+        self._stop_simulation()
+        self._stop_recording()
+        self._simulation = Simulation.load(self.CHECKPOINT_FILE)
+        self._simulation.fast_forward(steps)
+        self._simulation.profiler = profiler
+        self._start_simulation()
+        self._full_redraw = True
+
+
+
+    def _stop_recording(self):
+        if self._simulation.recorder != None:
+            self._simulation.recorder.close()
+            self._simulation.recorder = None
 
-   
-    
     def run(self):
         self._screen = pygame.display.set_mode([self.WIDTH,
                                                 self.HEIGHT],
                                                 pygame.RESIZABLE)
         running = True
+        
+        self._start_simulation()
 
         while running:            
-            self._simulation.on_loop()
+            if self._runner == None and not self._simulation.paused():
+                self._simulation.on_loop()
+            else:
+                # The simulation steps by itself or not at all, \
+                # only draw as often as needed.
+                self._loop_clock.tick(self.FPS)
             
             
 
@@ -76,17 +213,34 @@ class Window():
                 if event.type == pygame.QUIT:
                     running = False
                 
+                elif event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                    self._full_redraw = True
+                
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_p:
-                        self._simulation.playpause()
+                        if self._runner != None:
+                            self._runner.playpause()
+                        else:
+                            self._simulation.playpause()
+                    elif event.key == pygame.K_f:
+                        self._toggle_fast_forward()
+                    elif event.key == pygame.K_i:
+                        self._toggle_overlay()
+                    elif event.key == pygame.K_s:
+                        self._save()
+                    elif event.key == pygame.K_l:
+                        self._load()
             
             
-            self._screen.fill((255, 255, 255))
-            
-
-            
-            self._draw()
+            dirty = self._draw()
     
-            pygame.display.flip()
+            if dirty == None:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
         
+        self._stop_simulation()
+        self._stop_recording()
+        if self._simulation.profiler != None:
+            self._simulation.profiler.close()
         pygame.quit()
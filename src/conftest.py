@@ -0,0 +1,2 @@
+# Makes the packages here (classes, components) importable from the tests, \
+# as they are for the scripts run from this directory.
@@ -0,0 +1,45 @@
+import json
+import time
+import argparse
+import numpy as np
+from classes import ensemble
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs config.json with many seeds at once, headless.')
+    parser.add_argument('config', help='config file, as read by World.from_dict')
+    parser.add_argument('--seeds', type=int, default=100,
+                        help='number of replicates')
+    parser.add_argument('--first-seed', type=int, default=0,
+                        help='seed of the first replicate, the others count up from it')
+    parser.add_argument('--duration', type=float, default=60.,
+                        help='simulated seconds per replicate')
+    parser.add_argument('--dt', type=float, default=0.02,
+                        help='step length, unless the config sets fixed_dt')
+    parser.add_argument('--sample-interval', type=float, default=1.,
+                        help='simulated seconds between samples')
+    parser.add_argument('--out', default='./ensemble.npz',
+                        help='file the time series are written to')
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        config = json.load(file)
+
+    seeds = list(range(args.first_seed, args.first_seed + args.seeds))
+
+    start = time.perf_counter()
+    columns = ensemble.run(config, seeds,
+                           duration=args.duration,
+                           dt=args.dt,
+                           sample_interval=args.sample_interval)
+    elapsed = time.perf_counter() - start
+
+    # time has one entry per sample, every other field one row per seed.
+    np.savez(args.out, seed=np.array(seeds), **columns)
+
+    print(f'{len(seeds)} replicates of {args.duration}s in {elapsed:.1f}s, written to {args.out}')
+    for field in ('l_mean_size', 'r_mean_size', 'l_mean_speed', 'r_mean_speed'):
+        final = columns[field][:, -1]
+        print(f'{field}: {np.nanmean(final):.2f} +- {np.nanstd(final):.2f}')
+
+if __name__ == "__main__":
+    main()
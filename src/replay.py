@@ -0,0 +1,12 @@
+import argparse
+from components.replay import ReplayWindow
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays back a run recorded with record_output set.')
+    parser.add_argument('recording', help='file written by classes.recording.EventRecorder')
+    args = parser.parse_args()
+
+    ReplayWindow(args.recording).run()
+
+if __name__ == "__main__":
+    main()
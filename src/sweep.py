@@ -0,0 +1,42 @@
+import os
+import json
+import argparse
+from classes import sweep
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a parameter sweep over config.json headless.')
+    parser.add_argument('spec', help='JSON file describing the sweep')
+    parser.add_argument('--out', default='./sweep_results',
+                        help='results directory, reused to resume a sweep')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    with open(args.spec) as file:
+        spec = json.load(file)
+
+    # The base config is looked up relative to the sweep file.
+    spec['base'] = os.path.join(os.path.dirname(args.spec),
+                                spec.get('base', './config.json'))
+
+    keys = [key for key, _, _ in sweep.points(spec)]
+    finished = sweep.finished_keys(args.out)
+    total = len(keys)
+    done = sum(key in finished for key in keys)
+    print(f'{total} points, {done} already finished')
+
+    failed = 0
+    for entry in sweep.run(spec, args.out, args.workers):
+        if 'error' in entry:
+            failed += 1
+            print(f'failed: {entry["overrides"]}: {entry["error"]}')
+            continue
+        done += 1
+        print(f'[{done}/{total}] {entry["overrides"]}')
+
+    if failed:
+        print(f'{failed} points failed, see {os.path.join(args.out, sweep.FAILURES)}; '
+              f'running the sweep again retries them')
+
+if __name__ == "__main__":
+    main()
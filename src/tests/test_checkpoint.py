@@ -0,0 +1,49 @@
+import io
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from classes import checkpoint
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+
+def make_world(engine: str) -> World:
+    return World.from_dict({**CONFIG, 'engine': engine, 'fixed_dt': DT, 'n_blobs': 60})
+
+
+def save(world: World) -> io.BytesIO:
+    file = io.BytesIO()
+    world.save(file)
+    file.seek(0)
+    return file
+
+
+def assert_same_checkpoint(world: World, other: World):
+    meta, blobs, candies = checkpoint.read(save(world))
+    other_meta, other_blobs, other_candies = checkpoint.read(save(other))
+
+    assert meta == other_meta
+    for columns, other_columns in ((blobs, other_blobs), (candies, other_candies)):
+        assert columns.keys() == other_columns.keys()
+        for field in columns:
+            assert np.array_equal(columns[field], other_columns[field]), field
+
+
+# A world restored mid-run carries on exactly as the original does.
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_checkpoint_continues_exactly(engine: str):
+    world = make_world(engine)
+    for _ in range(75):
+        world.step(DT)
+
+    restored = World.load(save(world))
+    assert restored.config() == world.config()
+    assert_same_checkpoint(world, restored)
+
+    for _ in range(75):
+        world.step(DT)
+        restored.step(DT)
+    assert_same_checkpoint(world, restored)
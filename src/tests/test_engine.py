@@ -0,0 +1,124 @@
+import io
+import json
+from pathlib import Path
+import numpy as np
+from numpy import random
+from classes import checkpoint
+from classes.blob import Blob, BlobTraits, MutationSdvs
+from classes.candy import Candy
+from classes.geometry import Rect, Vector2
+from classes.constants import SIM_WIDTH, SIM_HEIGHT
+from classes.engine import ArrayEngine
+from classes.world import World
+
+# The array engine against the rules of the Blob objects it replaces.
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+# Placed as Simulation places them, with a third of the height open.
+SEPARATORS = (Rect(SIM_WIDTH / 2 - 40, 0, 80, SIM_HEIGHT / 3),
+              Rect(SIM_WIDTH / 2 - 40, SIM_HEIGHT * 2 / 3, 80, SIM_HEIGHT / 3))
+
+
+def make_population(seed: int, n_blobs: int, n_candies: int) -> tuple[list[Blob], list[Candy]]:
+    rng = random.default_rng(seed)
+    blobs = [Blob.random(rng=rng,
+                         mean_traits=BlobTraits(size=30, speed=200),
+                         sdvs=MutationSdvs(size_sdv=5, speed_sdv=20),
+                         separators=SEPARATORS)
+             for _ in range(n_blobs)]
+    candies = [Candy.random(rng=rng,
+                            mean_size=10,
+                            sdv=2,
+                            bounds=Rect(0, 0, SIM_WIDTH, SIM_HEIGHT))
+               for _ in range(n_candies)]
+    return (blobs, candies)
+
+
+def make_engine(blobs: list[Blob], candies: list[Candy]) -> ArrayEngine:
+    engine = ArrayEngine(rng=random.default_rng(0),
+                         separators=SEPARATORS,
+                         mutation_sdvs=MutationSdvs(size_sdv=1, speed_sdv=1),
+                         candy_energy_density=2000)
+    engine.add_blobs(blobs)
+    engine.add_candies(candies)
+    return engine
+
+
+def save(world: World) -> io.BytesIO:
+    file = io.BytesIO()
+    world.save(file)
+    file.seek(0)
+    return file
+
+
+# Without eating, every blob keeps chasing its closest visible candy, \
+# so the two stay comparable over many steps.
+def test_array_moves_match_blob_move():
+    blobs, candies = make_population(1, 40, 60)
+    engine = make_engine(blobs, candies)
+
+    for _ in range(50):
+        engine._move(DT)
+        for blob in blobs:
+            blob._move(candies, blobs, SEPARATORS, DT)
+
+        assert np.allclose(engine.blobs.position,
+                           [(blob.position.x, blob.position.y) for blob in blobs],
+                           rtol=0, atol=1e-6)
+        assert np.allclose(engine.blobs.vel,
+                           [(blob.vel.x, blob.vel.y) for blob in blobs],
+                           rtol=0, atol=1e-6)
+        assert np.allclose(engine.blobs.energy,
+                           [blob.energy for blob in blobs],
+                           rtol=1e-9)
+
+
+# A blob exactly on its target has no acceleration in either engine.
+def test_blob_on_its_target():
+    blobs, candies = make_population(4, 5, 10)
+    # Clear of the separators, so that the candy can be seen.
+    candy = next(candy for candy in candies if abs(candy.position.x - SIM_WIDTH / 2) > 100)
+    blobs[0].position = Vector2(candy.position.x, candy.position.y)
+    blobs[0].vel = Vector2(0, 0)
+    engine = make_engine(blobs, candies)
+
+    engine._move(DT)
+    for blob in blobs:
+        blob._move(candies, blobs, SEPARATORS, DT)
+
+    assert (blobs[0].acc.x, blobs[0].acc.y) == (0, 0)
+    assert np.array_equal(engine.blobs.acc[0], (0, 0))
+    assert np.allclose(engine.blobs.position,
+                       [(blob.position.x, blob.position.y) for blob in blobs],
+                       rtol=0, atol=1e-6)
+
+
+def test_mean_traits_match_a_full_scan():
+    blobs, candies = make_population(2, 50, 0)
+    engine = make_engine(blobs, candies)
+
+    left = [blob for blob in blobs if blob.position.x < SIM_WIDTH / 2]
+    right = [blob for blob in blobs if blob.position.x >= SIM_WIDTH / 2]
+    for means, side in zip(engine.mean_traits(), (left, right)):
+        assert np.isclose(means.size, np.mean([blob.traits.size for blob in side]))
+        assert np.isclose(means.speed, np.mean([blob.traits.speed for blob in side]))
+
+
+# Whole worlds on either engine follow the same rules, up to rounding \
+# in the order floating point operations are done in.
+def test_object_and_array_worlds_agree():
+    config = {**CONFIG, 'fixed_dt': DT, 'n_blobs': 60}
+    worlds = [World.from_dict({**config, 'engine': engine}) for engine in ('object', 'array')]
+
+    for _ in range(150):
+        for world in worlds:
+            world.step(DT)
+        (_, blobs, candies), (_, array_blobs, array_candies) = (checkpoint.read(save(world))
+                                                                for world in worlds)
+
+        assert np.array_equal(blobs['id'], array_blobs['id'])
+        assert np.array_equal(candies['id'], array_candies['id'])
+        assert np.allclose(blobs['position'], array_blobs['position'], rtol=0, atol=1e-6)
+        assert np.allclose(blobs['size'], array_blobs['size'], rtol=0, atol=1e-9)
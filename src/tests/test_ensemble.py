@@ -0,0 +1,29 @@
+import json
+from pathlib import Path
+import numpy as np
+from classes.ensemble import Ensemble
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+
+# Every replicate of an ensemble is the 'array' World of its seed.
+def test_replicates_match_worlds():
+    seeds = [1, 2, 3]
+    config = {**CONFIG, 'fixed_dt': DT, 'n_blobs': 60}
+    ensemble = Ensemble(config, seeds)
+    worlds = [World.from_dict({**config, 'seed': seed, 'engine': 'array'}) for seed in seeds]
+
+    for _ in range(150):
+        ensemble.step(DT)
+        for world in worlds:
+            world.step(DT)
+
+    assert ensemble.time() == worlds[0].time()
+    assert list(ensemble.n_blobs()) == [world.n_blobs() for world in worlds]
+    assert list(ensemble.n_candies()) == [world.n_candies() for world in worlds]
+    for means, world in zip(ensemble.mean_traits(), worlds):
+        expected = [(side.size, side.speed) if side.size != None else (np.nan, np.nan)
+                    for side in world.mean_traits()]
+        assert np.allclose(means, expected, equal_nan=True)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from numpy import random
+from classes.blob import MutationSdvs
+from classes.engine import ArrayEngine
+from classes.geometry import Vector2
+from classes.neighbours import Crowding, NeighbourIndex
+from test_engine import DT, SEPARATORS, make_population
+
+
+def brute_force(positions: np.ndarray, layers: np.ndarray) -> np.ndarray:
+    delta = positions[:, None, :] - positions[None, :, :]
+    dist = np.sqrt(delta[..., 0]**2 + delta[..., 1]**2)
+    dist[layers[:, None] != layers[None, :]] = np.inf
+    np.fill_diagonal(dist, np.inf)
+    return dist
+
+
+@pytest.mark.parametrize('n_layers', [1, 3])
+def test_queries_match_brute_force(n_layers: int):
+    rng = random.default_rng(n_layers)
+    positions = rng.uniform((0, 0), (600, 400), (300, 2))
+    # A few blobs on the same spot.
+    positions[10:13] = positions[9]
+    layers = rng.integers(0, n_layers, 300)
+    index = NeighbourIndex(positions, layers if n_layers > 1 else None)
+    dist = brute_force(positions, layers)
+
+    owners, others, found = index.within(45.)
+    expected_owners, expected_others = np.nonzero(dist <= 45.)
+    assert np.array_equal(owners, expected_owners)
+    assert np.array_equal(others, expected_others)
+    assert np.allclose(found, dist[owners, others])
+
+    nearest, nearest_dist = index.nearest(4)
+    order = np.lexsort((np.broadcast_to(np.arange(300), dist.shape), dist), axis=1)[:, :4]
+    assert np.array_equal(nearest, np.where(np.isinf(dist[np.arange(300)[:, None], order]), -1, order))
+    assert np.allclose(nearest_dist, np.take_along_axis(dist, order, axis=1))
+
+
+# Blobs with nothing to go after are still pushed apart, the same way \
+# by both engines.
+def test_pushes_move_blobs_without_a_target():
+    blobs, candies = make_population(3, 30, 0)
+    # Pairs of overlapping blobs.
+    for blob, other in zip(blobs[::2], blobs[1::2]):
+        other.position = Vector2(blob.position.x + 3, blob.position.y)
+    start = [(blob.position.x, blob.position.y) for blob in blobs]
+    engine = ArrayEngine(rng=random.default_rng(0),
+                         separators=SEPARATORS,
+                         mutation_sdvs=MutationSdvs(size_sdv=1, speed_sdv=1),
+                         candy_energy_density=2000,
+                         interaction=Crowding())
+    engine.add_blobs(blobs)
+
+    for _ in range(10):
+        pushes = engine._pushes()
+        engine._move(DT)
+        for blob, push in zip(blobs, pushes):
+            blob._move(candies, blobs, SEPARATORS, DT, Vector2(*push))
+
+        assert np.allclose(engine.blobs.position,
+                           [(blob.position.x, blob.position.y) for blob in blobs],
+                           rtol=0, atol=1e-6)
+
+    gaps = np.abs(engine.blobs.position[1::2, 0] - engine.blobs.position[::2, 0])
+    assert np.all(gaps > 3)
+    assert not np.allclose(engine.blobs.position, start)
+
+
+def test_crowding_from_dict_fills_in_defaults():
+    crowding = Crowding.from_dict({'margin': 4.})
+    assert (crowding.strength, crowding.margin) == (Crowding().strength, 4.)
+    assert Crowding.from_dict({}).to_dict() == Crowding().to_dict()
+
+    with pytest.raises(ValueError, match='strenght'):
+        Crowding.from_dict({'strenght': 100.})
@@ -0,0 +1,53 @@
+import numpy as np
+from numpy import random
+import pygame
+from classes import occlusion
+from classes.geometry import Rect
+
+# occlusion.visible against pygame's Rect.clipline, one segment at a time.
+
+RECTS = [Rect(660, 0, 80, 300), Rect(660, 600, 80, 300),
+         Rect(100, 100, 1, 50), Rect(-20, 40, 60, 1), Rect(300, 300, 0, 10)]
+
+
+def clipline_visible(origin, target, rects: list[Rect]) -> bool:
+    return all(pygame.Rect(rect.x, rect.y, rect.w, rect.h).clipline(tuple(origin), tuple(target)) == ()
+               for rect in rects)
+
+
+def check_segments(origins: np.ndarray, targets: np.ndarray):
+    mask = occlusion.visible(origins, targets, RECTS)
+    expected = [clipline_visible(origin, target, RECTS)
+                for origin, target in zip(origins.tolist(), targets.tolist())]
+    assert mask.tolist() == expected
+
+
+def test_random_segments_match_clipline():
+    rng = random.default_rng(3)
+    check_segments(rng.uniform(-50, 1450, (20000, 2)), rng.uniform(-50, 1450, (20000, 2)))
+
+
+# Near the rects, integer-valued, and along an axis: where truncation \
+# and clipping rounding decide the answer.
+def test_edge_cases_match_clipline():
+    rng = random.default_rng(4)
+    origins = rng.integers(600, 800, (20000, 2)).astype(float)
+    targets = rng.integers(-30, 900, (20000, 2)).astype(float)
+    check_segments(origins, targets)
+
+    axis = rng.integers(0, 2, 20000).astype(bool)
+    targets[axis, 0] = origins[axis, 0]
+    targets[~axis, 1] = origins[~axis, 1]
+    check_segments(origins + rng.choice([0., 0.5, -0.5], origins.shape), targets)
+
+
+def test_broadcasts_origins_against_targets():
+    rng = random.default_rng(5)
+    origins = rng.uniform(0, 1400, (30, 1, 2))
+    targets = rng.uniform(0, 1400, (1, 40, 2))
+    mask = occlusion.visible(origins, targets, RECTS)
+
+    assert mask.shape == (30, 40)
+    for i in range(30):
+        for j in range(40):
+            assert mask[i, j] == clipline_visible(origins[i, 0], targets[0, j], RECTS)
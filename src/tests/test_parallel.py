@@ -0,0 +1,39 @@
+import io
+import json
+from pathlib import Path
+import numpy as np
+from classes import checkpoint
+from classes.parallel import ParallelEngine
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+
+def columns(world: World) -> tuple[dict, dict]:
+    file = io.BytesIO()
+    world.save(file)
+    file.seek(0)
+    _, blobs, candies = checkpoint.read(file)
+    return blobs, candies
+
+
+# Splitting the move phase between workers gives the same run as \
+# moving every blob in one process.
+def test_parallel_engine_matches_array_engine(monkeypatch):
+    # Small strips, so that this population is split between workers.
+    monkeypatch.setattr(ParallelEngine, 'MIN_STRIP', 20)
+    config = {**CONFIG, 'fixed_dt': DT, 'n_blobs': 60}
+    array = World.from_dict({**config, 'engine': 'array'})
+    parallel = World.from_dict({**config, 'engine': 'parallel', 'workers': 2})
+
+    for _ in range(50):
+        array.step(DT)
+        parallel.step(DT)
+    assert len(parallel._arrays._processes) == 1
+    assert parallel.time() == array.time()
+
+    for ours, theirs in zip(columns(array), columns(parallel)):
+        assert ours.keys() == theirs.keys()
+        for field in ours:
+            assert np.array_equal(ours[field], theirs[field]), field
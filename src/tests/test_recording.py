@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from classes.recording import EventRecorder, Recording, SCALE
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+STEPS = 150
+
+
+# Steps a recorded world, returning what every frame should decode to.
+def record(world: World, path: Path) -> list[tuple[np.ndarray, ...]]:
+    world.recorder = EventRecorder.open(path, world.config(), keyframe_interval=25)
+
+    live = []
+    for _ in range(STEPS):
+        world.step(DT)
+        blobs, candies = world.entity_columns()
+        live.append((blobs['id'].copy(),
+                     np.rint(blobs['position'] * SCALE).astype(np.int32),
+                     blobs['size'].astype(np.float32),
+                     candies['id'].copy()))
+    world.recorder.close()
+    return live
+
+
+def assert_decodes_to(recording: Recording, live: list[tuple[np.ndarray, ...]]):
+    assert len(recording) == len(live)
+    # Forwards frame by frame, then backwards from keyframes.
+    for frame in list(range(len(live))) + list(range(len(live) - 1, -1, -7)):
+        state = recording.state(frame)
+        ids, positions, sizes, candy_ids = live[frame]
+        assert np.array_equal(state.blobs['id'], ids)
+        assert np.array_equal(state.blobs['position'], positions)
+        assert np.array_equal(state.blobs['size'], sizes)
+        assert np.array_equal(np.sort(state.candies['id']), np.sort(candy_ids))
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_recording_decodes_to_live_state(engine: str, tmp_path: Path):
+    world = World.from_dict({**CONFIG, 'engine': engine, 'fixed_dt': DT, 'n_blobs': 60})
+    live = record(world, tmp_path / 'run.rec')
+
+    recording = Recording(tmp_path / 'run.rec')
+    assert_decodes_to(recording, live)
+    recording.close()
+
+
+# With a candy limit this low, some candies are evicted in the step \
+# they are spawned in, and must not be left behind on replay.
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_candies_spawned_and_evicted_in_one_step(engine: str, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(World, 'CANDY_LIMIT', 5)
+    world = World.from_dict({**CONFIG, 'engine': engine, 'fixed_dt': DT, 'n_blobs': 20, 'n_candies': [2, 2]})
+    live = record(world, tmp_path / 'run.rec')
+
+    recording = Recording(tmp_path / 'run.rec')
+    assert_decodes_to(recording, live)
+
+    at_once = 0
+    for frame in range(len(recording)):
+        events = recording.events(frame)
+        if 'spawns' in events and 'removals' in events:
+            at_once += np.isin(events['spawns']['id'], events['removals']).sum()
+    assert at_once > 0
+    recording.close()
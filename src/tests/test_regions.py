@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+import numpy as np
+from numpy import random
+import pytest
+from classes.constants import SIM_WIDTH
+from classes.regions import RegionalTraits
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+
+# Means and variances of (size, speed) per side, scanning every blob.
+def rescan(x: np.ndarray, size: np.ndarray, speed: np.ndarray) -> list:
+    left = x < SIM_WIDTH / 2
+    return [(size[side].mean(), speed[side].mean(), size[side].var(), speed[side].var())
+            if side.any() else None
+            for side in (left, ~left)]
+
+
+def assert_matches(regions: RegionalTraits, x, size, speed):
+    for means, variances, expected in zip(regions.means(), regions.variances(),
+                                          rescan(x, size, speed)):
+        if expected == None:
+            assert means.size == None and variances.size == None
+            continue
+        assert np.allclose((means.size, means.speed, variances.size, variances.speed),
+                           expected, rtol=1e-9, atol=1e-9)
+
+
+def test_batches_added_removed_and_moved_match_a_rescan():
+    rng = random.default_rng(7)
+    x = rng.uniform(0, SIM_WIDTH, 500)
+    size = rng.normal(30, 5, 500)
+    speed = rng.normal(200, 30, 500)
+
+    regions = RegionalTraits()
+    regions.add(x, size, speed)
+    alive = np.ones(500, dtype=bool)
+
+    for _ in range(200):
+        dying = alive & (rng.random(500) < 0.02)
+        regions.remove(x[dying], size[dying], speed[dying])
+        alive &= ~dying
+
+        new_x = x + rng.normal(0, 40, 500)
+        regions.move(x[alive], new_x[alive], size[alive], speed[alive])
+        x = new_x
+
+        born = ~alive & (rng.random(500) < 0.05)
+        regions.add(x[born], size[born], speed[born])
+        alive |= born
+
+        assert regions.counts() == (np.count_nonzero(alive & (x < SIM_WIDTH / 2)),
+                                    np.count_nonzero(alive & (x >= SIM_WIDTH / 2)))
+        assert_matches(regions, x[alive], size[alive], speed[alive])
+
+
+# Populations that turn over between very different traits again and \
+# again, the worst case for taking batches back out.
+@pytest.mark.parametrize('resync', [True, False])
+def test_long_runs_stay_accurate(resync: bool):
+    rng = random.default_rng(3)
+    x = rng.uniform(0, SIM_WIDTH, 1000)
+    size = rng.normal(30, 1, 1000)
+    speed = rng.normal(200, 1, 1000)
+
+    regions = RegionalTraits()
+    regions.add(x, size, speed)
+    worst = 0.
+    for step in range(1200):
+        dying = rng.random(1000) < 0.05
+        regions.remove(x[dying], size[dying], speed[dying])
+        scale = 100 if (step // 300) % 2 == 0 else 1
+        size[dying] = rng.normal(30 * scale, 1, dying.sum())
+        speed[dying] = rng.normal(200 * scale, 1, dying.sum())
+        regions.add(x[dying], size[dying], speed[dying])
+
+        # As World and ArrayEngine do after every step.
+        if resync and regions.stale():
+            regions.resync(x, size, speed)
+
+        for means, variances, expected in zip(regions.means(), regions.variances(),
+                                              rescan(x, size, speed)):
+            found = (means.size, means.speed, variances.size, variances.speed)
+            worst = max(worst, np.max(np.abs(np.subtract(found, expected)) / np.abs(expected)))
+
+    if resync:
+        assert worst < 1e-9
+    else:
+        # What the rescans are there for.
+        assert worst > 1e-8
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_world_traits_match_a_rescan(engine: str):
+    world = World.from_dict({**CONFIG, 'engine': engine, 'fixed_dt': DT, 'n_blobs': 100})
+
+    for step in range(300):
+        world.step(DT)
+        if step % 10 == 0:
+            blobs = list(world.blobs())
+            x = np.array([blob.position.x for blob in blobs])
+            size = np.array([blob.traits.size for blob in blobs])
+            speed = np.array([blob.traits.speed for blob in blobs])
+            for means, variances, expected in zip(world.mean_traits(), world.trait_variances(),
+                                                  rescan(x, size, speed)):
+                if expected != None:
+                    assert np.allclose((means.size, means.speed, variances.size, variances.speed),
+                                       expected, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+import pytest
+from classes.blob import Blob
+from classes.candy import Candy
+from classes.geometry import Vector2
+from classes.schedule import Scheduler
+from classes.world import World
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+DT = 0.02
+
+
+def test_items_come_due_by_time_then_id():
+    scheduler = Scheduler()
+    for time, id in ((3., 1), (1., 5), (2., 2), (1., 4), (2., 0), (5., 3)):
+        scheduler.schedule(time, id, (time, id))
+
+    assert list(scheduler.due(0.5)) == []
+    assert list(scheduler.due(2.)) == [(1., 4), (1., 5), (2., 0), (2., 2)]
+    assert len(scheduler) == 2
+    assert list(scheduler.due(10.)) == [(3., 1), (5., 3)]
+    assert len(scheduler) == 0
+
+
+# Eaten candies and starved blobs stay queued, and are skipped when \
+# their events come due.
+def test_world_skips_stale_events():
+    world = World.from_dict({**CONFIG, 'engine': 'object', 'fixed_dt': DT, 'n_blobs': 40})
+    time = 0.
+    while time < Candy.SHELF_LIFE + 1:
+        world.step(DT)
+        time += DT
+
+        candies, blobs = list(world.candies()), list(world.blobs())
+        assert all(candy.expires > time for candy in candies)
+        assert all(blob.expires > time for blob in blobs)
+        assert len({candy.id for candy in candies}) == len(candies)
+
+    assert world.n_candies() > 0
+
+
+# A blob reaching its lifespan reproduces with the energy it has after \
+# eating in that step (see the README).
+@pytest.mark.parametrize('engine', ['object', 'array'])
+@pytest.mark.parametrize('fed', [True, False])
+def test_blobs_reproduce_with_the_energy_left_after_eating(engine: str, fed: bool):
+    world = World.from_dict({**CONFIG,
+                             'engine': engine,
+                             'fixed_dt': DT,
+                             'n_blobs': 1,
+                             'n_candies': [0, 0],
+                             'candy_spawn_rates': [0, 0]})
+    # Stops one step short of the first blob's lifespan, summing time \
+    # as the world does.
+    while world.time() + DT < Blob.LIFESPAN:
+        world.step(DT)
+    blob = next(iter(world.blobs()))
+    assert world.n_blobs() == 1 and world.n_candies() == 0
+
+    # Just short of enough energy to reproduce, before eating.
+    energy = 0.5 * Blob.ENERGY_SIZE_R * blob.traits.size - 1
+    if engine == 'array':
+        world._arrays.blobs.energy[0] = energy
+    else:
+        blob.energy = energy
+    if fed:
+        world._add_candies([Candy(size=20, position=Vector2(blob.position.x, blob.position.y))])
+
+    world.step(DT)
+    assert world.n_blobs() == (Blob.N_OFFSPRING if fed else 0)
@@ -0,0 +1,59 @@
+import numpy as np
+from numpy import random
+from classes.spawn import SpawnTable
+from classes.utils import utils
+
+# Three strips of different rates and sizes, and one too narrow \
+# for any candy to fit in.
+TABLE = SpawnTable(left=np.array([100., 500., 900., 1200.]),
+                   right=np.array([300., 700., 1100., 1300.]),
+                   top=np.array([100., 100., 200., 400.]),
+                   bottom=np.array([700., 700., 600., 403.]),
+                   rates=np.array([10., 30., 60., 50.]),
+                   mean_sizes=np.array([10., 15., 20., 10.]),
+                   sdvs=np.array([1., 2., 3., 1.]))
+
+DURATION = 200.
+
+
+def spawn_all(seed: int) -> dict[str, np.ndarray]:
+    rng = random.default_rng(seed)
+    batches = [TABLE.spawn(rng=rng, timediff=0.1, separators=()) for _ in range(int(DURATION / 0.1))]
+    return {field: np.concatenate([batch[field] for batch in batches]) for field in batches[0]}
+
+
+def strip_of(x: np.ndarray) -> np.ndarray:
+    return np.searchsorted(TABLE.right, x)
+
+
+def test_counts_follow_the_rates():
+    candies = spawn_all(1)
+    counts = np.bincount(strip_of(candies['position'][:, 0]), minlength=len(TABLE))
+
+    expected = TABLE.rates * DURATION
+    # Poisson counts, within five standard deviations.
+    assert np.all(np.abs(counts[:3] - expected[:3]) < 5 * np.sqrt(expected[:3]))
+    assert counts[3] == 0
+
+
+def test_candies_are_drawn_within_their_strip():
+    candies = spawn_all(2)
+    strips = strip_of(candies['position'][:, 0])
+    x, y = candies['position'][:, 0], candies['position'][:, 1]
+
+    assert np.all((TABLE.left[strips] <= x) & (x <= TABLE.right[strips]))
+    assert np.all((TABLE.top[strips] + candies['radius'] <= y) &
+                  (y <= TABLE.bottom[strips] - candies['radius']))
+    assert np.allclose(candies['radius'], utils.radii(candies['size']))
+
+    for strip in range(3):
+        sizes = candies['size'][strips == strip]
+        assert abs(sizes.mean() - TABLE.mean_sizes[strip]) < 5 * TABLE.sdvs[strip] / np.sqrt(len(sizes))
+        assert abs(sizes.std() - TABLE.sdvs[strip]) < 0.1 * TABLE.sdvs[strip]
+
+
+def test_empty_table_spawns_nothing():
+    table = SpawnTable(left=np.zeros(1), right=np.ones(1), top=np.zeros(1), bottom=np.ones(1),
+                       rates=np.zeros(1), mean_sizes=np.ones(1), sdvs=np.ones(1))
+    candies = table.spawn(rng=random.default_rng(0), timediff=1., separators=())
+    assert len(candies['size']) == 0 and candies['position'].shape == (0, 2)
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+import numpy as np
+import pytest
+from classes.stats import DataPoint, Recorder, SimStats
+
+FIELDS = ('time', 'size', 'speed')
+
+
+def fill(recorder: Recorder, n: int) -> dict[str, list]:
+    expected = {field: [] for field in FIELDS}
+    for i in range(n):
+        row = {'time': float(i), 'size': i * 1.5 if i % 3 else None, 'speed': -float(i)}
+        assert recorder.append(**row)
+        for field, value in row.items():
+            expected[field].append(np.nan if value == None else value)
+    return expected
+
+
+def assert_columns(recorder: Recorder, expected: dict[str, list]):
+    columns = recorder.columns()
+    for field in FIELDS:
+        assert np.array_equal(columns[field], expected[field], equal_nan=True)
+        assert np.array_equal(recorder.column(field), expected[field], equal_nan=True)
+
+
+def test_chunks_in_memory_round_trip():
+    recorder = Recorder(FIELDS, chunk_size=4)
+    expected = fill(recorder, 10)
+
+    assert len(recorder) == 10
+    assert_columns(recorder, expected)
+
+
+def test_segments_round_trip(tmp_path: Path):
+    recorder = Recorder(FIELDS, chunk_size=4, directory=str(tmp_path))
+    expected = fill(recorder, 10)
+    assert sorted(os.listdir(tmp_path)) == ['segment_00000.npy', 'segment_00001.npy']
+    assert_columns(recorder, expected)
+
+    # The partial chunk becomes a segment of its own, and appending carries on.
+    recorder.flush()
+    assert len(os.listdir(tmp_path)) == 3
+    assert_columns(recorder, expected)
+
+    assert recorder.append(time=10., size=1., speed=2.)
+    for field, value in zip(FIELDS, (10., 1., 2.)):
+        expected[field].append(value)
+    assert_columns(recorder, expected)
+
+
+def test_samples_sooner_than_the_interval_are_dropped():
+    recorder = Recorder(FIELDS, sample_interval=0.5)
+    kept = [time for time in np.arange(0, 2.01, 0.25).tolist()
+            if recorder.append(time=time, size=1., speed=1.)]
+
+    assert kept == [0., 0.5, 1., 1.5, 2.]
+    assert recorder.column('time').tolist() == kept
+    assert not recorder.due(2.25) and recorder.due(2.5)
+
+
+# Times summed from steps fall just short of the sample times, \
+# which must not push every sample a step later.
+def test_due_does_not_drift_with_summed_time():
+    recorder = Recorder(('time',), sample_interval=0.1)
+    steps = []
+    time = 0.
+    for step in range(1001):
+        if recorder.append(time=time):
+            steps.append(step)
+        time += 0.02
+
+    assert steps == list(range(0, 1001, 5))
+
+
+def test_fields_must_include_time():
+    with pytest.raises(ValueError):
+        Recorder(('size', 'speed'))
+
+
+def test_sim_stats_records_data_points():
+    stats = SimStats()
+    stats.add_data(DataPoint(time=1., l_mean_size=2., r_mean_size=None,
+                             l_mean_speed=3., r_mean_speed=4.))
+
+    assert stats.times() == [1.]
+    assert np.isnan(stats.column('r_mean_size')[0])
@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+import numpy as np
+from classes import sweep
+
+CONFIG = json.loads((Path(__file__).parents[2] / 'config.json').read_text())
+
+
+def small_sweep(**spec) -> dict:
+    return {'base': {**CONFIG, 'n_blobs': 5, 'n_candies': [5, 5]},
+            'duration': 0.2,
+            'dt': 0.02,
+            'sample_interval': 0.1,
+            **spec}
+
+
+def test_expand_combines_grid_and_random_points():
+    points = sweep.expand({'grid': {'seed': [1, 2, 3], 'separation_gap': [0.2, 0.5]},
+                           'random': {'n': 4,
+                                      'seed': 0,
+                                      'params': {'mutation_sdvs.size_sdv': [0.5, 3.0],
+                                                 'n_blobs': [10, 20],
+                                                 'engine': {'choices': ['object', 'array']}}}})
+
+    assert len(points) == 3 * 2 * 4
+    assert {(point['seed'], point['separation_gap']) for point in points} == \
+           {(seed, gap) for seed in (1, 2, 3) for gap in (0.2, 0.5)}
+    for point in points:
+        assert 0.5 <= point['mutation_sdvs.size_sdv'] <= 3.0
+        assert isinstance(point['n_blobs'], int) and 10 <= point['n_blobs'] <= 20
+        assert point['engine'] in ('object', 'array')
+
+
+def test_apply_follows_dotted_paths():
+    base = {'mutation_sdvs': {'size_sdv': 1.}, 'candy_spawn_rates': [10, 20]}
+    config = sweep.apply(base, {'mutation_sdvs.size_sdv': 2., 'candy_spawn_rates.1': 5})
+
+    assert config == {'mutation_sdvs': {'size_sdv': 2.}, 'candy_spawn_rates': [10, 5]}
+    assert base == {'mutation_sdvs': {'size_sdv': 1.}, 'candy_spawn_rates': [10, 20]}
+
+
+def test_interrupted_sweep_resumes(tmp_path: Path):
+    spec = small_sweep(grid={'seed': [1, 2, 3]})
+    keys = {key for key, _, _ in sweep.points(spec)}
+
+    # Stopped after the first point finishes.
+    runs = sweep.run(spec, str(tmp_path), workers=1)
+    first = next(runs)
+    runs.close()
+    assert sweep.finished_keys(str(tmp_path)) == {first['key']}
+
+    resumed = [entry['key'] for entry in sweep.run(spec, str(tmp_path), workers=1)]
+    assert sorted(resumed) == sorted(keys - {first['key']})
+    assert list(sweep.run(spec, str(tmp_path), workers=1)) == []
+
+    entries, columns = sweep.load(str(tmp_path))
+    assert {entry['key'] for entry in entries} == keys
+    assert columns['time'].shape == (3, 3)
+    assert np.allclose(columns['time'][0], [0., 0.1, 0.2])
+
+
+# Results only stand for the config and options they were run with.
+def test_changed_base_config_runs_every_point_again(tmp_path: Path):
+    spec = small_sweep(grid={'seed': [1, 2]})
+    old_keys = {entry['key'] for entry in sweep.run(spec, str(tmp_path), workers=1)}
+
+    changed = {**spec, 'base': {**spec['base'], 'n_blobs': 6}}
+    new_keys = {entry['key'] for entry in sweep.run(changed, str(tmp_path), workers=1)}
+    assert len(new_keys) == 2 and not new_keys & old_keys
+
+    # As do changed run options.
+    longer = {**changed, 'duration': 0.3}
+    assert len(list(sweep.run(longer, str(tmp_path), workers=1))) == 2
+
+    entries, columns = sweep.load(str(tmp_path), changed)
+    assert {entry['key'] for entry in entries} == new_keys
+    assert np.all(columns['n_blobs'][:, 0] == 6)
+    assert len(sweep.load(str(tmp_path))[0]) == 6